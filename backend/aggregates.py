@@ -0,0 +1,232 @@
+# backend/aggregates.py
+# Motor de agregación de KPIs: con filtros una sola sentencia (CTE + UNION ALL)
+# devuelve la serie diaria y los peores SKU; sin filtros, dos consultas (kpi_rows).
+# Los totales se derivan de la serie diaria.
+# La fuente puede ser la tabla cruda (measurements) o el rollup diario; los meses
+# archivados a Parquet (partitions.py) se suman con un scan de Polars.
+from __future__ import annotations
+import os
+from decimal import Decimal
+from sqlalchemy import select, func, literal, literal_column, cast, String, union_all
+from sqlalchemy.orm import Session
+from .models import Measurement, MeasurementDailyRollup, NULL_FECHA
+from .series import build_series
+from . import storage
+from . import partitions
+from .lazy import lazy_import
+
+pl = lazy_import("polars")
+
+WORST_SKU_LIMIT = 5
+
+# raw | rollup (por defecto se usa el rollup cuando los filtros lo permiten)
+KPI_SOURCE = os.getenv("KPI_SOURCE", "rollup").lower()
+
+
+def to_float(x):
+    if x is None:
+        return 0.0
+    if isinstance(x, Decimal):
+        return float(x)
+    return float(x)
+
+
+def measurement_filters(store: str | None, date_from: str | None, date_to: str | None, model=Measurement):
+    filters = []
+    if store:
+        filters.append(model.pv == store)
+    if date_from:
+        filters.append(model.fecha >= date_from)
+    if date_to:
+        filters.append(model.fecha <= date_to)
+    return filters
+
+
+RAW_COLUMNS = ["fecha", "pv", "codigo_barra", "osa_flag", "oos_flag"]
+
+
+def raw_measurements():
+    """measurements o su equivalente sobre el hecho normalizado (storage.py)."""
+    return storage.measurements(RAW_COLUMNS).c
+
+
+def raw_source(filters):
+    """Una fila por medición: n=1 y los flags tal cual (filters sobre raw_measurements())."""
+    m = raw_measurements()
+    return select(
+        m.fecha,
+        m.codigo_barra,
+        literal_column("1").label("n"),
+        m.osa_flag.label("osa"),
+        m.oos_flag.label("oos"),
+    ).where(*filters)
+
+
+def rollup_source(filters):
+    """Una fila por (fecha, pv, codigo_barra) ya agregada."""
+    r = MeasurementDailyRollup
+    return select(
+        r.fecha,
+        r.codigo_barra,
+        r.n.label("n"),
+        r.osa_sum.label("osa"),
+        r.oos_sum.label("oos"),
+    ).where(*filters)
+
+
+def kpi_parts(base, worst_limit: int | None = WORST_SKU_LIMIT):
+    """(daily, worst) sobre base (CTE o subconsulta): filas kind='d' (por fecha) y
+    kind='w' (peores SKU; todos con worst_limit=None, para combinarlos con lo archivado)."""
+    daily = select(
+        literal("d").label("kind"),
+        cast(base.c.fecha, String).label("k"),
+        func.sum(base.c.n).label("n"),
+        func.sum(base.c.osa).label("osa"),
+        func.sum(base.c.oos).label("oos"),
+    ).group_by(base.c.fecha)
+
+    # ORDER BY/LIMIT no se permiten dentro de un miembro de UNION en SQLite → subconsulta
+    worst_inner = (
+        select(
+            base.c.codigo_barra.label("k"),
+            func.sum(base.c.n).label("n"),
+            func.sum(base.c.osa).label("osa"),
+            func.sum(base.c.oos).label("oos"),
+        )
+        .group_by(base.c.codigo_barra)
+        .order_by(func.sum(base.c.osa) * 1.0 / func.sum(base.c.n), base.c.codigo_barra)
+        .limit(worst_limit)
+        .subquery("worst")
+    )
+    worst = select(
+        literal("w").label("kind"),
+        worst_inner.c.k,
+        worst_inner.c.n,
+        worst_inner.c.osa,
+        worst_inner.c.oos,
+    )
+    return daily, worst
+
+
+def kpis_statement(source, worst_limit: int | None = WORST_SKU_LIMIT):
+    """Sentencia única: las dos partes de kpi_parts sobre un CTE, en un UNION ALL."""
+    return union_all(*kpi_parts(source.cte("base"), worst_limit))
+
+
+def kpi_rows(db: Session, source, worst_limit: int | None = WORST_SKU_LIMIT) -> list:
+    """Filas kind='d'/'w' del filtro. Sin WHERE el CTE no acota nada y SQLite lo recorre
+    dos veces igual: las dos consultas por separado son más rápidas (benchmarks/kpi_plans.py)."""
+    if source.whereclause is None:
+        base = source.subquery("base")
+        return [r for part in kpi_parts(base, worst_limit) for r in db.execute(part).all()]
+    return db.execute(kpis_statement(source, worst_limit)).all()
+
+
+def build_source(store: str | None, date_from: str | None, date_to: str | None, source: str | None = None):
+    # el rollup cubre todos los filtros actuales (pv y rango de fecha)
+    if (source or KPI_SOURCE) == "rollup":
+        return rollup_source(measurement_filters(store, date_from, date_to, MeasurementDailyRollup))
+    return raw_source(measurement_filters(store, date_from, date_to, raw_measurements()))
+
+
+def daily_frame(daily) -> pl.DataFrame:
+    """Filas kind='d' → DataFrame (fecha, n, osa, oos) para agrupar/suavizar en series.py;
+    las mediciones sin fecha quedan en NULL_FECHA."""
+    return pl.DataFrame(
+        {
+            "fecha": [r.k for r in daily],
+            "n": [int(r.n) for r in daily],
+            "osa": [to_float(r.osa) for r in daily],
+            "oos": [to_float(r.oos) for r in daily],
+        },
+        schema={"fecha": pl.Utf8, "n": pl.Int64, "osa": pl.Float64, "oos": pl.Float64},
+    ).with_columns(pl.col("fecha").str.slice(0, 10).str.to_date("%Y-%m-%d", strict=False).fill_null(NULL_FECHA))
+
+
+def assemble_kpis(total: int, osa_sum: float, oos_sum: float, daily: pl.DataFrame, worst,
+                  group_by: str = "day", ma_window: int | None = None, max_points: int | None = None):
+    """Arma la respuesta de /api/kpis; worst: (barcode, n, osa) ya ordenados (BD o motor en memoria)."""
+    if total == 0:
+        return {"total": 0, "osa_pct": 0.0, "oos_pct": 0.0, "series": [], "worst_sku": []}
+    return {
+        "total": total,
+        "osa_pct": round(osa_sum * 100.0 / float(total), 2),
+        "oos_pct": round(oos_sum * 100.0 / float(total), 2),
+        # buckets día/semana/mes ponderados por n, media móvil y LTTB; sin fecha solo en el total
+        "series": build_series(daily.filter(pl.col("fecha") != NULL_FECHA), group_by, ma_window, max_points),
+        "worst_sku": [{"barcode": k, "osa_pct": round(osa * 100.0 / n, 2)} for k, n, osa in worst],
+    }
+
+
+def worst_of(skus: pl.DataFrame, limit: int = WORST_SKU_LIMIT) -> list:
+    """Peores SKU (codigo_barra, n, osa) de skus, en el orden de kpis_statement."""
+    worst = (
+        skus.with_columns((pl.col("osa") / pl.col("n")).alias("ratio"))
+        .sort(["ratio", "codigo_barra"])
+        .head(limit)
+    )
+    return [(k, int(n), float(osa)) for k, n, osa, _ in worst.iter_rows()]
+
+
+def merge_archived(daily: pl.DataFrame, skus: pl.DataFrame, paths, store=None, date_from=None, date_to=None):
+    """Suma a la parte en BD (daily: fecha, n, osa, oos; skus: codigo_barra, n, osa, todos
+    los SKU) los meses archivados en paths; devuelve (daily, skus) combinados."""
+    a_daily, a_skus = partitions.kpi_frames(paths, store, date_from, date_to)
+    daily = (
+        pl.concat([daily.select("fecha", "n", "osa", "oos"), a_daily], how="vertical_relaxed")
+        .group_by("fecha").agg(pl.col("n").sum(), pl.col("osa").sum(), pl.col("oos").sum())
+        .sort("fecha")
+    )
+    skus = (
+        pl.concat([skus.select("codigo_barra", "n", "osa"), a_skus], how="vertical_relaxed")
+        .group_by("codigo_barra").agg(pl.col("n").sum(), pl.col("osa").sum())
+    )
+    return daily, skus
+
+
+def _sku_frame(rows) -> pl.DataFrame:
+    return pl.DataFrame(
+        [(r.k, int(r.n), to_float(r.osa)) for r in rows if r.kind == "w"],
+        schema={"codigo_barra": pl.Utf8, "n": pl.Int64, "osa": pl.Float64}, orient="row",
+    )
+
+
+def kpi_state(db: Session, store: str | None = None, date_from: str | None = None,
+              date_to: str | None = None) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """(daily, skus) de todo el filtro desde el rollup, con los meses archivados: punto de
+    partida de las vistas en vivo (live.py), que después solo suman deltas de rollup."""
+    rows = kpi_rows(db, build_source(store, date_from, date_to, "rollup"), None)
+    daily = daily_frame(sorted((r for r in rows if r.kind == "d"), key=lambda r: r.k or ""))
+    skus = _sku_frame(rows)
+    archived = partitions.archived_in_range(date_from, date_to, db.get_bind())
+    if archived:
+        daily, skus = merge_archived(daily, skus, archived, store, date_from, date_to)
+    return daily, skus
+
+
+def compute_kpis(db: Session, store: str | None = None, date_from: str | None = None,
+                 date_to: str | None = None, source: str | None = None, group_by: str = "day",
+                 ma_window: int | None = None, max_points: int | None = None):
+    # meses ya archivados a Parquet dentro del rango: hace falta el detalle de todos los SKU
+    archived = partitions.archived_in_range(date_from, date_to, db.get_bind())
+    rows = kpi_rows(db, build_source(store, date_from, date_to, source), None if archived else WORST_SKU_LIMIT)
+
+    daily = sorted((r for r in rows if r.kind == "d"), key=lambda r: r.k or "")
+    if archived:
+        frame, skus = merge_archived(daily_frame(daily), _sku_frame(rows), archived, store, date_from, date_to)
+        return assemble_kpis(
+            int(frame["n"].sum() or 0), float(frame["osa"].sum() or 0), float(frame["oos"].sum() or 0),
+            frame, worst_of(skus), group_by, ma_window, max_points,
+        )
+    worst = sorted(
+        ((r.k, int(r.n), to_float(r.osa)) for r in rows if r.kind == "w"),
+        key=lambda w: (w[2] / w[1], w[0]),
+    )
+    return assemble_kpis(
+        sum(int(r.n) for r in daily),
+        sum(to_float(r.osa) for r in daily),
+        sum(to_float(r.oos) for r in daily),
+        daily_frame(daily),
+        worst,
+        group_by, ma_window, max_points,
+    )
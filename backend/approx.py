@@ -0,0 +1,568 @@
+# backend/approx.py
+# Modo aproximado de /api/kpis (approx=true) para rangos de años sobre todas las tiendas:
+# - Muestra estratificada: reservorio uniforme de hasta APPROX_SAMPLE_SIZE mediciones
+#   por (pv, mes) en measurement_samples y el tamaño real de cada estrato en
+#   sample_strata. Los importadores lo mantienen con el algoritmo R en la misma
+#   transacción del lote; las filas actualizadas se corrigen en la muestra por row_key.
+#   OSA/OOS y cada punto de la serie salen de un estimador de razón estratificado
+#   (dominio = rango/bucket) con intervalo de confianza APPROX_CONFIDENCE. Un estrato con
+#   menos mediciones que el reservorio está completo y no aporta error.
+# - Peores SKU: count-min sketch mensual de (n, osa) por codigo_barra (sku_sketches),
+#   sumado con los mismos deltas que el rollup. Los candidatos son los SKU de la muestra
+#   del rango; sus n y osa salen de los sketches de los meses completos y del rollup en
+#   los días de borde (como los cubos). El sketch solo sobreestima por colisiones:
+#   con APPROX_SKETCH_WIDTH >= 4 x SKU distintos el error es despreciable. Con filtro de
+#   tienda el ranking sale del rollup de esa tienda (los sketches son globales).
+# - Archivar un mes no borra su muestra ni su sketch: el modo cubre todo el historial
+#   sin leer Parquet. Una fila que cambia de mes sigue en su estrato hasta el rebuild.
+# Cambiar APPROX_SAMPLE_SIZE o el tamaño del sketch: python -m backend.approx rebuild
+from __future__ import annotations
+import hashlib
+import math
+import os
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from statistics import NormalDist
+from sqlalchemy import select, func, delete, insert, update, bindparam, tuple_
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.orm import Session
+from .db import engine, Base
+from .models import (SampleStratum, MeasurementSample, SkuSketch, MeasurementDailyRollup, MEASUREMENT_NATURAL_KEY,
+                     NULL_FECHA)
+from .aggregates import assemble_kpis, measurement_filters, worst_of, WORST_SKU_LIMIT
+from .series import bucket_label
+from . import storage
+from . import partitions
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+pl = lazy_import("polars")
+
+# mediciones por reservorio de (pv, mes); 0 = sin modo aproximado (approx=true → exacto)
+APPROX_SAMPLE_SIZE = int(os.getenv("APPROX_SAMPLE_SIZE", "200"))
+APPROX_CONFIDENCE = float(os.getenv("APPROX_CONFIDENCE", "0.95"))
+# count-min sketch: ancho >= 4 x SKU distintos por mes; profundidad = filas de hash
+APPROX_SKETCH_WIDTH = int(os.getenv("APPROX_SKETCH_WIDTH", "2048"))
+APPROX_SKETCH_DEPTH = int(os.getenv("APPROX_SKETCH_DEPTH", "4"))
+
+REBUILD_BATCH = 100_000
+FLUSH_BATCH = 5_000
+LOOKUP_BATCH = 500  # claves por consulta IN (límite de parámetros de SQLite)
+
+ST = SampleStratum.__table__
+SA = MeasurementSample.__table__
+SK = SkuSketch.__table__
+
+
+def enabled() -> bool:
+    return APPROX_SAMPLE_SIZE > 0
+
+
+def _as_date(x):
+    return x.date() if isinstance(x, datetime) else x
+
+
+def _day(s) -> date | None:
+    return date.fromisoformat(str(s)[:10]) if s else None
+
+
+def row_key(r: dict) -> str | None:
+    """sha1 de la clave natural; None si la fila no la tiene completa (nunca se actualiza)."""
+    values = [r.get(c) for c in MEASUREMENT_NATURAL_KEY]
+    if any(v is None for v in values):
+        return None
+    return hashlib.sha1("\x1f".join(str(v) for v in values).encode("utf-8")).hexdigest()
+
+
+def _dialect(conn) -> str:
+    return conn.get_bind().dialect.name if hasattr(conn, "get_bind") else conn.dialect.name
+
+
+def _upsert(conn, table, keys: list[str], rows: list[dict]):
+    """Inserta o reemplaza (valores absolutos, no deltas) por clave primaria."""
+    if not rows:
+        return
+    cols = [c for c in rows[0] if c not in keys]
+    if _dialect(conn) == "sqlite":
+        stmt = sqlite_dialect.insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_={c: stmt.excluded[c] for c in cols})
+    else:
+        from sqlalchemy.dialects import mysql as mysql_dialect  # solo en despliegues MySQL
+        stmt = mysql_dialect.insert(table)
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in cols})
+    for i in range(0, len(rows), FLUSH_BATCH):
+        conn.execute(stmt, rows[i:i + FLUSH_BATCH])
+
+
+# ---------- count-min sketch ----------
+@lru_cache(maxsize=262_144)
+def _hashes(code: str, depth: int, width: int) -> tuple:
+    # blake2b: estable entre procesos (hash() de Python cambia con PYTHONHASHSEED)
+    h = hashlib.blake2b(code.encode("utf-8"), digest_size=4 * depth).digest()
+    return tuple(int.from_bytes(h[4 * i:4 * i + 4], "little") % width for i in range(depth))
+
+
+def _columns(codes, depth: int, width: int):
+    """Columna de cada código en cada fila del sketch: int64 [len(codes), depth]."""
+    return np.array([_hashes(c or "", depth, width) for c in codes], dtype=np.int64).reshape(-1, depth)
+
+
+def _decode(depth: int, width: int, data: bytes):
+    return np.frombuffer(data, dtype=np.int32).reshape(2, depth, width)
+
+
+def _add(sketch, codes, n, osa):
+    """Suma (n, osa) de cada código al sketch int32 [2, depth, width] (n/osa negativos descuentan)."""
+    depth, width = sketch.shape[1:]
+    cols = _columns(codes, depth, width)
+    for i in range(depth):
+        np.add.at(sketch[0, i], cols[:, i], n)
+        np.add.at(sketch[1, i], cols[:, i], osa)
+
+
+def _estimate_skus(sketch, codes):
+    """(n, osa) estimados de cada código: mínimo entre filas (nunca menor que el real)."""
+    depth, width = sketch.shape[1:]
+    cols = _columns(codes, depth, width)
+    rows = np.arange(depth)
+    return sketch[0][rows, cols].min(axis=1), sketch[1][rows, cols].min(axis=1)
+
+
+# ---------- mantenimiento en las importaciones ----------
+def _sample_row(r: dict, fecha: date) -> dict:
+    return {
+        "row_key": row_key(r),
+        "fecha": fecha,
+        "codigo_barra": r.get("codigo_barra"),
+        "osa_flag": int(r.get("osa_flag") or 0),
+        "oos_flag": int(r.get("oos_flag") or 0),
+    }
+
+
+class ApproxAccumulator:
+    """Acumula las filas nuevas por estrato, las actualizadas y los deltas por (mes, SKU)
+    de un lote; flush los aplica a la muestra y a los sketches. add_frame recibe lotes
+    Polars: el reservorio se sortea en numpy y solo las filas que entran pasan a dict."""
+
+    def __init__(self, rng: random.Random | None = None):
+        self.new = defaultdict(list)      # (pv, mes) → (fila, fecha) nuevas
+        self.frames = []                  # lotes Polars de filas nuevas
+        self.changed = {}                 # row_key → fila con los valores nuevos
+        self.sketch = defaultdict(lambda: [0, 0])  # (mes, codigo_barra) → [n, osa]
+        self.rng = rng or random.Random()
+
+    def add_record(self, r: dict):
+        fecha = _as_date(r.get("fecha"))
+        if fecha is None or not r.get("pv"):
+            return
+        self.new[(r["pv"], partitions.period_of(fecha))].append((r, fecha))
+
+    def add_frame(self, df):
+        df = df.filter(pl.col("fecha").is_not_null() & pl.col("pv").is_not_null() & (pl.col("pv") != ""))
+        if df.height:
+            self.frames.append(df.select(
+                "pv", pl.col("fecha").cast(pl.Date), pl.col("fecha").cast(pl.Date).dt.strftime("%Y-%m").alias("period"),
+                *(c for c in MEASUREMENT_NATURAL_KEY if c != "pv"), "osa_flag", "oos_flag"))
+
+    def update_record(self, r: dict):
+        key = row_key(r)
+        if key:
+            self.changed[key] = r
+
+    def add_deltas(self, deltas):
+        """deltas: RollupAccumulator.frame() (fecha, pv, codigo_barra, n, osa_sum, oos_sum)."""
+        if deltas is None:
+            return
+        # las filas sin fecha (NULL_FECHA) no van a los sketches, como en el backfill
+        agg = (deltas.filter(pl.col("fecha") != NULL_FECHA)
+               .group_by(pl.col("fecha").dt.strftime("%Y-%m").alias("period"), pl.col("codigo_barra").fill_null(""))
+               .agg(pl.col("n").sum(), pl.col("osa_sum").sum()))
+        for period, cb, n, osa in agg.iter_rows():
+            if n or osa:
+                d = self.sketch[(period, cb)]
+                d[0] += n
+                d[1] += osa
+
+    def flush(self, conn):
+        if enabled():
+            self._flush_changed(conn)
+            self._flush_new(conn)
+            self._flush_sketches(conn)
+        self.new.clear()
+        self.frames.clear()
+        self.changed.clear()
+        self.sketch.clear()
+
+    def _flush_changed(self, conn):
+        keys = list(self.changed)
+        found = []
+        for i in range(0, len(keys), LOOKUP_BATCH):
+            found += conn.execute(select(SA.c.row_key).where(SA.c.row_key.in_(keys[i:i + LOOKUP_BATCH]))).scalars()
+        rows = []
+        for key in set(found):
+            r = self.changed[key]
+            if r.get("fecha") is None:
+                continue
+            rows.append({"_key": key, "_fecha": _as_date(r.get("fecha")), "_cb": r.get("codigo_barra"),
+                         "_osa": int(r.get("osa_flag") or 0), "_oos": int(r.get("oos_flag") or 0)})
+        if rows:
+            conn.execute(update(SA).where(SA.c.row_key == bindparam("_key")).values(
+                fecha=bindparam("_fecha"), codigo_barra=bindparam("_cb"), osa_flag=bindparam("_osa"),
+                oos_flag=bindparam("_oos")), rows)
+
+    def _flush_new(self, conn):
+        frame = pl.concat(self.frames, how="vertical_relaxed") if self.frames else None
+        by_stratum = {}
+        if frame is not None:
+            # filas de cada estrato contiguas y en el orden del lote
+            frame = frame.with_row_index("i").sort("pv", "period", maintain_order=True)
+            idx = frame["i"].to_numpy()
+            start = 0
+            for pv, period, m in frame.group_by("pv", "period", maintain_order=True).len().iter_rows():
+                by_stratum[(pv, period)] = idx[start:start + m]
+                start += m
+            frame = frame.sort("i")
+        if not self.new and not by_stratum:
+            return
+        size = APPROX_SAMPLE_SIZE
+        strata = list(dict.fromkeys([*self.new, *by_stratum]))
+        state = {}
+        for i in range(0, len(strata), LOOKUP_BATCH // 2):
+            q = select(ST.c.pv, ST.c.period, ST.c.n, ST.c.k).where(
+                tuple_(ST.c.pv, ST.c.period).in_(strata[i:i + LOOKUP_BATCH // 2]))
+            if _dialect(conn) == "mysql":
+                q = q.with_for_update()  # dos importaciones no reparten el mismo slot
+            state.update({(pv, period): (n, k) for pv, period, n, k in conn.execute(q)})
+        counts, slots, picked = [], {}, {}
+        gen = np.random.default_rng(self.rng.getrandbits(64))
+        for pv, period in strata:
+            n, k = state.get((pv, period), (0, 0))
+            # algoritmo R: la fila n-ésima entra con probabilidad size/n y reemplaza un slot al azar
+            for r in self.new.get((pv, period), ()):
+                n += 1
+                if k < size:
+                    slot, k = k, k + 1
+                else:
+                    slot = self.rng.randrange(n)
+                    if slot >= size:
+                        continue
+                slots[(pv, period, slot)] = r
+            rows = by_stratum.get((pv, period))
+            if rows is not None:
+                # lo mismo vectorizado: las primeras llenan los slots libres, el resto sortea
+                m = len(rows)
+                fill = min(max(size - k, 0), m)
+                drawn = np.empty(m, dtype=np.int64)
+                drawn[:fill] = np.arange(k, k + fill)
+                drawn[fill:] = (gen.random(m - fill) * np.arange(n + fill + 1, n + m + 1)).astype(np.int64)
+                for slot, i in zip(drawn[drawn < size].tolist(), rows[drawn < size].tolist()):
+                    slots.pop((pv, period, slot), None)
+                    picked[(pv, period, slot)] = i  # la última que cae en un slot gana
+                n, k = n + m, k + fill
+            counts.append({"pv": pv, "period": period, "n": n, "k": k})
+        _upsert(conn, ST, ["pv", "period"], counts)
+        # clave y fila de muestra solo para las que entraron (en estratos grandes, pocas)
+        samples = [{"pv": pv, "period": period, "slot": slot, **_sample_row(*r)} for (pv, period, slot), r in slots.items()]
+        if picked:
+            rows = frame[list(picked.values())].to_dicts()
+            samples += [{"pv": pv, "period": period, "slot": slot, **_sample_row(r, r["fecha"])}
+                        for (pv, period, slot), r in zip(picked, rows)]
+        _upsert(conn, SA, ["pv", "period", "slot"], samples)
+
+    def _flush_sketches(self, conn):
+        by_period = defaultdict(list)
+        for (period, cb), (n, osa) in self.sketch.items():
+            if n or osa:
+                by_period[period].append((cb, n, osa))
+        if not by_period:
+            return
+        q = select(SK.c.period, SK.c.depth, SK.c.width, SK.c.data).where(SK.c.period.in_(list(by_period)))
+        if _dialect(conn) == "mysql":
+            q = q.with_for_update()
+        current = {p: _decode(d, w, data).copy() for p, d, w, data in conn.execute(q)}
+        rows = []
+        for period, items in by_period.items():
+            sketch = current.get(period)
+            if sketch is None:
+                sketch = np.zeros((2, APPROX_SKETCH_DEPTH, APPROX_SKETCH_WIDTH), dtype=np.int32)
+            codes, n, osa = zip(*items)
+            _add(sketch, codes, np.array(n, dtype=np.int32), np.array(osa, dtype=np.int32))
+            rows.append({"period": period, "depth": sketch.shape[1], "width": sketch.shape[2],
+                         "data": sketch.tobytes()})
+        _upsert(conn, SK, ["period"], rows)
+
+
+# ---------- backfill ----------
+SOURCE_COLUMNS = ["fecha", "pv", "codigo_barra", "osa_flag", "oos_flag", "id_conjunto", "fecha_hora_medicion"]
+
+
+def rebuild(bind=engine, seed: int | None = None) -> int:
+    """Recalcula muestra, estratos y sketches desde measurements y los meses archivados.
+    Muestreo bottom-k por bloques: cada fila recibe una clave aleatoria y cada estrato se
+    queda con las APPROX_SAMPLE_SIZE menores (equivale al reservorio). Devuelve filas de muestra."""
+    Base.metadata.create_all(bind)
+    size = max(APPROX_SAMPLE_SIZE, 0)
+    rng = np.random.default_rng(seed)
+    kept, counts, skus = None, [], []
+
+    def consume(df):
+        nonlocal kept
+        df = df.select(SOURCE_COLUMNS).filter(pl.col("fecha").is_not_null() & pl.col("pv").is_not_null())
+        if df.height == 0:
+            return
+        df = df.with_columns(
+            pl.col("fecha").cast(pl.Date),
+            pl.col("fecha").cast(pl.Date).dt.strftime("%Y-%m").alias("period"),
+            pl.col("osa_flag").fill_null(0).cast(pl.Int64),
+            pl.col("oos_flag").fill_null(0).cast(pl.Int64),
+            pl.Series("u", rng.random(df.height)),
+        )
+        counts.append(df.group_by("pv", "period").agg(pl.len().alias("n")))
+        skus.append(df.group_by("period", "codigo_barra").agg(pl.len().alias("n"), pl.col("osa_flag").sum().alias("osa")))
+        part = df if kept is None else pl.concat([kept, df], how="vertical_relaxed")
+        kept = part.sort("u").group_by("pv", "period", maintain_order=True).head(size).select(part.columns)
+
+    m = storage.measurements(SOURCE_COLUMNS)
+    q = select(*(m.c[c] for c in SOURCE_COLUMNS)).execution_options(yield_per=REBUILD_BATCH)
+    with bind.connect() as conn:
+        for part in conn.execute(q).partitions():
+            consume(pl.DataFrame([tuple(r) for r in part], schema=SOURCE_COLUMNS, orient="row"))
+    for name in partitions.archived_periods(bind, refresh=True).values():
+        consume(pl.read_parquet(partitions.ARCHIVE_DIR / name, columns=SOURCE_COLUMNS))
+
+    strata, samples, sketches = [], [], []
+    if counts:
+        k = kept.group_by("pv", "period").agg(pl.len().alias("k"))
+        strata = (pl.concat(counts).group_by("pv", "period").agg(pl.col("n").sum())
+                  .join(k, on=["pv", "period"], how="left").with_columns(pl.col("k").fill_null(0)).to_dicts())
+        kept = kept.sort("u").with_columns(pl.int_range(pl.len()).over("pv", "period").alias("slot"))
+        for r in kept.iter_rows(named=True):
+            samples.append({"pv": r["pv"], "period": r["period"], "slot": r["slot"], **_sample_row(r, r["fecha"])})
+        agg = (pl.concat(skus).with_columns(pl.col("codigo_barra").fill_null(""))
+               .group_by("period", "codigo_barra").agg(pl.col("n").sum(), pl.col("osa").sum()))
+        for (period,), g in agg.partition_by("period", as_dict=True).items():
+            sketch = np.zeros((2, APPROX_SKETCH_DEPTH, APPROX_SKETCH_WIDTH), dtype=np.int32)
+            _add(sketch, g["codigo_barra"].to_list(), g["n"].to_numpy().astype(np.int32),
+                 g["osa"].to_numpy().astype(np.int32))
+            sketches.append({"period": period, "depth": APPROX_SKETCH_DEPTH, "width": APPROX_SKETCH_WIDTH,
+                             "data": sketch.tobytes()})
+    with bind.begin() as conn:
+        for table in (SA, ST, SK):
+            conn.execute(delete(table))
+        for table, rows in ((ST, strata), (SA, samples), (SK, sketches)):
+            for i in range(0, len(rows), FLUSH_BATCH):
+                conn.execute(insert(table), rows[i:i + FLUSH_BATCH])
+    from .cache import query_cache
+    query_cache.clear()
+    return len(samples)
+
+
+def ensure_populated(bind=engine):
+    """Si hay mediciones pero no hay muestra (BD previa a estas tablas) → backfill."""
+    if not enabled():
+        return 0
+    with bind.connect() as conn:
+        has_sample = conn.execute(select(ST.c.pv).limit(1)).first() is not None
+        has_raw = conn.execute(select(storage.measurements(["id"]).c.id).limit(1)).first() is not None
+    if has_raw and not has_sample:
+        return rebuild(bind)
+    return 0
+
+
+# ---------- consulta ----------
+def _estimate(g: pl.DataFrame, by: str) -> pl.DataFrame:
+    """Estimador de razón estratificado por dominio `by`. g: una fila por (estrato, dominio)
+    con N y k del estrato y c, osa, oos de la muestra. Devuelve por dominio n, osa y oos
+    estimados y el error estándar de osa/n y oos/n (linealización, con corrección por
+    población finita: un estrato completo, k = N, no suma varianza)."""
+    w = pl.col("N") / pl.col("k")
+    est = g.group_by(by).agg(
+        (w * pl.col("c")).sum().alias("n"), (w * pl.col("osa")).sum().alias("osa"),
+        (w * pl.col("oos")).sum().alias("oos"), pl.col("c").sum().alias("m"),
+        (pl.col("k") < pl.col("N")).any().alias("sampled"),
+    )
+    ratios = est.select(by, (pl.col("osa") / pl.col("n")).alias("p"), (pl.col("oos") / pl.col("n")).alias("q"))
+    # z = y - p·x en el dominio, 0 fuera: suma de z² con y ∈ {0, 1} sin volver a las filas
+    factor = pl.col("N") ** 2 * (1 - pl.col("k") / pl.col("N")) / pl.col("k") / pl.max_horizontal(pl.col("k") - 1, 1)
+
+    def var(y, p):
+        y, p, c = pl.col(y), pl.col(p), pl.col("c")
+        return factor * (y * (1 - p) ** 2 + (c - y) * p ** 2 - (y - p * c) ** 2 / pl.col("k"))
+
+    v = g.join(ratios, on=by).group_by(by).agg(var("osa", "p").sum().alias("v_osa"), var("oos", "q").sum().alias("v_oos"))
+    return est.join(v, on=by).with_columns(
+        (pl.col("v_osa").clip(0).sqrt() / pl.col("n")).alias("osa_se"),
+        (pl.col("v_oos").clip(0).sqrt() / pl.col("n")).alias("oos_se"),
+    )
+
+
+def _z() -> float:
+    return NormalDist().inv_cdf((1 + APPROX_CONFIDENCE) / 2)
+
+
+def _ci(r: dict, y: str = "osa") -> list[float]:
+    """Intervalo de Wilson con el tamaño de muestra efectivo p(1-p)/se² (efecto de diseño
+    del muestreo estratificado). Con pocas filas de muestra en el dominio y p en 0 o 1 el
+    error estándar es 0: se usa la cantidad de filas. Sin estratos muestreados es exacto."""
+    p = r[y] / r["n"]
+    if not r["sampled"]:
+        return [round(p * 100, 2)] * 2
+    se = r[f"{y}_se"]
+    m = p * (1 - p) / se ** 2 if se > 0 and 0 < p < 1 else r["m"]
+    z2 = _z() ** 2 / m
+    center = (p + z2 / 2) / (1 + z2)
+    half = math.sqrt(z2 * p * (1 - p) + z2 ** 2 / 4) / (1 + z2)
+    return [round(max(0.0, center - half) * 100, 2), round(min(1.0, center + half) * 100, 2)]
+
+
+def sample_frame(db: Session, store: str | None = None, date_from: str | None = None,
+                 date_to: str | None = None, by_day: bool = True) -> pl.DataFrame:
+    """Muestra del filtro agregada por (pv, period, fecha) con N y k de su estrato.
+    by_day=False: una fila por estrato (fecha = la primera del estrato), para la serie
+    mensual los estratos ya son los buckets."""
+    cond = []
+    if store:
+        cond.append(SA.c.pv == store)
+    if date_from:
+        cond.append(SA.c.fecha >= date_from)
+    if date_to:
+        cond.append(SA.c.fecha <= date_to)
+    keys = [SA.c.pv, SA.c.period, SA.c.fecha] if by_day else [SA.c.pv, SA.c.period]
+    rows = db.execute(
+        select(SA.c.pv, SA.c.period, SA.c.fecha if by_day else func.min(SA.c.fecha), func.count(),
+               func.sum(SA.c.osa_flag), func.sum(SA.c.oos_flag))
+        .where(*cond).group_by(*keys)
+    ).all()
+    sample = pl.DataFrame(
+        [tuple(r) for r in rows], orient="row",
+        schema={"pv": pl.Utf8, "period": pl.Utf8, "fecha": pl.Date, "c": pl.Int64, "osa": pl.Int64, "oos": pl.Int64},
+    )
+    cond = [ST.c.k > 0]
+    if store:
+        cond.append(ST.c.pv == store)
+    if date_from:
+        cond.append(ST.c.period >= partitions.period_of(_day(date_from)))
+    if date_to:
+        cond.append(ST.c.period <= partitions.period_of(_day(date_to)))
+    strata = pl.DataFrame(
+        [tuple(r) for r in db.execute(select(ST.c.pv, ST.c.period, ST.c.n, ST.c.k).where(*cond))], orient="row",
+        schema={"pv": pl.Utf8, "period": pl.Utf8, "N": pl.Int64, "k": pl.Int64},
+    )
+    return sample.join(strata, on=["pv", "period"])
+
+
+def rollup_skus(db: Session, store: str | None, date_from: str | None, date_to: str | None) -> pl.DataFrame:
+    """(codigo_barra, n, osa) exactos del rollup y los meses archivados del filtro."""
+    r = MeasurementDailyRollup
+    rows = db.execute(
+        select(r.codigo_barra, func.sum(r.n), func.sum(r.osa_sum))
+        .where(*measurement_filters(store, date_from, date_to, r)).group_by(r.codigo_barra)
+    ).all()
+    skus = pl.DataFrame([tuple(x) for x in rows], orient="row",
+                        schema={"codigo_barra": pl.Utf8, "n": pl.Int64, "osa": pl.Float64})
+    archived = partitions.archived_in_range(date_from, date_to, db.get_bind())
+    if archived:
+        skus = pl.concat([skus, partitions.kpi_frames(archived, store, date_from, date_to)[1]], how="vertical_relaxed")
+    return skus
+
+
+def _sketch_worst(db: Session, date_from: str | None, date_to: str | None, candidates: set) -> list:
+    """Peores SKU entre candidates: meses completos del sketch + bordes exactos del rollup."""
+    dfrom, dto = _day(date_from), _day(date_to)
+    q = select(SK.c.period, SK.c.depth, SK.c.width, SK.c.data)
+    if dfrom:
+        q = q.where(SK.c.period >= partitions.period_of(dfrom))
+    if dto:
+        q = q.where(SK.c.period <= partitions.period_of(dto))
+    full, edges = [], []
+    for period, depth, width, data in db.execute(q):
+        start, end = partitions.bounds(period)
+        last = end - timedelta(days=1)
+        if (dfrom and dfrom > start) or (dto and dto < last):
+            edges.append((max(start, dfrom or start), min(last, dto or last)))
+        else:
+            full.append(_decode(depth, width, data))
+    parts = []
+    for a, b in edges:
+        skus = rollup_skus(db, None, a.isoformat(), b.isoformat())
+        parts.append(skus)
+        candidates.update(skus["codigo_barra"].drop_nulls().to_list())
+    codes = sorted(c for c in candidates if c is not None)
+    n, osa = np.zeros(len(codes), dtype=np.int64), np.zeros(len(codes), dtype=np.int64)
+    # suma de los mínimos de cada mes: nunca mayor que el mínimo de la suma
+    for sketch in full:
+        sn, so = _estimate_skus(sketch, codes)
+        n += sn
+        osa += so
+    parts.append(pl.DataFrame({"codigo_barra": codes, "n": n, "osa": osa.astype(np.float64)}))
+    skus = (pl.concat([p.filter(pl.col("codigo_barra").is_in(codes)) for p in parts], how="vertical_relaxed")
+            .group_by("codigo_barra").agg(pl.col("n").sum(), pl.col("osa").sum())
+            .filter(pl.col("n") > 0))
+    return worst_of(skus, WORST_SKU_LIMIT)
+
+
+def compute_approx_kpis(db: Session, store: str | None = None, date_from: str | None = None,
+                        date_to: str | None = None, group_by: str = "day", ma_window: int | None = None,
+                        max_points: int | None = None) -> dict:
+    """/api/kpis?approx=true: misma forma que compute_kpis con totales y serie estimados
+    desde la muestra; agrega osa_ci por punto y el bloque approx (intervalos, tamaño de muestra)."""
+    g = sample_frame(db, store, date_from, date_to, by_day=group_by != "month")
+    meta = {"confidence": APPROX_CONFIDENCE, "sample_rows": int(g["c"].sum() or 0), "strata": 0,
+            "worst_sku": "rollup" if store else "sketch"}
+    if g.height == 0:
+        return {**assemble_kpis(0, 0.0, 0.0, g, []), "approx": {**meta, "osa_ci": [0.0, 0.0], "oos_ci": [0.0, 0.0]}}
+    strata = ["pv", "period"]
+    total = _estimate(
+        g.group_by(strata).agg(pl.col("N").first(), pl.col("k").first(), pl.col("c").sum(), pl.col("osa").sum(),
+                               pl.col("oos").sum()).with_columns(pl.lit(0).alias("all")), "all").row(0, named=True)
+    # la serie: n, osa, oos estimados por día → mismos buckets, media móvil y LTTB que el exacto
+    daily = _estimate(g, "fecha").select("fecha", "n", "osa", "oos").sort("fecha")
+    by_label = g.with_columns(bucket_label(group_by).alias("label")).group_by(*strata, "label").agg(
+        pl.col("N").first(), pl.col("k").first(), pl.col("c").sum(), pl.col("osa").sum(), pl.col("oos").sum())
+    ci = {r["label"]: _ci(r) for r in _estimate(by_label, "label").iter_rows(named=True)}
+
+    if store:
+        worst = worst_of(rollup_skus(db, store, date_from, date_to)
+                         .group_by("codigo_barra").agg(pl.col("n").sum(), pl.col("osa").sum()))
+    else:
+        worst = _sketch_worst(db, date_from, date_to, set(_sample_skus(db, date_from, date_to)))
+    n_total = round(total["n"])
+    data = assemble_kpis(n_total, total["osa"], total["oos"], daily, worst, group_by, ma_window, max_points)
+    p, q = total["osa"] / total["n"], total["oos"] / total["n"]
+    data["osa_pct"], data["oos_pct"] = round(p * 100, 2), round(q * 100, 2)
+    for item in data["series"]:
+        item["n"] = round(item["n"])
+        item["osa_ci"] = ci[item["date"]]
+    meta.update(strata=g.select(strata).unique().height, osa_ci=_ci(total), oos_ci=_ci(total, "oos"))
+    data["approx"] = meta
+    return data
+
+
+def _sample_skus(db: Session, date_from: str | None, date_to: str | None) -> list:
+    cond = [SA.c.codigo_barra.is_not(None)]
+    if date_from:
+        cond.append(SA.c.fecha >= date_from)
+    if date_to:
+        cond.append(SA.c.fecha <= date_to)
+    return list(db.execute(select(SA.c.codigo_barra).where(*cond).distinct()).scalars())
+
+
+def status(bind=engine) -> dict:
+    with bind.connect() as conn:
+        strata, population, sample = conn.execute(
+            select(func.count(), func.coalesce(func.sum(ST.c.n), 0), func.coalesce(func.sum(ST.c.k), 0))).one()
+        months = conn.execute(select(func.count()).select_from(SK)).scalar()
+    return {"strata": strata, "rows": int(population), "sample_rows": int(sample), "sketch_months": months,
+            "sample_size": APPROX_SAMPLE_SIZE, "sketch": [APPROX_SKETCH_DEPTH, APPROX_SKETCH_WIDTH]}
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "status"):
+        print("Uso: python -m backend.approx rebuild | status")
+        raise SystemExit(1)
+    if sys.argv[1] == "rebuild":
+        print(f"Filas en la muestra: {rebuild()}")
+    print(status())
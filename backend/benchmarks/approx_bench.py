@@ -0,0 +1,129 @@
+# backend/benchmarks/approx_bench.py
+# Modo aproximado de /api/kpis (approx.py) frente al exacto: SQLite temporal con N filas
+# sintéticas; para cada tamaño de reservorio (--sizes) reconstruye la muestra --trials
+# veces con semillas distintas y mide, por consulta (todo el historial, el último año
+# por semana, un trimestre por día, una tienda):
+# - tiempo exacto (tabla cruda y rollup) y aproximado, y la aceleración;
+# - error absoluto de OSA% total y de los puntos de la serie (en puntos porcentuales);
+# - cobertura de los intervalos (fracción que contiene el valor exacto; objetivo APPROX_CONFIDENCE);
+# - recall@5 de los peores SKU (sketch + bordes) contra el ranking exacto.
+# Al final, cuánto de una importación se va en mantener muestra y sketches.
+# Uso: python -m backend.benchmarks.approx_bench --rows 500000 --sizes 50,100,200,400
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+
+
+def timed(fn, repeat: int):
+    out, best = None, float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return out, best * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--days", type=int, default=730)
+    ap.add_argument("--stores", type=int, default=50)
+    ap.add_argument("--skus", type=int, default=500)
+    ap.add_argument("--sizes", default="50,100,200,400", help="APPROX_SAMPLE_SIZE a comparar")
+    ap.add_argument("--trials", type=int, default=3, help="muestras (semillas) por tamaño")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--batch", type=int, default=20_000, help="filas de la importación medida")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    # la configuración se lee al importar los módulos
+    os.environ.update(USE_SQLITE="true", SQLITE_PATH=os.path.join(tmp, "approx.db"), CACHE_ENABLED="false",
+                      ARCHIVE_DIR=os.path.join(tmp, "archive"))
+    import polars as pl
+    from sqlalchemy.orm import sessionmaker
+    from .synthetic import populate, generate_rows
+    from ..db import engine
+    from ..aggregates import compute_kpis
+    from ..ingest import bulk_insert
+    from .. import approx, rollup
+
+    populate(engine, args.rows, days=args.days, stores=args.stores, skus=args.skus)
+    rollup.rebuild(engine)
+    Session = sessionmaker(bind=engine)
+    end = date(2025, 1, 1).toordinal() + args.days - 1
+    last = date.fromordinal(end)
+    cases = {
+        "todo el historial, por mes": {"group_by": "month"},
+        "último año, por semana": {"date_from": date(last.year - 1, last.month, 1).isoformat(), "group_by": "week"},
+        "trimestre, por día": {"date_from": date.fromordinal(end - 90).isoformat(), "date_to": last.isoformat()},
+        "una tienda, todo": {"store": "PV-007", "group_by": "month"},
+    }
+
+    exact, times = {}, {}
+    with Session() as db:
+        for label, f in cases.items():
+            exact[label], raw_ms = timed(lambda: compute_kpis(db, source="raw", **f), args.repeat)
+            _, rollup_ms = timed(lambda: compute_kpis(db, source="rollup", **f), args.repeat)
+            times[label] = (raw_ms, rollup_ms)
+
+    print(f"{args.rows:,d} filas, {args.stores} tiendas, {args.skus} SKU, {args.days} días; "
+          f"sketch {approx.APPROX_SKETCH_DEPTH}x{approx.APPROX_SKETCH_WIDTH}, confianza {approx.APPROX_CONFIDENCE}")
+    print(f"{'consulta':28s} {'K':>5} {'muestra':>8} {'raw ms':>8} {'rollup ms':>9} {'approx ms':>9} "
+          f"{'x raw':>6} {'x rollup':>8} {'err tot':>7} {'err pts':>7} {'cob tot':>7} {'cob pts':>7} {'rec@5':>5}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        approx.APPROX_SAMPLE_SIZE = size
+        stats = {label: {"ms": [], "err": [], "perr": [], "cov": [], "pcov": [], "recall": []} for label in cases}
+        rows = 0
+        for trial in range(args.trials):
+            rows = approx.rebuild(engine, seed=trial)
+            with Session() as db:
+                for label, f in cases.items():
+                    a, ms = timed(lambda: approx.compute_approx_kpis(db, **f), args.repeat)
+                    e, s = exact[label], stats[label]
+                    s["ms"].append(ms)
+                    s["err"].append(abs(a["osa_pct"] - e["osa_pct"]))
+                    lo, hi = a["approx"]["osa_ci"]
+                    s["cov"].append(lo <= e["osa_pct"] <= hi)
+                    points = {p["date"]: p["osa_pct"] for p in e["series"]}
+                    for p in a["series"]:
+                        if p["date"] in points:
+                            s["perr"].append(abs(p["osa_pct"] - points[p["date"]]))
+                            s["pcov"].append(p["osa_ci"][0] <= points[p["date"]] <= p["osa_ci"][1])
+                    worst = {w["barcode"] for w in e["worst_sku"]}
+                    s["recall"].append(len(worst & {w["barcode"] for w in a["worst_sku"]}) / max(len(worst), 1))
+        for label, s in stats.items():
+            raw_ms, rollup_ms = times[label]
+            ms = statistics.median(s["ms"])
+            print(f"{label:28s} {size:>5} {rows:>8,d} {raw_ms:>8.1f} {rollup_ms:>9.1f} {ms:>9.1f} "
+                  f"{raw_ms / ms:>6.1f} {rollup_ms / ms:>8.1f} {statistics.fmean(s['err']):>7.2f} "
+                  f"{statistics.fmean(s['perr'] or [0]):>7.2f} {statistics.fmean(s['cov']):>7.0%} "
+                  f"{statistics.fmean(s['pcov'] or [0]):>7.0%} {statistics.fmean(s['recall']):>5.0%}")
+
+    # costo en la importación: tiempo de ApproxAccumulator dentro de write_batch
+    spent = [0.0]
+
+    def timing(fn):
+        def wrapper(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                spent[0] += time.perf_counter() - t0
+        return wrapper
+    for name in ("add_frame", "update_record", "add_deltas", "flush"):
+        setattr(approx.ApproxAccumulator, name, timing(getattr(approx.ApproxAccumulator, name)))
+    batch = list(generate_rows(args.batch, seed=7, start=last, days=1, stores=args.stores, skus=args.skus))
+    for r in batch:
+        r["id_conjunto"] = "B-" + r["id_conjunto"]
+    t0 = time.perf_counter()
+    bulk_insert(pl.DataFrame(batch))
+    total = time.perf_counter() - t0
+    print(f"importación de {args.batch:,d} filas (K={approx.APPROX_SAMPLE_SIZE}): {total * 1000:.0f} ms, "
+          f"de los que muestra y sketches {spent[0] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# backend/benchmarks/breakdown_bench.py
+# Compara /api/kpis/breakdown servido desde los cubos vs la tabla cruda sobre un
+# año de datos sintéticos y verifica que ambos devuelven lo mismo.
+# Uso: python -m backend.benchmarks.breakdown_bench --rows 1000000
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy.orm import Session
+from ..breakdown import compute_breakdown
+from ..cube import rebuild
+from ..indexes import ensure_indexes
+from .synthetic import make_engine, populate
+
+CASES = {
+    "provincia×categoria×marca": (["provincia", "categoria", "marca"], {}),
+    "cliente×formato×proveedor": (["cliente", "formato", "proveedor"], {}),
+    "pv (2 provincias)": (["pv"], {"provincia": ["PROV-1", "PROV-2"]}),
+    "causal×categoria": (["causal", "categoria"], {}),
+}
+
+
+def timeit(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--budget-ms", type=float, default=200.0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, "bench.db"))
+        populate(engine, args.rows)
+        ensure_indexes(engine)
+        t0 = time.perf_counter()
+        cube_rows = rebuild(engine)
+        print(f"{args.rows:,d} mediciones → {cube_rows:,d} filas de cubo ({time.perf_counter() - t0:.1f}s)")
+        ok = True
+        with Session(engine) as db:
+            for name, (dims, filters) in CASES.items():
+                kw = dict(filters=filters, date_from="2025-01-01", date_to="2025-12-31", limit=20, min_support=10)
+                t_raw, r_raw = timeit(lambda: compute_breakdown(db, dims, source="raw", **kw), args.repeat)
+                t_cube, r_cube = timeit(lambda: compute_breakdown(db, dims, **kw), args.repeat)
+                same = r_raw["items"] == r_cube["items"]
+                ok &= same and t_cube * 1000 <= args.budget_ms
+                print(f"{name:28s} raw={t_raw*1000:8.1f} ms  {r_cube['source']:17s}={t_cube*1000:7.1f} ms  "
+                      f"x{t_raw / t_cube:5.1f}  iguales={same}")
+        engine.dispose()
+    print("OK" if ok else f"FALLA (presupuesto {args.budget_ms:.0f} ms)")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# backend/benchmarks/columnar_bench.py
+# Latencia de /api/kpis y /api/measurements con la BD (rollup y cruda) vs el motor
+# en memoria, y huella de memoria del snapshot columnar por millón de filas.
+# Uso: python -m backend.benchmarks.columnar_bench --rows 1000000
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy.orm import Session
+from ..aggregates import compute_kpis
+from ..columnar import ColumnarStore
+from ..indexes import ensure_indexes
+from ..rollup import rebuild
+from ..routers.measurements import LIST_COLUMNS, list_page
+from .synthetic import make_engine, populate
+
+CASES = {
+    "sin filtros": {},
+    "tienda": {"store": "PV-007"},
+    "tienda + rango": {"store": "PV-007", "date_from": "2025-03-01", "date_to": "2025-05-31"},
+    "rango semanal": {"date_from": "2025-06-01", "date_to": "2025-06-30", "group_by": "week"},
+}
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def timeit(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, "bench.db"))
+        populate(engine, args.rows)
+        ensure_indexes(engine)
+        rebuild(engine)
+
+        rss0 = rss_bytes()
+        store = ColumnarStore(engine).load()
+        rss1 = rss_bytes()
+        st = store.stats()
+        per_m = 1_000_000 / max(st["rows"], 1)
+        print(f"snapshot: {st['rows']:,d} filas en {st['load_seconds']:.1f}s  "
+              f"estimado={st['bytes'] / 2**20:.1f} MiB ({st['bytes'] * per_m / 2**20:.1f} MiB/1M filas)  "
+              f"RSS +{(rss1 - rss0) / 2**20:.1f} MiB ({(rss1 - rss0) * per_m / 2**20:.1f} MiB/1M filas)")
+
+        with Session(engine) as db:
+            for name, kw in CASES.items():
+                t_raw, r_raw = timeit(lambda: compute_kpis(db, source="raw", **kw), args.repeat)
+                t_rol, r_rol = timeit(lambda: compute_kpis(db, source="rollup", **kw), args.repeat)
+                t_mem, r_mem = timeit(lambda: store.kpis(**kw), args.repeat)
+                print(f"kpis {name:16s} cruda={t_raw*1000:8.1f} ms  rollup={t_rol*1000:7.1f} ms  "
+                      f"memoria={t_mem*1000:7.1f} ms  iguales={r_raw == r_rol == r_mem}")
+
+            kw = {"store": "PV-007", "date_from": None, "date_to": None, "limit": 200, "cursor": None}
+            t_db, r_db = timeit(lambda: list_page(db, **kw), args.repeat)
+            t_mem, r_mem = timeit(lambda: store.page(LIST_COLUMNS, "PV-007", limit=200)[0], args.repeat)
+            print(f"measurements (200 filas)  bd={t_db*1000:8.1f} ms  memoria={t_mem*1000:7.1f} ms  "
+                  f"iguales={r_db['items'] == r_mem}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# backend/benchmarks/explain_check.py
+# Comprueba con EXPLAIN QUERY PLAN (SQLite) que las consultas de /api/kpis usan los
+# índices gestionados y no recorren la tabla completa. Sale con código 1 si falla.
+# Uso: python -m backend.benchmarks.explain_check --rows 50000
+import argparse
+import os
+import tempfile
+from ..indexes import ensure_indexes, explain_kpis
+from ..rollup import rebuild
+from .synthetic import make_engine, populate
+
+# consulta → índice que el plan debe mencionar
+EXPECTED = {
+    "raw_store": "COVERING INDEX ix_measurements_pv_fecha_cover",
+    "raw_all": "ix_measurements_fecha",
+    "rollup_store": "COVERING INDEX ix_rollup_pv_fecha_cover",
+    # sin tienda, el rango de fecha usa la clave primaria (fecha, pv, codigo_barra)
+    "rollup_all": "measurement_daily_rollup USING",
+}
+
+
+def check(plans: dict[str, list[str]]) -> list[str]:
+    failures = []
+    for name, expected in EXPECTED.items():
+        plan = plans[name]
+        if not any(expected in line for line in plan):
+            failures.append(f"{name}: no usa {expected!r}")
+        full_scans = [l for l in plan if l.startswith("SCAN") and "INDEX" not in l
+                      and ("measurements" in l or "measurement_daily_rollup" in l)]
+        if full_scans:
+            failures.append(f"{name}: recorrido completo → {full_scans}")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50_000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, "explain.db"))
+        populate(engine, args.rows)
+        ensure_indexes(engine)
+        rebuild(engine)
+        plans = explain_kpis(engine, store="PV-001", date_from="2025-03-01", date_to="2025-03-31")
+        engine.dispose()
+
+    for name, plan in plans.items():
+        print(f"[{name}]")
+        for line in plan:
+            print("  " + line)
+    failures = check(plans)
+    for f in failures:
+        print("FALLA " + f)
+    print("OK" if not failures else f"{len(failures)} fallas")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# backend/benchmarks/export_memory.py
+# Verifica que la exportación en streaming (/api/measurements/export) usa memoria
+# constante: exporta una BD chica y una grande y compara los picos.
+# Uso: python -m backend.benchmarks.export_memory --rows 1000000 --format csv
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy.orm import sessionmaker
+from ..routers.measurements import export_rows, ndjson_lines, csv_chunks
+from .synthetic import make_engine, populate
+
+
+def measure(tmp: str, rows: int, fmt: str):
+    engine = make_engine(os.path.join(tmp, f"db_{rows}.db"))
+    populate(engine, rows)
+    factory = sessionmaker(bind=engine)
+    writer = csv_chunks if fmt == "csv" else ndjson_lines
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    size = 0
+    for part in writer(export_rows(None, None, None, session_factory=factory)):
+        size += len(part)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    engine.dispose()
+    return size, peak, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--format", choices=("csv", "ndjson"), default="ndjson")
+    ap.add_argument("--tolerance", type=float, default=1.5, help="pico(grande) / pico(chico) máximo")
+    args = ap.parse_args()
+
+    small = max(20_000, args.rows // 10)
+    with tempfile.TemporaryDirectory() as tmp:
+        peaks = []
+        for rows in (small, args.rows):
+            size, peak, elapsed = measure(tmp, rows, args.format)
+            peaks.append(peak)
+            print(f"{rows:>10,d} filas  salida={size / 2**20:8.1f} MiB  pico={peak / 2**20:6.1f} MiB  "
+                  f"{elapsed:6.1f}s  ({rows / elapsed:,.0f} filas/s)")
+    ratio = peaks[1] / peaks[0]
+    ok = ratio <= args.tolerance
+    print(f"ratio de pico grande/chico = {ratio:.2f} → {'OK' if ok else 'FALLA'} (tolerancia {args.tolerance})")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
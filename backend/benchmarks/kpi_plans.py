@@ -0,0 +1,85 @@
+# backend/benchmarks/kpi_plans.py
+# Compara el plan anterior de /api/kpis (5 consultas) con compute_kpis sobre la tabla
+# cruda (sentencia única con filtros, dos consultas sin filtros) y sobre el rollup.
+# Uso: python -m backend.benchmarks.kpi_plans --rows 500000
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..models import Measurement
+from ..aggregates import compute_kpis, measurement_filters, to_float
+from ..rollup import rebuild
+from .synthetic import make_engine, populate
+
+
+def legacy_kpis(db: Session, store=None, date_from=None, date_to=None):
+    """Plan original: count, sum(osa), sum(oos), serie y peores SKU por separado."""
+    filters = measurement_filters(store, date_from, date_to)
+    total = db.query(func.count(Measurement.id)).filter(*filters).scalar() or 0
+    if total == 0:
+        return {"total": 0, "osa_pct": 0.0, "oos_pct": 0.0, "series": [], "worst_sku": []}
+    osa_sum = db.query(func.sum(Measurement.osa_flag)).filter(*filters).scalar() or 0
+    oos_sum = db.query(func.sum(Measurement.oos_flag)).filter(*filters).scalar() or 0
+    series_rows = (
+        db.query(Measurement.fecha, func.avg(Measurement.osa_flag))
+        .filter(*filters).group_by(Measurement.fecha).order_by(Measurement.fecha).all()
+    )
+    worst_rows = (
+        db.query(Measurement.codigo_barra, func.avg(Measurement.osa_flag))
+        .filter(*filters).group_by(Measurement.codigo_barra)
+        .order_by(func.avg(Measurement.osa_flag), Measurement.codigo_barra).limit(5).all()
+    )
+    return {
+        "total": total,
+        "osa_pct": round(to_float(osa_sum) * 100.0 / total, 2),
+        "oos_pct": round(to_float(oos_sum) * 100.0 / total, 2),
+        "series": [{"date": str(d), "osa_pct": round(to_float(v) * 100.0, 2)} for d, v in series_rows],
+        "worst_sku": [{"barcode": b, "osa_pct": round(to_float(v) * 100.0, 2)} for b, v in worst_rows],
+    }
+
+
+def timeit(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def comparable(r: dict) -> dict:
+    # la serie nueva además trae n por bucket; se comparan fecha y porcentaje
+    return {**r, "series": [(p["date"], p["osa_pct"]) for p in r["series"]]}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, "bench.db"))
+        populate(engine, args.rows)
+        rebuild(engine)
+        cases = {
+            "sin filtros": {},
+            "tienda": {"store": "PV-007"},
+            "tienda + rango": {"store": "PV-007", "date_from": "2025-03-01", "date_to": "2025-05-31"},
+            "rango": {"date_from": "2025-03-01", "date_to": "2025-05-31"},
+        }
+        with Session(engine) as db:
+            for name, kw in cases.items():
+                t_old, r_old = timeit(lambda: legacy_kpis(db, **kw), args.repeat)
+                t_new, r_new = timeit(lambda: compute_kpis(db, source="raw", **kw), args.repeat)
+                t_rol, r_rol = timeit(lambda: compute_kpis(db, source="rollup", **kw), args.repeat)
+                same = comparable(r_old) == comparable(r_new) == comparable(r_rol)
+                print(f"{name:16s} legacy={t_old*1000:8.1f} ms  nuevo={t_new*1000:8.1f} ms  "
+                      f"rollup={t_rol*1000:8.1f} ms  x{t_old / t_rol:5.1f}  iguales={same}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
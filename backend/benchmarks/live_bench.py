@@ -0,0 +1,164 @@
+# backend/benchmarks/live_bench.py
+# /api/kpis/stream con muchos dashboards abiertos: levanta la API sobre un SQLite
+# temporal con N filas, conecta --clients clientes SSE repartidos en --filters filtros
+# (tienda / rango / agrupación) y hace --imports importaciones de --batch filas del
+# último día (como una carga diaria).
+# Mide la latencia commit → delta en cada cliente, el tamaño de los eventos frente a la
+# respuesta completa de /api/kpis, el tiempo del hilo de vistas por commit y lo que
+# costaría que cada cliente volviera a pedir /api/kpis tras cada importación.
+# Uso: python -m backend.benchmarks.live_bench --rows 200000 --clients 200 --imports 10
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--clients", type=int, default=200)
+    ap.add_argument("--filters", type=int, default=20, help="filtros distintos entre los clientes")
+    ap.add_argument("--imports", type=int, default=10)
+    ap.add_argument("--batch", type=int, default=2_000, help="filas por importación")
+    ap.add_argument("--idle", type=float, default=5.0, help="segundos sin importaciones")
+    ap.add_argument("--port", type=int, default=8766)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    # la API lee la configuración al importarse
+    os.environ.update(USE_SQLITE="true", SQLITE_PATH=os.path.join(tmp, "live.db"), CACHE_ENABLED="false",
+                      METRICS_ENABLED="false", ARCHIVE_DIR=os.path.join(tmp, "archive"))
+    import httpx
+    import polars as pl
+    import uvicorn
+    from sqlalchemy.orm import sessionmaker
+    from .synthetic import populate, generate_rows
+    from ..db import engine
+    from ..aggregates import compute_kpis
+    from ..cache import query_cache
+    from ..ingest import bulk_insert
+    from .. import live
+
+    populate(engine, args.rows)
+    from ..main import app
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    rng = random.Random(1)
+    filters = [{}]
+    while len(filters) < args.filters:
+        f = {"group_by": rng.choice(["day", "week", "month"]), "ma_window": 7, "max_points": 400}
+        if rng.random() < 0.7:
+            f["store"] = f"PV-{rng.randrange(50):03d}"
+        if rng.random() < 0.5:
+            f["date_from"] = f"2025-{rng.randint(1, 6):02d}-01"
+        filters.append(f)
+
+    # versión de datos → momento del commit (listener en el mismo proceso)
+    committed = {}
+    query_cache.add_change_listener(lambda _: committed.setdefault(query_cache.data_version, time.perf_counter()))
+    apply_ms = []
+    original = live.hub._apply
+
+    def timed(deltas):
+        t0 = time.perf_counter()
+        original(deltas)
+        apply_ms.append((time.perf_counter() - t0) * 1000)
+    live.hub._apply = timed
+
+    latencies, sizes = [], {"snapshot": [], "delta": []}
+    received = [0]
+    loop = asyncio.new_event_loop()
+
+    async def client(http, params, ready):
+        url = f"http://127.0.0.1:{args.port}/api/kpis/stream"
+        async with http.stream("GET", url, params=params) as r:
+            kind = None
+            async for line in r.aiter_lines():
+                if line.startswith("event: "):
+                    kind = line[7:]
+                elif line.startswith("data: "):
+                    now = time.perf_counter()
+                    sizes[kind].append(len(line) - 6)
+                    if kind == "snapshot":
+                        ready.release()
+                    else:
+                        version = int(json.loads(line[6:])["version"].split("-")[1])
+                        latencies.append((now - committed[version]) * 1000)
+                    received[0] += 1
+
+    async def connect(ready):
+        http = httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=None))
+        for i in range(args.clients):
+            asyncio.ensure_future(client(http, filters[i % len(filters)], ready))
+
+    ready = threading.Semaphore(0)
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    t0 = time.perf_counter()
+    asyncio.run_coroutine_threadsafe(connect(ready), loop).result()
+    for _ in range(args.clients):
+        ready.acquire()
+    connect_s = time.perf_counter() - t0
+
+    # sin importaciones: solo keep-alive
+    cpu0 = time.process_time()
+    time.sleep(args.idle)
+    idle_cpu = time.process_time() - cpu0
+
+    Session = sessionmaker(bind=engine)
+    stats = live.hub.stats()
+    import_s = []
+    for i in range(args.imports):
+        # como una carga diaria: las visitas del último día
+        rows = list(generate_rows(args.batch, seed=1000 + i, start=date(2025, 12, 31), days=1))
+        for r in rows:
+            r["id_conjunto"] = f"L{i}-" + r["id_conjunto"]
+        t0 = time.perf_counter()
+        bulk_insert(pl.DataFrame(rows), chunk_size=args.batch)
+        import_s.append(time.perf_counter() - t0)
+        time.sleep(0.5)
+    time.sleep(1.0)
+
+    # alternativa: cada cliente vuelve a pedir /api/kpis tras cada importación
+    refetch_ms = []
+    with Session() as db:
+        for f in filters:
+            t0 = time.perf_counter()
+            full = compute_kpis(db, **f)
+            refetch_ms.append((time.perf_counter() - t0) * 1000)
+    per_filter = statistics.fmean(refetch_ms)
+
+    print(f"{args.rows:,d} filas; {args.clients} clientes SSE en {stats['views']} vistas; "
+          f"conexión y snapshot de todos: {connect_s:.2f} s")
+    print(f"CPU del proceso en {args.idle:.0f} s sin importaciones: {idle_cpu * 1000:.0f} ms")
+    print(f"{args.imports} importaciones de {args.batch:,d} filas; bulk_insert p50 {pct(import_s, .5) * 1000:.0f} ms")
+    print(f"deltas recibidos: {len(latencies)}; latencia commit → cliente p50 {pct(latencies, .5):.1f} ms, "
+          f"p99 {pct(latencies, .99):.1f} ms")
+    print(f"hilo de vistas por commit: p50 {pct(apply_ms, .5):.1f} ms, máx {max(apply_ms, default=0):.1f} ms")
+    print(f"evento delta: media {statistics.fmean(sizes['delta'] or [0]):,.0f} bytes; "
+          f"snapshot / /api/kpis completo: {statistics.fmean(sizes['snapshot']):,.0f} bytes "
+          f"(ej. {len(json.dumps(full)):,d})")
+    print(f"refetch de /api/kpis por cliente: {per_filter:.1f} ms de consulta → "
+          f"{per_filter * args.clients:,.0f} ms por importación para {args.clients} clientes")
+    server.should_exit = True
+    loop.call_soon_threadsafe(loop.stop)
+    time.sleep(0.3)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
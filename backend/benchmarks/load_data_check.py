@@ -0,0 +1,136 @@
+# backend/benchmarks/load_data_check.py
+# Comprueba la vía LOAD DATA LOCAL INFILE de ingest.py (MYSQL_LOAD_DATA=true):
+# 1. siempre: las líneas de ingest.tsv_lines leídas con las reglas de LOAD DATA
+#    (ESCAPED BY '\\', NULL = \N sin escapar) devuelven los valores originales, incluidos
+#    barras, tabs, saltos de línea, el texto "\N" y NULL;
+# 2. con MySQL (USE_SQLITE=false, MYSQL_LOAD_DATA=true): escribe las mismas filas por
+#    LOAD DATA y por el upsert executemany en una transacción, las relee, las compara
+#    columna a columna y hace rollback.
+# Sale con código 1 si algo difiere.
+# Uso: python -m backend.benchmarks.load_data_check [--rows 500]
+import argparse
+import sys
+from sqlalchemy import select
+from ..db import engine
+from ..models import Measurement
+from ..normalize import MEASUREMENT_COLUMNS
+from .. import ingest
+from .synthetic import generate_rows
+
+_UNESCAPE = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+# valores que el csv.writer anterior corrompía o que rompen un TSV sin escapar
+TRICKY = {
+    "descripcion_sku": "C:\\temp\\nuevo",
+    "causal": "con\ttab",
+    "provincia": "línea\nnueva",
+    "marca": "\\N",
+    "responsable": "termina en barra\\",
+    "sector_operativo": "retorno\r y nul\0",
+}
+
+
+def read_tsv(data: str) -> list[list[str | None]]:
+    """Lector de referencia con las reglas de LOAD DATA ... ESCAPED BY '\\'."""
+    rows, row, field, null, i = [], [], [], False, 0
+    while i < len(data):
+        c = data[i]
+        if c == "\\" and i + 1 < len(data):
+            nxt = data[i + 1]
+            if nxt == "N" and not field and data[i + 2:i + 3] in ("", "\t", "\n"):
+                null = True
+            else:
+                field.append(_UNESCAPE.get(nxt, nxt))
+            i += 2
+            continue
+        if c in "\t\n":
+            row.append(None if null else "".join(field))
+            field, null = [], False
+            if c == "\n":
+                rows.append(row)
+                row = []
+        else:
+            field.append(c)
+        i += 1
+    return rows
+
+
+def as_text(v):
+    if v is None:
+        return None
+    if isinstance(v, bool):
+        return "1" if v else "0"
+    return str(v)
+
+
+def sample_rows(n: int) -> list[dict]:
+    rows = []
+    for i, r in enumerate(generate_rows(n, seed=3)):
+        r = {c: r.get(c) for c in MEASUREMENT_COLUMNS}
+        if i % 3 == 0:
+            r.update(TRICKY)
+        rows.append(r)
+    return rows
+
+
+def check_tsv(rows: list[dict]) -> list[str]:
+    with_nulls = [dict(r, codigo_barra=None, fecha_hora_medicion=None) if i % 4 == 0 else r
+                  for i, r in enumerate(rows)]
+    batch = {c: [r[c] for r in with_nulls] for c in MEASUREMENT_COLUMNS}
+    parsed = read_tsv("".join(ingest.tsv_lines(batch)))
+    failures = []
+    if len(parsed) != len(with_nulls):
+        failures.append(f"TSV: {len(parsed)} líneas para {len(with_nulls)} filas")
+    for i, (r, got) in enumerate(zip(with_nulls, parsed)):
+        expected = [as_text(r[c]) for c in MEASUREMENT_COLUMNS]
+        for c, e, g in zip(MEASUREMENT_COLUMNS, expected, got):
+            if e != g:
+                failures.append(f"TSV fila {i} {c}: {e!r} → {g!r}")
+    return failures
+
+
+def check_mysql(rows: list[dict]) -> list[str]:
+    t = Measurement.__table__
+    loaded = [dict(r, id_conjunto="LD-" + r["id_conjunto"]) for r in rows]
+    upserted = [dict(r, id_conjunto="EM-" + r["id_conjunto"]) for r in rows]
+    failures = []
+    with engine.connect() as conn, conn.begin() as trans:
+        ingest._load_data_infile(conn, {c: [r[c] for r in loaded] for c in MEASUREMENT_COLUMNS})
+        conn.execute(ingest.upsert_statement(conn), upserted)
+
+        def read(prefix):
+            q = (select(*(t.c[c] for c in MEASUREMENT_COLUMNS)).where(t.c.id_conjunto.like(prefix + "%"))
+                 .order_by(t.c.id_conjunto, t.c.pv, t.c.codigo_barra, t.c.fecha_hora_medicion))
+            return [dict(r._mapping, id_conjunto=r.id_conjunto[3:]) for r in conn.execute(q)]
+        a, b = read("LD-"), read("EM-")
+        trans.rollback()
+    if len(a) != len(b):
+        failures.append(f"MySQL: {len(a)} filas por LOAD DATA y {len(b)} por executemany")
+    for i, (x, y) in enumerate(zip(a, b)):
+        for c in MEASUREMENT_COLUMNS:
+            if x[c] != y[c]:
+                failures.append(f"MySQL fila {i} {c}: LOAD DATA {x[c]!r} ≠ executemany {y[c]!r}")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=500)
+    args = ap.parse_args()
+    rows = sample_rows(args.rows)
+    failures = check_tsv(rows)
+    print(f"TSV: {args.rows} filas, {len(failures)} diferencias")
+    if engine.dialect.name == "mysql":
+        if not ingest.MYSQL_LOAD_DATA:
+            print("MySQL: MYSQL_LOAD_DATA=false, se omite la comparación contra la BD")
+        else:
+            found = check_mysql(rows)
+            print(f"MySQL: {len(found)} diferencias entre LOAD DATA y executemany")
+            failures += found
+    for f in failures[:20]:
+        print("  " + f)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
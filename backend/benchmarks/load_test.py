@@ -0,0 +1,98 @@
+# backend/benchmarks/load_test.py
+# Prueba de carga contra un servidor en marcha: para cada nivel de concurrencia
+# lanza N peticiones a /api/kpis y /api/measurements y reporta p50/p99, throughput,
+# errores y el estado del pool de conexiones (/api/db/pool) al terminar el nivel.
+# Uso:
+#   uvicorn backend.main:app --port 8000 &
+#   python -m backend.benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 1,8,32,64
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import httpx
+
+
+def make_paths(n: int, stores: int, bust_cache: bool, seed: int = 7):
+    """Mezcla de consultas del dashboard; con bust_cache cada una usa un rango distinto."""
+    rnd = random.Random(seed)
+    paths = []
+    for i in range(n):
+        store = f"PV-{rnd.randrange(stores):03d}"
+        month = rnd.randrange(1, 13)
+        day_to = rnd.randrange(1, 29) if bust_cache else 28
+        rng = f"date_from=2025-{month:02d}-01&date_to=2025-{month:02d}-{day_to:02d}"
+        kind = rnd.random()
+        if kind < 0.5:
+            paths.append(f"/api/kpis?store={store}&{rng}")
+        elif kind < 0.7:
+            paths.append(f"/api/kpis?{rng}&group_by=week&ma_window=4")
+        else:
+            paths.append(f"/api/measurements?store={store}&{rng}&limit=100")
+    return paths
+
+
+def pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+async def run_level(client: httpx.AsyncClient, paths: list[str], concurrency: int):
+    queue = asyncio.Queue()
+    for p in paths:
+        queue.put_nowait(p)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path)
+                if r.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - t0
+
+
+async def main_async(args):
+    levels = [int(x) for x in args.concurrency.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        await client.get("/api/kpis")  # calentamiento
+        print(f"{'conc':>5} {'req':>6} {'p50 ms':>9} {'p99 ms':>9} {'media ms':>9} {'req/s':>8} {'err':>5}  pool")
+        for level in levels:
+            paths = make_paths(args.requests, args.stores, args.bust_cache, seed=level)
+            lat, errors, elapsed = await run_level(client, paths, level)
+            pool = (await client.get("/api/db/pool")).json()
+            sync = pool.get("async") or pool.get("sync") or {}
+            print(f"{level:>5} {len(lat):>6} {pct(lat, .5)*1000:>9.1f} {pct(lat, .99)*1000:>9.1f} "
+                  f"{statistics.fmean(lat)*1000:>9.1f} {len(lat) / elapsed:>8.1f} {errors:>5}  "
+                  f"overflow={sync.get('overflow')} espera_p99={sync.get('wait_ms_p99')}ms "
+                  f"timeouts={sync.get('timeouts')}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--concurrency", default="1,8,32,64")
+    ap.add_argument("--requests", type=int, default=400, help="peticiones por nivel")
+    ap.add_argument("--stores", type=int, default=50)
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--bust-cache", action="store_true", help="rangos distintos para evitar la caché")
+    asyncio.run(main_async(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# backend/benchmarks/normalize_bench.py
+# Compara la limpieza fila a fila con pandas (ruta anterior del router) con la
+# etapa Polars de normalize.normalize sobre el mismo bloque de texto.
+# Uso: python -m backend.benchmarks.normalize_bench --rows 200000
+import argparse
+import time
+import pandas as pd
+import polars as pl
+from ..normalize import COLS_MAP, normalize
+from .synthetic import generate_rows
+
+
+def legacy_pandas_clean(df: pd.DataFrame) -> pd.DataFrame:
+    """Ruta anterior: to_datetime, strip por columna, apply por fila y strftime por fila."""
+    df = df.rename(columns=COLS_MAP)
+    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
+    df["fecha_hora_medicion"] = pd.to_datetime(df["fecha_hora_medicion"], errors="coerce")
+    for col in ["pv", "formato", "descripcion_sku", "causal", "estado", "tipo_resultado",
+                "categoria", "marca", "formato_marketing", "responsable", "sector_operativo",
+                "provincia", "cliente", "proveedor"]:
+        df[col] = df[col].astype(str).str.strip()
+    df["estado"] = df["estado"].str.upper()
+    df["tipo_resultado"] = df["tipo_resultado"].str.upper()
+    df["codigo_barra"] = df["codigo_barra"].astype(str).str.replace(r"\.0$", "", regex=True).str.strip()
+    df = df[(df["fecha"] >= pd.to_datetime("2023-01-01")) & (df["fecha"] <= pd.to_datetime("2026-12-31"))]
+    df = df.dropna(subset=["id_conjunto", "fecha", "pv", "codigo_barra", "descripcion_sku", "estado", "tipo_resultado"])
+    df["osa_flag"] = df["tipo_resultado"].apply(lambda x: 1 if str(x).strip().upper() == "OSA" else 0)
+    df["oos_flag"] = df["tipo_resultado"].apply(lambda x: 1 if str(x).strip().upper() == "OOS" else 0)
+    df["dia_semana"] = df["fecha"].apply(lambda f: f.strftime("%A"))
+    df["nro_semana"] = df["fecha"].apply(lambda f: f.strftime("%V"))
+    return df
+
+
+def text_rows(n: int):
+    headers = list(COLS_MAP.keys())
+    rows = [[None if row[c] is None else str(row[c]) for c in COLS_MAP.values()] for row in generate_rows(n)]
+    return headers, rows
+
+
+def best_of(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    headers, rows = text_rows(args.rows)
+    pdf = pd.DataFrame(rows, columns=headers, dtype=object)
+    pldf = pl.DataFrame(rows, schema={h: pl.Utf8 for h in headers}, orient="row")
+
+    t_pd, out_pd = best_of(lambda: legacy_pandas_clean(pdf.copy()), args.repeat)
+    t_pl, out_pl = best_of(lambda: normalize(pldf), args.repeat)
+    print(f"{args.rows:,d} filas  pandas={t_pd*1000:8.1f} ms  polars={t_pl*1000:8.1f} ms  x{t_pd / t_pl:5.1f}")
+    print(f"filas resultantes: pandas={len(out_pd):,d} polars={out_pl.height:,d}  "
+          f"osa iguales={int(out_pd['osa_flag'].sum()) == int(out_pl['osa_flag'].sum())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# backend/benchmarks/partition_bench.py
+# Retención y archivo a Parquet: genera N filas sintéticas repartidas en --days días,
+# mide /api/kpis (crudo y rollup) sobre el último trimestre, todo el historial y un
+# trimestre viejo; archiva lo anterior a --retention meses (partitions.archive) y
+# vuelve a medir. Reporta el tamaño de la BD antes y después (dbstat) y el del archivo,
+# y verifica que los KPIs no cambian al pasar a leer los meses viejos del Parquet.
+# Uso: python -m backend.benchmarks.partition_bench --rows 500000 --days 1095 --retention 12
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from .synthetic import make_engine, populate
+from .storage_bench import table_sizes, sample
+from .. import partitions
+from ..aggregates import compute_kpis
+from ..indexes import ensure_indexes
+from ..rollup import rebuild as rebuild_rollup
+
+TABLES = ("measurements", "measurement_daily_rollup")
+
+
+def cases(start: date, end: date) -> dict:
+    recent = (end - timedelta(days=90)).isoformat()
+    old = start + timedelta(days=30)
+    return {
+        "último trimestre": {"date_from": recent, "date_to": end.isoformat()},
+        "todo el historial": {},
+        "todo, una tienda": {"store": "PV-007"},
+        "trimestre viejo": {"date_from": old.isoformat(), "date_to": (old + timedelta(days=90)).isoformat()},
+    }
+
+
+def measure(Session, params: dict, repeat: int) -> dict:
+    out, results = {}, {}
+    for src in ("raw", "rollup"):
+        def run():
+            with Session() as db:
+                results[src] = compute_kpis(db, source=src, **params)
+        out[src] = sample(run, repeat)
+    return out, results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=300_000)
+    ap.add_argument("--days", type=int, default=1095)
+    ap.add_argument("--retention", type=int, default=12, help="meses que quedan en la BD")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    start = date(2023, 1, 1)
+    end = start + timedelta(days=args.days - 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        partitions.ARCHIVE_DIR = partitions.Path(tmp) / "archive"
+        bind = make_engine(os.path.join(tmp, "partitions.db"))
+        populate(bind, args.rows, days=args.days, start=start)
+        ensure_indexes(bind)
+        rebuild_rollup(bind)
+        with bind.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        Session = sessionmaker(bind=bind)
+        size_before = sum(sum(s.values()) for t, s in table_sizes(bind).items() if t in TABLES)
+
+        before = {name: measure(Session, p, args.repeat) for name, p in cases(start, end).items()}
+        t0 = time.perf_counter()
+        archived = partitions.archive(args.retention, bind=bind, today=end)
+        seconds = time.perf_counter() - t0
+        with bind.begin() as conn:
+            conn.execute(text("VACUUM"))
+        after = {name: measure(Session, p, args.repeat) for name, p in cases(start, end).items()}
+
+        size_after = sum(sum(s.values()) for t, s in table_sizes(bind).items() if t in TABLES)
+        rows = sum(r["rows"] for r in archived)
+        parquet = sum(r["bytes"] for r in archived)
+        print(f"{args.rows:,d} filas en {args.days} días; retención {args.retention} meses")
+        print(f"archivados {len(archived)} meses, {rows:,d} filas en {seconds:.1f} s")
+        print(f"BD (mediciones + rollup): {size_before / 2**20:.1f} MB → {size_after / 2**20:.1f} MB; "
+              f"Parquet {parquet / 2**20:.1f} MB ({parquet / max(rows, 1):.0f} bytes/fila)")
+
+        print(f"\n{'kpis (p50 ms)':24s} {'fuente':>7} {'antes':>9} {'después':>9} {'razón':>7} {'igual':>6}")
+        for name in before:
+            (t_before, r_before), (t_after, r_after) = before[name], after[name]
+            for src in ("raw", "rollup"):
+                same = json.dumps(r_before[src], sort_keys=True) == json.dumps(r_after[src], sort_keys=True)
+                print(f"{name:24s} {src:>7} {t_before[src]:>9.1f} {t_after[src]:>9.1f} "
+                      f"x{t_before[src] / t_after[src]:>6.2f} {'sí' if same else 'NO':>6}")
+        bind.dispose()
+
+
+if __name__ == "__main__":
+    main()
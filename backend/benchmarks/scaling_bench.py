@@ -0,0 +1,101 @@
+# backend/benchmarks/scaling_bench.py
+# Escalado de /api/kpis con la cantidad de workers: genera un SQLite sintético, levanta
+# gunicorn (gunicorn_conf.py, SHARED_STATE=sqlite) con 1, 2, 4... workers y lanza la
+# misma mezcla de consultas que load_test. Reporta req/s, p50/p99 y la aceleración
+# frente a 1 worker. Con --bust-cache mide trabajo real; sin él, la caché caliente.
+# Uso: python -m backend.benchmarks.scaling_bench --rows 200000 --workers 1,2,4 --concurrency 32
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import httpx
+
+from .load_test import make_paths, pct, run_level
+from .synthetic import make_engine, populate
+
+REPO = Path(__file__).resolve().parents[2]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(proc, port: int, timeout: float = 120.0):
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn terminó antes de estar listo")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1) as r:
+                if r.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError("gunicorn no respondió /healthz")
+
+
+async def drive(port: int, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+        # calentamiento: cada worker llena su caché / planes
+        await run_level(client, make_paths(args.requests // 4, args.stores, False, seed=1), args.concurrency)
+        paths = make_paths(args.requests, args.stores, args.bust_cache, seed=2)
+        lat, errors, elapsed = await run_level(client, paths, args.concurrency)
+    return {"rps": len(lat) / elapsed, "p50": pct(lat, .5) * 1000, "p99": pct(lat, .99) * 1000,
+            "mean": statistics.fmean(lat) * 1000, "errors": errors}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--stores", type=int, default=50)
+    ap.add_argument("--bust-cache", action="store_true", help="rangos distintos para evitar la caché")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "scaling.db")
+        bench_engine = make_engine(db_path)
+        populate(bench_engine, args.rows)
+        bench_engine.dispose()
+
+        print(f"{os.cpu_count()} núcleos, {args.rows:,d} filas, concurrencia {args.concurrency}")
+        print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'err':>5} {'acel.':>6}")
+        base = None
+        for n in (int(w) for w in args.workers.split(",")):
+            port = free_port()
+            env = {**os.environ, "USE_SQLITE": "true", "SQLITE_PATH": db_path, "PORT": str(port),
+                   "WEB_CONCURRENCY": str(n), "SHARED_STATE": "sqlite",
+                   "SHARED_STATE_PATH": os.path.join(tmp, f"shared_{n}.db"),
+                   "INDEX_EXPLAIN_REPORT": "false", "METRICS_ENABLED": "false",
+                   "IMPORT_UPLOAD_DIR": os.path.join(tmp, "uploads")}
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", "-c", "backend/gunicorn_conf.py", "backend.main:app",
+                 "--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+                cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_ready(proc, port)
+                r = asyncio.run(drive(port, args))
+            finally:
+                proc.terminate()
+                proc.wait()
+            base = base or r["rps"]
+            print(f"{n:>7} {r['rps']:>9.1f} {r['p50']:>8.1f} {r['p99']:>8.1f} {r['errors']:>5} "
+                  f"x{r['rps'] / base:>5.2f}")
+
+
+if __name__ == "__main__":
+    main()
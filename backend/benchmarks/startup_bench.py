@@ -0,0 +1,102 @@
+# backend/benchmarks/startup_bench.py
+# Tiempo de arranque en frío: importar backend.main (y qué dependencias pesadas
+# quedan cargadas) y "ready" = desde lanzar uvicorn hasta el primer 200 de /healthz.
+# Compara BD nueva (corre DDL), BD al día (schema_meta coincide, sin DDL) y
+# SCHEMA_SYNC=always (DDL en cada arranque, comportamiento anterior).
+# Uso: python -m backend.benchmarks.startup_bench --runs 5 [--json startup.json]
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parents[2]
+HEAVY = ("polars", "numpy", "pandas", "openpyxl", "sqlalchemy.dialects.mysql")
+
+IMPORT_PROBE = (
+    "import json, sys, time; t = time.perf_counter(); import backend.main; "
+    "print(json.dumps({'seconds': time.perf_counter() - t, "
+    f"'heavy': [m for m in {HEAVY!r} if m in sys.modules]}}))"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(env: dict) -> dict:
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=REPO, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure_ready(env: dict, timeout: float = 120.0) -> float:
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn terminó antes de estar listo")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("uvicorn no respondió /healthz")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--json", default=None, help="guardar resultados en este archivo")
+    args = ap.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        base = {**os.environ, "USE_SQLITE": "true", "INDEX_EXPLAIN_REPORT": "true",
+                "IMPORT_UPLOAD_DIR": os.path.join(tmp, "uploads")}
+
+        imports = [measure_import({**base, "SQLITE_PATH": os.path.join(tmp, "probe.db")}) for _ in range(args.runs)]
+        results["import_seconds"] = statistics.median(i["seconds"] for i in imports)
+        results["heavy_modules_at_import"] = imports[-1]["heavy"]
+
+        cold = []
+        for i in range(args.runs):
+            # archivo nuevo en cada corrida: create_all, índices y schema_meta
+            cold.append(measure_ready({**base, "SQLITE_PATH": os.path.join(tmp, f"cold_{i}.db")}))
+        warm_env = {**base, "SQLITE_PATH": os.path.join(tmp, "cold_0.db")}
+        warm = [measure_ready(warm_env) for _ in range(args.runs)]
+        always = [measure_ready({**warm_env, "SCHEMA_SYNC": "always"}) for _ in range(args.runs)]
+        results["ready_seconds"] = {
+            "bd_nueva": statistics.median(cold),
+            "esquema_al_dia": statistics.median(warm),
+            "ddl_siempre": statistics.median(always),
+        }
+
+    print(f"import backend.main: {results['import_seconds'] * 1000:7.1f} ms  "
+          f"(pesadas cargadas: {', '.join(results['heavy_modules_at_import']) or 'ninguna'})")
+    for name, seconds in results["ready_seconds"].items():
+        print(f"ready {name:16s} {seconds * 1000:7.1f} ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# backend/benchmarks/storage_bench.py
+# Almacenamiento ancho (measurements) vs normalizado (measurement_fact + dimensiones):
+# genera N filas sintéticas en un SQLite temporal, crea los índices gestionados, migra
+# con storage.migrate y compara el tamaño en disco (tabla + índices, vía dbstat) y la
+# latencia de las lecturas que recorren filas crudas: KPIs con KPI_SOURCE=raw, primera
+# página del listado, export y carga del motor en memoria.
+# Uso: python -m backend.benchmarks.storage_bench --rows 500000 --repeat 5
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from .synthetic import make_engine, populate
+from .. import storage, columnar
+from ..aggregates import compute_kpis
+from ..indexes import ensure_indexes
+from ..routers.measurements import list_page, export_rows
+
+WIDE_TABLES = ("measurements",)
+NORMALIZED_TABLES = ("measurement_fact", "stores", "dim_sku", "dim_value")
+
+
+def table_sizes(bind) -> dict[str, dict]:
+    """{tabla: {"data": bytes, "index": bytes}} (SQLite: dbstat; MySQL: information_schema)."""
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            owner = dict(conn.execute(text("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')")).all())
+            sizes = {}
+            for name, size in conn.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")):
+                table = owner.get(name, name)
+                entry = sizes.setdefault(table, {"data": 0, "index": 0})
+                entry["data" if name == table else "index"] += size
+            return sizes
+        rows = conn.execute(text(
+            "SELECT table_name, data_length, index_length FROM information_schema.tables "
+            "WHERE table_schema = DATABASE()")).all()
+        return {t: {"data": d, "index": i} for t, d, i in rows}
+
+
+def total(sizes: dict, tables) -> tuple[int, int]:
+    return (sum(sizes.get(t, {}).get("data", 0) for t in tables),
+            sum(sizes.get(t, {}).get("index", 0) for t in tables))
+
+
+def sample(fn, repeat: int) -> float:
+    fn()  # calentamiento
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return statistics.median(out) * 1000
+
+
+def cases(bind):
+    Session = sessionmaker(bind=bind)
+
+    def kpis(**params):
+        with Session() as db:
+            compute_kpis(db, source="raw", **params)
+
+    def page():
+        with Session() as db:
+            list_page(db, "PV-007", None, None, 200, None)
+
+    def export():
+        for _ in export_rows(None, "2025-03-01", "2025-03-31", session_factory=Session):
+            pass
+
+    return {
+        "kpis crudos/sin filtros": lambda: kpis(),
+        "kpis crudos/tienda": lambda: kpis(store="PV-007"),
+        "kpis crudos/tienda + rango": lambda: kpis(store="PV-007", date_from="2025-03-01", date_to="2025-05-31"),
+        "listado/primera página tienda": page,
+        "export/un mes": export,
+        "motor en memoria/carga": lambda: columnar.load_frame(bind),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bind = make_engine(os.path.join(tmp, "storage.db"))
+        t0 = time.perf_counter()
+        populate(bind, args.rows, seed=args.seed)
+        ensure_indexes(bind)
+        print(f"{args.rows:,d} filas generadas en {time.perf_counter() - t0:.1f} s")
+
+        t0 = time.perf_counter()
+        result = storage.migrate(bind)
+        print(f"migración: {result['copied']:,d} filas en {time.perf_counter() - t0:.1f} s, "
+              f"verificación {'OK' if result['ok'] else 'NO COINCIDE'}")
+        with bind.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+        sizes = table_sizes(bind)
+        wide, narrow = total(sizes, WIDE_TABLES), total(sizes, NORMALIZED_TABLES)
+        print(f"\n{'':24s} {'datos MB':>10} {'índices MB':>11} {'total MB':>10} {'bytes/fila':>11}")
+        for name, (data, index) in (("ancho", wide), ("normalizado", narrow)):
+            print(f"{name:24s} {data / 2**20:>10.1f} {index / 2**20:>11.1f} {(data + index) / 2**20:>10.1f} "
+                  f"{(data + index) / max(args.rows, 1):>11.0f}")
+        print(f"{'reducción':24s} {'':>10} {'':>11} x{sum(wide) / max(sum(narrow), 1):>9.2f}")
+
+        print(f"\n{'consulta (p50 ms)':32s} {'ancho':>9} {'normalizado':>12} {'razón':>7}")
+        timings = {}
+        for mode in ("wide", "normalized"):
+            storage.MEASUREMENT_STORAGE = mode
+            timings[mode] = {name: sample(fn, args.repeat) for name, fn in cases(bind).items()}
+        for name in timings["wide"]:
+            w, n = timings["wide"][name], timings["normalized"][name]
+            print(f"{name:32s} {w:>9.1f} {n:>12.1f} x{w / n:>6.2f}")
+        bind.dispose()
+
+
+if __name__ == "__main__":
+    main()
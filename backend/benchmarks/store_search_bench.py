@@ -0,0 +1,100 @@
+# backend/benchmarks/store_search_bench.py
+# Type-ahead del selector de PV: genera N tiendas con nombres realistas en un SQLite
+# temporal y simula a un usuario escribiendo (cada prefijo de la consulta es una
+# petición). Compara la búsqueda indexada (store_search: name_norm + FTS5 trigram) con
+# el filtro anterior LOWER(name) LIKE '%q%' y el chequeo de duplicados LOWER(name) = ?.
+# Uso: python -m backend.benchmarks.store_search_bench --stores 50000 --queries 200
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine, func, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from ..db import Base
+from ..models import Store
+from ..normalize import normalize_name
+from .. import store_search
+
+WORDS = ["Super", "Hiper", "Express", "Mayorista", "Almacén", "Mercado", "Norte", "Sur", "Centro",
+         "Plaza", "Avenida", "San", "Martín", "Belgrano", "Córdoba", "Rosario", "Mendoza", "Salta",
+         "Jardín", "Parque", "Estación", "Libertad", "Colón", "Ñuñoa", "Rivadavia", "Sarmiento"]
+
+
+def store_names(n: int, rng: random.Random) -> list[str]:
+    names = set()
+    while len(names) < n:
+        names.add(f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 9999)}")
+    return list(names)
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stores", type=int, default=50_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--limit", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bind = create_engine(f"sqlite:///{os.path.join(tmp, 'stores.db')}")
+        Base.metadata.create_all(bind)
+        names = store_names(args.stores, rng)
+        with bind.begin() as conn:
+            conn.execute(insert(Store.__table__), [{"name": n, "name_norm": normalize_name(n)} for n in names])
+        store_search.ensure_search(bind)
+        with bind.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        Session = sessionmaker(bind=bind)
+
+        # lo que escribe el usuario: prefijos de un nombre o de una palabra del medio
+        typed = []
+        for _ in range(args.queries):
+            target = rng.choice(names)
+            word = rng.choice(target.split()) if rng.random() < 0.5 else target
+            typed += [word[:k].lower() for k in range(1, min(len(word), 8) + 1)]
+
+        def indexed(q):
+            with Session() as db:
+                store_search.search(db, q, args.limit)
+
+        def legacy(q):
+            with Session() as db:
+                db.query(Store).filter(func.lower(Store.name).like(func.lower(f"%{q}%"))) \
+                    .order_by(Store.id.desc()).limit(args.limit).all()
+
+        def dup_indexed(name):
+            with Session() as db:
+                db.query(Store.id).filter(Store.name_norm == normalize_name(name)).first()
+
+        def dup_legacy(name):
+            with Session() as db:
+                db.query(Store).filter(func.lower(Store.name) == func.lower(name)).first()
+
+        print(f"{args.stores:,d} tiendas, {len(typed):,d} consultas (1 a 8 caracteres)")
+        print(f"{'caso':34s} {'p50 ms':>8} {'p99 ms':>8} {'media':>8}")
+        checks = [names[rng.randrange(len(names))] for _ in range(len(typed) // 4)]
+        for label, fn, inputs in (("búsqueda indexada (ranking)", indexed, typed),
+                                  ("LIKE '%q%' anterior", legacy, typed),
+                                  ("duplicado por name_norm", dup_indexed, checks),
+                                  ("duplicado LOWER(name) anterior", dup_legacy, checks)):
+            fn(inputs[0])
+            lat = []
+            for x in inputs:
+                t0 = time.perf_counter()
+                fn(x)
+                lat.append((time.perf_counter() - t0) * 1000)
+            print(f"{label:34s} {pct(lat, .5):>8.2f} {pct(lat, .99):>8.2f} {statistics.fmean(lat):>8.2f}")
+        bind.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# backend/benchmarks/streaming_memory.py
+# Verifica que la ingesta en streaming mantiene el pico de memoria plano, en CSV y
+# en .xlsx (openpyxl read-only): por formato importa un archivo chico y uno grande
+# (1M filas en CSV, 200k en xlsx por defecto) y compara picos.
+# Se mide el pico de RSS (resource.getrusage: incluye lo que reservan Polars/Rust,
+# que tracemalloc no ve) en un proceso nuevo por archivo, descontando lo que ocupa
+# el proceso tras importar los módulos. Falla si ese pico crece con el archivo
+# (--tolerance) o si el del archivo grande pasa de --max-growth-mib.
+# Uso: python -m backend.benchmarks.streaming_memory [--rows 1000000] [--xlsx-rows 200000] [--formats csv xlsx]
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from .synthetic import write_file
+
+REPO = Path(__file__).resolve().parents[2]
+
+
+def peak_rss() -> int:
+    """Pico de RSS del proceso en bytes (ru_maxrss está en KiB en Linux, en bytes en macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def child(src: str, db: str, chunk_rows: int):
+    """Proceso hijo: solo la importación (CSV o xlsx según la extensión); imprime el resultado como JSON."""
+    from ..normalize import UPLOAD_OPTS
+    from ..streaming import ingest_file
+    from .synthetic import make_engine
+    from ..db import Base
+
+    engine = make_engine(db)
+    Base.metadata.create_all(engine)
+    base = peak_rss()
+    t0 = time.perf_counter()
+    stats = ingest_file(src, chunk_rows=chunk_rows, bind=engine, **UPLOAD_OPTS)
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({"rows": stats.rows, "base": base, "peak": peak_rss(), "elapsed": elapsed}))
+
+
+def measure(tmp: str, fmt: str, rows: int, chunk_rows: int) -> dict:
+    src = os.path.join(tmp, f"data_{rows}.{fmt}")
+    write_file(src, rows)
+    out = subprocess.run(
+        [sys.executable, "-m", "backend.benchmarks.streaming_memory", "--child", src,
+         os.path.join(tmp, f"db_{fmt}_{rows}.db"), "--chunk-rows", str(chunk_rows)],
+        cwd=REPO, check=True, capture_output=True, text=True,
+    )
+    os.remove(src)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000, help="filas del CSV grande")
+    ap.add_argument("--xlsx-rows", type=int, default=200_000, help="filas del xlsx grande")
+    ap.add_argument("--formats", nargs="+", choices=("csv", "xlsx"), default=["csv", "xlsx"])
+    ap.add_argument("--chunk-rows", type=int, default=20_000)
+    ap.add_argument("--tolerance", type=float, default=1.5,
+                    help="(pico - base)(grande) / (pico - base)(chico) máximo")
+    ap.add_argument("--max-growth-mib", type=float, default=192,
+                    help="pico - base máximo del archivo grande, en MiB")
+    ap.add_argument("--child", nargs=2, metavar=("FILE", "DB"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child(*args.child, args.chunk_rows)
+        return
+
+    failed = False
+    for fmt in args.formats:
+        big = args.rows if fmt == "csv" else args.xlsx_rows
+        small = max(args.chunk_rows * 2, big // 10)
+        with tempfile.TemporaryDirectory() as tmp:
+            growth = []
+            for rows in (small, big):
+                r = measure(tmp, fmt, rows, args.chunk_rows)
+                growth.append(max(r["peak"] - r["base"], 1))
+                print(f"{fmt:4s} {rows:>10,d} filas  insertadas={r['rows']:>10,d}  "
+                      f"RSS base={r['base'] / 2**20:7.1f} MiB  pico={r['peak'] / 2**20:7.1f} MiB  "
+                      f"(+{growth[-1] / 2**20:6.1f})  {r['elapsed']:6.1f}s  ({r['rows'] / r['elapsed']:,.0f} filas/s)")
+        ratio = growth[1] / growth[0]
+        ok = ratio <= args.tolerance and growth[1] <= args.max_growth_mib * 2**20
+        failed |= not ok
+        print(f"{fmt}: ratio de pico (sobre la base) grande/chico = {ratio:.2f}, "
+              f"pico del grande +{growth[1] / 2**20:.1f} MiB → {'OK' if ok else 'FALLA'} "
+              f"(tolerancia {args.tolerance}, máximo {args.max_growth_mib:g} MiB)")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# backend/benchmarks/suite.py
+# Suite de benchmarks reproducible. Por cada tamaño (10k, 1M y 10M filas por defecto)
+# genera un SQLite temporal con datos sintéticos (semilla fija) y, en un proceso
+# aparte con la app apuntando a ese archivo (USE_SQLITE + SQLITE_PATH, caché apagada),
+# mide:
+#   - GET /api/kpis: sin filtros, por tienda, tienda + rango y agrupado por semana
+#   - GET /api/measurements: primera página, por tienda y 5 páginas siguiendo el cursor
+#   - import_excel.load_excel_stats (CLI) con un CSV de --import-rows filas
+#   - POST /api/import/excel (router, streaming síncrono) con un .xlsx
+# El resultado es un JSON (commit, Python, parámetros y una entrada por caso) que se
+# compara entre commits con --compare; el código de salida es 1 si hay regresiones.
+# Uso:
+#   python -m backend.benchmarks.suite --sizes 10000,1000000 --out bench-$(git rev-parse --short HEAD).json
+#   python -m backend.benchmarks.suite --sizes 10000 --compare bench-abc1234.json
+# 10M filas en SQLite: varios GB de disco y del orden de una hora solo en generar los datos.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parents[2]
+DEFAULT_SIZES = "10000,1000000,10000000"
+
+KPI_CASES = {
+    "kpis/sin filtros": {},
+    "kpis/tienda": {"store": "PV-007"},
+    "kpis/tienda + rango": {"store": "PV-007", "date_from": "2025-03-01", "date_to": "2025-05-31"},
+    "kpis/semanal": {"date_from": "2025-01-01", "date_to": "2025-06-30", "group_by": "week", "ma_window": 4},
+}
+MEASUREMENT_CASES = {
+    "measurements/primera página": {"limit": 200},
+    "measurements/tienda": {"store": "PV-007", "limit": 200},
+    "measurements/tienda + rango": {"store": "PV-007", "date_from": "2025-03-01", "date_to": "2025-05-31", "limit": 200},
+}
+DEEP_PAGES = 5
+
+
+def latency(name: str, size: int, samples: list[float]) -> dict:
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "name": name, "size": size, "kind": "latency", "runs": len(ms),
+        "min_ms": round(ms[0], 3),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(0.95 * len(ms)))], 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+    }
+
+
+def throughput(name: str, size: int, rows: int, seconds: float, **extra) -> dict:
+    return {
+        "name": name, "size": size, "kind": "throughput", "rows": rows,
+        "seconds": round(seconds, 3), "rows_per_sec": round(rows / seconds, 1) if seconds else 0.0, **extra,
+    }
+
+
+def sample(fn, repeat: int) -> list[float]:
+    fn()  # calentamiento (caché de páginas de SQLite, planes)
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+# ---------- proceso hijo: un tamaño ----------
+def run_size(args) -> list[dict]:
+    # el entorno (SQLITE_PATH, CACHE_ENABLED...) ya viene del padre: recién aquí se importa la app
+    from fastapi.testclient import TestClient
+    from .synthetic import make_engine, populate, write_csv, write_xlsx
+
+    size, results = args.rows, []
+    t0 = time.perf_counter()
+    bench_engine = make_engine(os.environ["SQLITE_PATH"])
+    populate(bench_engine, size, seed=args.seed)
+    bench_engine.dispose()
+    results.append(throughput("setup/populate", size, size, time.perf_counter() - t0))
+
+    from ..import_excel import load_excel_stats
+    from ..main import app
+
+    t0 = time.perf_counter()
+    with TestClient(app) as client:
+        # arranque: índices, rollup y cubos sobre los datos recién generados
+        results.append(throughput("setup/startup", size, size, time.perf_counter() - t0))
+
+        def get(path, params):
+            r = client.get(path, params=params)
+            r.raise_for_status()
+            return r.json()
+
+        for name, params in KPI_CASES.items():
+            results.append(latency(name, size, sample(lambda: get("/api/kpis", params), args.repeat)))
+        for name, params in MEASUREMENT_CASES.items():
+            results.append(latency(name, size, sample(lambda: get("/api/measurements", params), args.repeat)))
+
+        def deep():
+            params = {"limit": 200}
+            for _ in range(DEEP_PAGES):
+                page = get("/api/measurements", params)
+                if not page["next_cursor"]:
+                    break
+                params["cursor"] = page["next_cursor"]
+        results.append(latency(f"measurements/{DEEP_PAGES} páginas por cursor", size, sample(deep, args.repeat)))
+
+        # importaciones al final: escriben en la BD; semillas distintas = filas nuevas
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "import.csv")
+            write_csv(csv_path, args.import_rows, seed=args.seed + 1)
+            t0 = time.perf_counter()
+            stats = load_excel_stats(csv_path, force=True)
+            results.append(throughput("import/load_excel (csv)", size, stats.rows, time.perf_counter() - t0,
+                                      inserted=stats.inserted, updated=stats.updated))
+
+            xlsx_path = os.path.join(tmp, "import.xlsx")
+            write_xlsx(xlsx_path, args.import_rows, seed=args.seed + 2)
+            with open(xlsx_path, "rb") as fh:
+                t0 = time.perf_counter()
+                r = client.post("/api/import/excel", params={"background": "false", "force": "true"},
+                                files={"file": ("import.xlsx", fh)})
+                elapsed = time.perf_counter() - t0
+            r.raise_for_status()
+            body = r.json()
+            results.append(throughput("import/router (xlsx)", size, body["total_rows"], elapsed,
+                                      inserted=body["inserted"], updated=body["updated"]))
+    return results
+
+
+# ---------- proceso padre ----------
+def git_meta() -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=REPO, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def spawn(size: int, args, tmp: str) -> list[dict]:
+    out = os.path.join(tmp, f"result_{size}.json")
+    env = {
+        **os.environ,
+        "USE_SQLITE": "true",
+        "SQLITE_PATH": os.path.join(tmp, f"bench_{size}.db"),
+        "CACHE_ENABLED": "false",          # se mide el trabajo, no la caché
+        "INDEX_EXPLAIN_REPORT": "false",
+        "ANALYTICS_ENGINE": args.engine,
+        "IMPORT_UPLOAD_DIR": os.path.join(tmp, "uploads"),
+    }
+    cmd = [sys.executable, "-m", "backend.benchmarks.suite", "--child", "--rows", str(size),
+           "--repeat", str(args.repeat), "--import-rows", str(args.import_rows),
+           "--seed", str(args.seed), "--child-out", out]
+    subprocess.run(cmd, cwd=REPO, env=env, check=True)
+    with open(out) as fh:
+        return json.load(fh)
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> int:
+    """Imprime la razón actual/base por caso y devuelve la cantidad de regresiones. Las
+    latencias se comparan por el mínimo (menos sensible al ruido de la máquina que p50)."""
+    base = {(r["name"], r["size"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"\ncomparación con {baseline['meta'].get('commit', '?')[:12]} (umbral x{threshold})")
+    for r in current["results"]:
+        b = base.get((r["name"], r["size"]))
+        if b is None or r["name"].startswith("setup/"):
+            continue
+        if r["kind"] == "latency":
+            ratio = r["min_ms"] / b["min_ms"] if b["min_ms"] else 1.0
+        else:
+            ratio = b["rows_per_sec"] / r["rows_per_sec"] if r["rows_per_sec"] else float("inf")
+        flag = "REGRESIÓN" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{r['size']:>10,d}  {r['name']:40s} x{ratio:6.2f} {flag}")
+    return regressions
+
+
+def print_results(results: list[dict]):
+    for r in results:
+        if r["kind"] == "latency":
+            print(f"{r['size']:>10,d}  {r['name']:40s} p50={r['p50_ms']:9.2f} ms  p95={r['p95_ms']:9.2f} ms")
+        else:
+            print(f"{r['size']:>10,d}  {r['name']:40s} {r['rows_per_sec']:>10,.0f} filas/s  ({r['seconds']:.2f} s)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default=DEFAULT_SIZES, help="filas en measurements, separadas por coma")
+    ap.add_argument("--repeat", type=int, default=10, help="repeticiones por consulta")
+    ap.add_argument("--import-rows", type=int, default=20_000, help="filas de cada archivo importado")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--engine", default="db", choices=("db", "memory"), help="ANALYTICS_ENGINE de la app")
+    ap.add_argument("--out", default=None, help="archivo JSON de resultados")
+    ap.add_argument("--compare", default=None, help="JSON de una corrida anterior")
+    ap.add_argument("--threshold", type=float, default=1.2, help="razón a partir de la cual es regresión")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--child-out", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        with open(args.child_out, "w") as fh:
+            json.dump(run_size(args), fh)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = {
+        "meta": {
+            **git_meta(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": {"sizes": sizes, "repeat": args.repeat, "import_rows": args.import_rows,
+                       "seed": args.seed, "engine": args.engine},
+        },
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            results = spawn(size, args, tmp)
+            print_results(results)
+            report["results"].extend(results)
+            os.remove(os.path.join(tmp, f"bench_{size}.db"))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+        print(f"resultados → {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if compare(report, baseline, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
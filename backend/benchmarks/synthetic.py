@@ -0,0 +1,132 @@
+# backend/benchmarks/synthetic.py
+# Generador de mediciones OSA sintéticas para benchmarks (SQLite temporal) y de
+# archivos de importación (CSV / Excel) con los encabezados originales (COLS_MAP).
+# Uso: python -m backend.benchmarks.synthetic --rows 100000 --out /tmp/osa.xlsx
+import argparse
+import csv
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, insert
+from ..db import Base
+from ..models import Measurement
+
+FORMATOS = ("SUPER", "HIPER", "EXPRESS", "MAYOREO")
+CAUSALES = ("SIN STOCK", "SIN EXHIBICION", "PRECIO INCORRECTO", "DESCONTINUADO", "EN BODEGA")
+CAUSAL_WEIGHTS = (0.5, 0.2, 0.1, 0.05, 0.15)
+WEEKEND_PENALTY = 0.03  # reposición más floja sábado y domingo
+
+
+def make_engine(path: str):
+    return create_engine(f"sqlite:///{path}", future=True)
+
+
+def generate_rows(n_rows: int, stores: int = 50, skus: int = 500, days: int = 365,
+                  osa_rate: float = 0.9, start: date = date(2025, 1, 1), seed: int = 42):
+    rnd = random.Random(seed)
+    # cada SKU y cada tienda tienen su propia desviación de la tasa global
+    # (así hay "peores SKU" y tiendas problemáticas)
+    sku_rate = [rnd.gauss(0, 0.05) for _ in range(skus)]
+    store_rate = [rnd.gauss(0, 0.03) for _ in range(stores)]
+    for i in range(n_rows):
+        s = rnd.randrange(stores)
+        k = rnd.randrange(skus)
+        d = start + timedelta(days=rnd.randrange(days))
+        p = osa_rate + sku_rate[k] + store_rate[s] - (WEEKEND_PENALTY if d.weekday() >= 5 else 0)
+        osa = 1 if rnd.random() < p else 0
+        yield {
+            "id_conjunto": f"C{i // 100}",
+            "fecha": d,
+            "dia_semana": d.strftime("%A"),
+            "nro_semana": d.strftime("%V"),
+            "pv": f"PV-{s:03d}",
+            "formato": FORMATOS[s % len(FORMATOS)],
+            "codigo_barra": f"7{k:012d}",
+            "descripcion_sku": f"SKU {k}",
+            "causal": "" if osa else rnd.choices(CAUSALES, CAUSAL_WEIGHTS)[0],
+            "estado": "ENCONTRADO" if osa else "FALTANTE",
+            "tipo_resultado": "OSA" if osa else "OOS",
+            "categoria": f"CAT-{k % 20}",
+            "marca": f"MARCA-{k % 60}",
+            "formato_marketing": "",
+            "responsable": f"MERC-{s % 12:02d}",
+            "sector_operativo": "",
+            "provincia": f"PROV-{s % 7}",
+            "cliente": f"CLIENTE-{s % 5}",
+            "proveedor": f"PROV-{k % 40}",
+            # visitas en horario de tienda (7:00 a 19:00)
+            "fecha_hora_medicion": datetime.combine(d, datetime.min.time())
+            + timedelta(hours=7, minutes=rnd.randrange(12 * 60)),
+            "osa_flag": osa,
+            "oos_flag": 1 - osa,
+        }
+
+
+def populate(engine, n_rows: int, batch: int = 20_000, **kwargs):
+    Base.metadata.create_all(engine)
+    buf = []
+    with engine.begin() as conn:
+        for row in generate_rows(n_rows, **kwargs):
+            buf.append(row)
+            if len(buf) >= batch:
+                conn.execute(insert(Measurement.__table__), buf)
+                buf = []
+        if buf:
+            conn.execute(insert(Measurement.__table__), buf)
+
+
+def excel_headers():
+    from ..import_excel import COLS_MAP
+    return COLS_MAP
+
+
+def write_csv(path: str, n_rows: int, **kwargs):
+    """CSV con los encabezados del Excel original (COLS_MAP), escrito fila a fila."""
+    cols = excel_headers()
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(list(cols.keys()))
+        for row in generate_rows(n_rows, **kwargs):
+            w.writerow([row[c] for c in cols.values()])
+
+
+def write_xlsx(path: str, n_rows: int, **kwargs):
+    """Excel (.xlsx) con los encabezados originales; openpyxl write-only (memoria acotada).
+    Fechas como celdas de fecha y códigos de barra como texto, como en los reportes reales."""
+    from openpyxl import Workbook
+    cols = excel_headers()
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Mediciones")
+    ws.append(list(cols.keys()))
+    for row in generate_rows(n_rows, **kwargs):
+        ws.append([row[c] for c in cols.values()])
+    wb.save(path)
+
+
+def write_file(path: str, n_rows: int, **kwargs):
+    if path.lower().endswith(".xlsx"):
+        write_xlsx(path, n_rows, **kwargs)
+    else:
+        write_csv(path, n_rows, **kwargs)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--stores", type=int, default=50)
+    ap.add_argument("--skus", type=int, default=500)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--osa-rate", type=float, default=0.9)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", required=True, help="archivo .csv / .xlsx, o .db (SQLite poblado)")
+    args = ap.parse_args()
+    opts = {"stores": args.stores, "skus": args.skus, "days": args.days,
+            "osa_rate": args.osa_rate, "seed": args.seed}
+    if args.out.endswith(".db"):
+        populate(make_engine(args.out), args.rows, **opts)
+    else:
+        write_file(args.out, args.rows, **opts)
+    print(f"{args.rows:,d} filas → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
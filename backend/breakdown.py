@@ -0,0 +1,159 @@
+# backend/breakdown.py
+# Cortes multidimensionales de OSA/OOS (/api/kpis/breakdown): filtros con varios
+# valores por dimensión, agrupación por cualquier combinación de dimensiones,
+# top/bottom N y soporte mínimo. Fuente: el cubo más chico que cubra la consulta,
+# el rollup diario (solo pv/codigo_barra) o la tabla cruda.
+from datetime import date, timedelta
+from sqlalchemy import select, func, and_, or_, union_all
+from sqlalchemy.orm import Session
+from .models import MeasurementDailyRollup, MeasurementCube, CUBE_DIMENSIONS
+from .aggregates import to_float
+from . import storage
+from .cube import pick_cube, has_daily
+
+DIMENSIONS = (*CUBE_DIMENSIONS, "codigo_barra")
+ROLLUP_DIMENSIONS = {"pv", "codigo_barra"}
+
+
+def choose_source(dimensions) -> str:
+    """'cube:<nombre>', 'rollup' o 'raw' según las dimensiones usadas."""
+    cube = pick_cube(dimensions)
+    if cube:
+        return f"cube:{cube}"
+    if set(dimensions) <= ROLLUP_DIMENSIONS:
+        return "rollup"
+    return "raw"
+
+
+def _first_of_next_month(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def month_split(date_from: str | None, date_to: str | None):
+    """(meses, bordes): meses completos del rango como (m_lo, m_hi) con None = abierto,
+    o None si no hay ninguno, y los tramos de días sueltos [(lo, hi)]."""
+    lo = date.fromisoformat(date_from[:10]) if date_from else None
+    hi = date.fromisoformat(date_to[:10]) if date_to else None
+    m_lo = None if lo is None else (lo if lo.day == 1 else _first_of_next_month(lo))
+    # primer día del último mes completo (hi es fin de mes o el mes anterior)
+    if hi is None:
+        m_hi = None
+    elif (hi + timedelta(days=1)).day == 1:
+        m_hi = hi.replace(day=1)
+    else:
+        m_hi = (hi.replace(day=1) - timedelta(days=1)).replace(day=1)
+    if m_lo and m_hi and m_lo > m_hi:
+        return None, [(lo, hi)]
+    edges = []
+    if lo and lo < m_lo:
+        edges.append((lo, m_lo - timedelta(days=1)))
+    if hi and m_hi:
+        tail = _first_of_next_month(m_hi)
+        if tail <= hi:
+            edges.append((tail, hi))
+    return (m_lo, m_hi), edges
+
+
+def _monthly(t, months):
+    m_lo, m_hi = months
+    cond = [t.grain == "m"]
+    if m_lo:
+        cond.append(t.fecha >= m_lo)
+    if m_hi:
+        cond.append(t.fecha <= m_hi)
+    return and_(*cond)
+
+
+def cube_date_filter(t, date_from: str | None, date_to: str | None):
+    """Meses completos del rango desde el grano mensual; los bordes, del diario."""
+    months, edges = month_split(date_from, date_to)
+    parts = [_monthly(t, months)] if months else []
+    parts += [and_(t.grain == "d", t.fecha >= a, t.fecha <= b) for a, b in edges]
+    return or_(*parts) if len(parts) > 1 else parts[0]
+
+
+def _filtered(t, filters: dict[str, list[str]]):
+    return [getattr(t, dim).in_(values) for dim, values in filters.items()]
+
+
+def _monthly_cube_source(name: str, group_by: list[str], filters: dict[str, list[str]],
+                         date_from: str | None, date_to: str | None):
+    """Cubo solo mensual: meses completos del cubo y bordes de la tabla cruda, sumados
+    en una subconsulta (dims..., n, osa, oos)."""
+    months, edges = month_split(date_from, date_to)
+    parts = []
+    if months:
+        t = MeasurementCube
+        parts.append(select(*(getattr(t, d) for d in group_by), t.n.label("n"), t.osa_sum.label("osa"),
+                            t.oos_sum.label("oos"))
+                     .where(t.cube == name, _monthly(t, months), *_filtered(t, filters)))
+    if edges:
+        m = storage.measurements(["fecha", *group_by, *filters, "osa_flag", "oos_flag"]).c
+        days = or_(*(and_(m.fecha >= a, m.fecha <= b) for a, b in edges))
+        parts.append(select(*(getattr(m, d) for d in group_by), func.count().label("n"),
+                            func.sum(m.osa_flag).label("osa"), func.sum(m.oos_flag).label("oos"))
+                     .where(days, *_filtered(m, filters)).group_by(*(getattr(m, d) for d in group_by)))
+    return (union_all(*parts) if len(parts) > 1 else parts[0]).subquery("parts")
+
+
+def breakdown_statement(source: str, group_by: list[str], filters: dict[str, list[str]],
+                        date_from: str | None, date_to: str | None, min_support: int,
+                        order: str, limit: int):
+    where = []
+    if source.startswith("cube:") and not has_daily(source.split(":", 1)[1]):
+        t = _monthly_cube_source(source.split(":", 1)[1], group_by, filters, date_from, date_to).c
+        n, osa, oos = func.sum(t.n), func.sum(t.osa), func.sum(t.oos)
+        filters = {}  # ya aplicados dentro de la subconsulta
+    elif source.startswith("cube:"):
+        t = MeasurementCube
+        n, osa, oos = func.sum(t.n), func.sum(t.osa_sum), func.sum(t.oos_sum)
+        where = [t.cube == source.split(":", 1)[1], cube_date_filter(t, date_from, date_to)]
+    elif source == "rollup":
+        t = MeasurementDailyRollup
+        n, osa, oos = func.sum(t.n), func.sum(t.osa_sum), func.sum(t.oos_sum)
+    else:
+        t = storage.measurements(["fecha", *group_by, *filters, "osa_flag", "oos_flag"]).c
+        n, osa, oos = func.count(), func.sum(t.osa_flag), func.sum(t.oos_flag)
+
+    if source == "rollup" or source == "raw":
+        if date_from:
+            where.append(t.fecha >= date_from)
+        if date_to:
+            where.append(t.fecha <= date_to)
+    where += _filtered(t, filters)
+
+    dims = [getattr(t, d) for d in group_by]
+    ratio = osa * 1.0 / n
+    return (
+        select(*dims, n.label("n"), osa.label("osa"), oos.label("oos"))
+        .where(*where)
+        .group_by(*dims)
+        .having(n >= max(min_support, 1))
+        .order_by(ratio.desc() if order == "best" else ratio.asc(), *dims)
+        .limit(limit)
+    )
+
+
+def compute_breakdown(db: Session, group_by: list[str], filters: dict[str, list[str]] | None = None,
+                      date_from: str | None = None, date_to: str | None = None, limit: int = 20,
+                      order: str = "worst", min_support: int = 1, source: str | None = None):
+    filters = {k: v for k, v in (filters or {}).items() if v}
+    unknown = [d for d in [*group_by, *filters] if d not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Dimensiones no soportadas: {', '.join(unknown)}")
+    source = source or choose_source([*group_by, *filters])
+    rows = db.execute(breakdown_statement(source, group_by, filters, date_from, date_to,
+                                          min_support, order, limit)).all()
+    items = []
+    for r in rows:
+        total = int(r.n)
+        item = {d: getattr(r, d) for d in group_by}
+        item.update(
+            n=total,
+            osa=int(to_float(r.osa)),
+            oos=int(to_float(r.oos)),
+            osa_pct=round(to_float(r.osa) * 100.0 / total, 2),
+            oos_pct=round(to_float(r.oos) * 100.0 / total, 2),
+        )
+        items.append(item)
+    return {"group_by": group_by, "source": source, "items": items}
@@ -0,0 +1,382 @@
+# backend/cache.py
+# Caché de resultados para /api/kpis y /api/measurements.
+# L1: LRU en proceso con TTL y tope de entradas. L2 opcional compartido (Redis o
+# un sustituto local con la misma interfaz). Los importadores suben el contador
+# de versión de datos e invalidan solo las entradas cuyo (store, rango) se tocó.
+# Con varios procesos (workers de gunicorn + worker de importaciones) y
+# SHARED_STATE=sqlite, la versión y las invalidaciones pasan por shared_state: cada
+# proceso aplica a su L1 las invalidaciones de los demás (sync cada SHARED_SYNC_SECONDS).
+# Los deltas de rollup de cada commit viajan con la invalidación hasta los listeners de
+# cambios (live.py → /api/kpis/stream).
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))          # segundos
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "512"))     # entradas en L1
+CACHE_SHARED = os.getenv("CACHE_SHARED", "none").lower()   # none | redis | local | sqlite
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# cada cuánto un proceso mira el registro de versiones compartido (desfase máximo entre workers)
+SHARED_SYNC_SECONDS = float(os.getenv("SHARED_SYNC_SECONDS", "0.25"))
+
+
+class LRUBackend:
+    """LRU en memoria con TTL por entrada; seguro entre hilos."""
+
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedBackend:
+    """Sustituto local del backend compartido: misma interfaz que RedisBackend
+    (valores serializados a JSON, TTL), útil en desarrollo y pruebas."""
+
+    def __init__(self, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(_encode_key(key))
+            if item is None or item[0] < time.time():
+                return None
+            return json.loads(item[1])
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[_encode_key(key)] = (time.time() + self.ttl, json.dumps(value, default=str))
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(_encode_key(key), None)
+
+    def keys(self):
+        with self._lock:
+            return [_decode_key(k) for k in self._data]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    """Backend compartido entre procesos/instancias (requiere el paquete redis)."""
+
+    PREFIX = "osa:cache:"
+
+    def __init__(self, url: str = CACHE_REDIS_URL, ttl: float = CACHE_TTL):
+        import redis  # dependencia opcional
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        raw = self.client.get(self.PREFIX + _encode_key(key))
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.PREFIX + _encode_key(key), json.dumps(value, default=str), ex=int(self.ttl))
+
+    def delete(self, key):
+        self.client.delete(self.PREFIX + _encode_key(key))
+
+    def keys(self):
+        return [_decode_key(k.decode()[len(self.PREFIX):]) for k in self.client.scan_iter(self.PREFIX + "*")]
+
+    def clear(self):
+        for k in self.client.scan_iter(self.PREFIX + "*"):
+            self.client.delete(k)
+
+
+def _encode_key(key: tuple) -> str:
+    return json.dumps(list(key))
+
+
+def _decode_key(raw: str) -> tuple:
+    return tuple(json.loads(raw))
+
+
+def _shared_backend():
+    if CACHE_SHARED == "redis":
+        return RedisBackend()
+    if CACHE_SHARED == "local":
+        return LocalSharedBackend()
+    if CACHE_SHARED == "sqlite":
+        from .shared_state import SqliteCacheBackend, get_store
+        return SqliteCacheBackend(get_store(), CACHE_TTL, _encode_key, _decode_key)
+    return None
+
+
+def _as_iso(d) -> str | None:
+    if d is None or d == "":
+        return None
+    return d.isoformat() if isinstance(d, date) else str(d)[:10]
+
+
+class QueryCache:
+    """Clave: (endpoint, store, date_from, date_to, limit, *extra)."""
+
+    def __init__(self, l1=None, l2=None, enabled: bool = CACHE_ENABLED, shared=None):
+        self.l1 = l1 if l1 is not None else LRUBackend()
+        self.l2 = l2
+        self.enabled = enabled
+        self.data_version = 0
+        # epoch distingue reinicios (data_version vuelve a 0); modified_at = último commit
+        # de importación visto por este proceso (o el arranque). Base del ETag / Last-Modified.
+        self.epoch = uuid.uuid4().hex[:8]
+        self.modified_at = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # estado compartido entre procesos (shared_state.SharedVersion) o None
+        self.shared = shared
+        self._listeners = []
+        self._change_listeners = []
+        self._sync_lock = threading.Lock()
+        self._synced_at = 0.0
+        # store_if_current contra invalidate: guardar un valor y borrar+subir versión no se mezclan
+        self._write_lock = threading.RLock()
+        if shared is not None:
+            # mismo epoch y versión en todos los procesos → mismo ETag en cualquier worker
+            self.epoch = shared.epoch
+            self.data_version, modified = shared.head()
+            self.modified_at = modified or self.modified_at
+
+    def add_listener(self, fn):
+        """fn() se llama cuando llegan invalidaciones de otro proceso (p. ej. columnar.mark_stale)."""
+        if fn not in self._listeners:
+            self._listeners.append(fn)
+
+    def add_change_listener(self, fn):
+        """fn(deltas) tras cada cambio de datos, de este proceso o de otro: deltas son las
+        filas (fecha, pv, codigo_barra, n, osa, oos) del commit, o None si no se conocen
+        (rebuild del rollup, archivo, registro podado): hay que recargar."""
+        if fn not in self._change_listeners:
+            self._change_listeners.append(fn)
+
+    def _changed(self, deltas):
+        for fn in self._change_listeners:
+            fn(deltas)
+
+    @staticmethod
+    def make_key(endpoint: str, store=None, date_from=None, date_to=None, limit=None, *extra) -> tuple:
+        return (endpoint, store or None, _as_iso(date_from), _as_iso(date_to), limit, *extra)
+
+    def sync(self, force: bool = False) -> int:
+        """Aplica a este proceso las invalidaciones registradas por los demás.
+        Devuelve cuántas versiones nuevas se aplicaron."""
+        if self.shared is None:
+            return 0
+        now = time.monotonic()
+        if not force and now - self._synced_at < SHARED_SYNC_SECONDS:
+            return 0
+        # un solo hilo sincroniza; los demás siguen con lo que hay (desfase acotado)
+        if not self._sync_lock.acquire(blocking=force):
+            return 0
+        try:
+            self._synced_at = now
+            changes = self.shared.changes_since(self.data_version)
+            if changes is None:
+                # el registro ya se podó: no se sabe qué cambió, se limpia todo
+                self.l1.clear()
+                self.data_version, modified = self.shared.head()
+                self.modified_at = modified or time.time()
+                applied, deltas = 1, [None]
+            else:
+                for version, stores, date_min, date_max, created_at, _ in changes:
+                    self._drop(stores, date_min, date_max, shared_l2=True)
+                    self.data_version, self.modified_at = version, created_at
+                applied, deltas = len(changes), [d for *_, d in changes]
+        finally:
+            self._sync_lock.release()
+        if applied:
+            for fn in self._listeners:
+                fn()
+            for d in deltas:
+                self._changed(d)
+        return applied
+
+    def lookup(self, key: tuple):
+        self.sync()
+        value = self.l1.get(key)
+        if value is None and self.l2 is not None:
+            value = self.l2.get(key)
+            if value is not None:
+                self.l1.set(key, value)
+        if value is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def store(self, key: tuple, value):
+        self.l1.set(key, value)
+        if self.l2 is not None:
+            self.l2.set(key, value)
+
+    def store_if_current(self, key: tuple, value, version: int) -> bool:
+        """Guarda value solo si no hubo importaciones desde que se leyó version: un valor
+        calculado antes de un commit no debe quedar cacheado como si fuera posterior."""
+        self.sync()
+        with self._write_lock:
+            if self.data_version != version:
+                return False
+            self.store(key, value)
+        return True
+
+    def get_or_compute(self, key: tuple, compute):
+        if not self.enabled:
+            return compute()
+        value = self.lookup(key)
+        if value is None:
+            version = self.data_version
+            value = compute()
+            self.store_if_current(key, value, version)
+        return value
+
+    async def get_or_compute_async(self, key: tuple, compute):
+        """Igual que get_or_compute para handlers async: compute() devuelve un awaitable."""
+        if not self.enabled:
+            return await compute()
+        value = self.lookup(key)
+        if value is None:
+            version = self.data_version
+            value = await compute()
+            self.store_if_current(key, value, version)
+        return value
+
+    @staticmethod
+    def _affected(key: tuple, stores: set | None, date_min: str | None, date_max: str | None) -> bool:
+        _, store, d_from, d_to = key[:4]
+        if stores is not None and store is not None and store not in stores:
+            return False
+        # rangos [d_from, d_to] y [date_min, date_max] se solapan (None = abierto)
+        if date_min and d_to and d_to < date_min:
+            return False
+        if date_max and d_from and d_from > date_max:
+            return False
+        return True
+
+    def invalidate(self, stores=None, date_min=None, date_max=None, deltas=None) -> int:
+        """Sube la versión de datos y borra solo las entradas que cubren lo importado."""
+        stores = None if stores is None else {s for s in stores if s}
+        date_min, date_max = _as_iso(date_min), _as_iso(date_max)
+        with self._write_lock:
+            removed = self._drop(stores, date_min, date_max)
+            self._bump(stores, date_min, date_max, deltas)
+        return removed
+
+    def _drop(self, stores, date_min, date_max, shared_l2: bool = False) -> int:
+        removed = 0
+        # la L2 compartida ya la limpió el proceso que registró la invalidación
+        backends = (self.l1,) if shared_l2 and not isinstance(self.l2, LocalSharedBackend) else (self.l1, self.l2)
+        for backend in backends:
+            if backend is None:
+                continue
+            for key in backend.keys():
+                if self._affected(key, stores, date_min, date_max):
+                    backend.delete(key)
+                    removed += 1
+        self.invalidations += removed
+        return removed
+
+    def invalidate_touched(self, touched, deltas=None) -> int:
+        """touched: pares (fecha, pv) escritos por un importador; deltas: sus filas de rollup."""
+        dates = [f for f, _ in touched if f is not None]
+        return self.invalidate(
+            stores={pv for _, pv in touched},
+            date_min=min(dates) if dates else None,
+            date_max=max(dates) if dates else None,
+            deltas=deltas,
+        )
+
+    def _bump(self, stores=None, date_min=None, date_max=None, deltas=None):
+        if self.shared is None:
+            self.data_version += 1
+            self.modified_at = time.time()
+            self._changed(deltas)
+            return
+        # se registra para los demás procesos y se adopta la versión global
+        # (sync vuelve a aplicar lo propio: borrar dos veces no cambia nada; los
+        # listeners de cambios reciben los deltas una sola vez, desde sync)
+        self.shared.bump(stores, date_min, date_max, deltas)
+        self.sync(force=True)
+
+    def version_info(self) -> tuple[str, float]:
+        """(versión opaca, timestamp de la última modificación) para validadores HTTP."""
+        self.sync()
+        return f"{self.epoch}-{self.data_version}", self.modified_at
+
+    def clear(self):
+        self.l1.clear()
+        if self.l2 is not None:
+            self.l2.clear()
+        self._bump()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "data_version": self.data_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self.l1),
+            "maxsize": self.l1.maxsize,
+            "evictions": self.l1.evictions,
+            "invalidations": self.invalidations,
+            "shared": type(self.l2).__name__ if self.l2 is not None else None,
+            "shared_state": type(self.shared).__name__ if self.shared is not None else None,
+        }
+
+
+def _shared_version():
+    from .shared_state import shared_version
+    return shared_version()
+
+
+query_cache = QueryCache(l2=_shared_backend(), shared=_shared_version())
@@ -0,0 +1,214 @@
+# backend/columnar.py
+# Motor analítico en memoria (ANALYTICS_ENGINE=memory) para dashboards de solo lectura.
+# Carga measurements en un DataFrame Polars compacto: columnas de texto repetitivas
+# como Categorical (diccionario), fecha como Date (int32, días desde 1970), flags
+# UInt8 e id Int32. /api/kpis y /api/measurements responden con filtros y group_by
+# vectorizados; la BD sigue siendo la fuente de verdad y el snapshot se recarga
+# tras cada importación (se reemplaza de forma atómica al terminar la carga).
+from __future__ import annotations
+import os
+import threading
+import time
+from datetime import date
+from sqlalchemy import select, func
+from .db import engine
+from .models import ImportJob, NULL_FECHA
+from . import storage
+from .aggregates import assemble_kpis, merge_archived, worst_of
+from . import partitions
+from .lazy import lazy_import
+
+pl = lazy_import("polars")
+
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "db").lower()  # db | memory
+# cada cuánto (s) se compara la huella de la BD para detectar importaciones de otros
+# procesos (CLI, pool de procesos)
+ANALYTICS_CHECK_SECONDS = float(os.getenv("ANALYTICS_CHECK_SECONDS", "30"))
+LOAD_BATCH = 200_000
+
+CATEGORICAL = [
+    "pv", "codigo_barra", "descripcion_sku", "estado", "tipo_resultado", "provincia",
+    "categoria", "marca", "proveedor", "cliente", "formato", "causal",
+]
+LOADED = ["id", "fecha", *CATEGORICAL, "osa_flag", "oos_flag"]
+
+
+def _fingerprint(conn):
+    """Cambia con cualquier importación: filas, último id y fin del último job."""
+    m = storage.measurements(["id"])
+    count, max_id = conn.execute(select(func.count(), func.max(m.c.id))).one()
+    last_job = conn.execute(select(func.max(ImportJob.finished_at))).scalar()
+    return count, max_id, last_job
+
+
+def _frame(rows) -> pl.DataFrame:
+    df = pl.DataFrame([tuple(r) for r in rows], schema=LOADED, orient="row")
+    return df.with_columns(
+        pl.col("id").cast(pl.Int32),
+        pl.col("fecha").cast(pl.Date),
+        *(pl.col(c).cast(pl.Utf8).fill_null("").cast(pl.Categorical) for c in CATEGORICAL),
+        pl.col("osa_flag").fill_null(0).cast(pl.UInt8),
+        pl.col("oos_flag").fill_null(0).cast(pl.UInt8),
+    )
+
+
+def load_frame(bind=engine) -> pl.DataFrame:
+    """Lee measurements por bloques (cursor del servidor) y arma el DataFrame compacto."""
+    m = storage.measurements(LOADED)
+    q = select(*(m.c[c] for c in LOADED)).execution_options(yield_per=LOAD_BATCH)
+    parts = []
+    # caché de strings global: las categorías de todos los bloques comparten diccionario
+    with pl.StringCache():
+        with bind.connect() as conn:
+            for part in conn.execute(q).partitions():
+                parts.append(_frame(part))
+        if not parts:
+            return _frame([])
+        # orden del listado (fecha desc, id desc): las páginas son filtro + head, sin ordenar
+        return pl.concat(parts, rechunk=True).sort(["fecha", "id"], descending=True, nulls_last=True)
+
+
+def _day(s: str | None) -> date | None:
+    return date.fromisoformat(s[:10]) if s else None
+
+
+class ColumnarStore:
+    def __init__(self, bind=engine):
+        self.bind = bind
+        self.df: pl.DataFrame | None = None
+        self.fingerprint = None
+        self.loaded_at = None
+        self.load_seconds = 0.0
+        self._checked = 0.0
+        self._stale = False
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+
+    # ---- carga / recarga ----
+    def load(self):
+        with self._loading:
+            self._load()
+        return self
+
+    def _load(self):
+        t0 = time.perf_counter()
+        # se limpia antes de leer: una importación que confirme durante la carga
+        # vuelve a marcarlo y la próxima consulta recarga otra vez
+        self._stale = False
+        with self.bind.connect() as conn:
+            fp = _fingerprint(conn)
+        df = load_frame(self.bind)
+        with self._lock:
+            self.df, self.fingerprint = df, fp
+            self.loaded_at = time.time()
+            self.load_seconds = time.perf_counter() - t0
+
+    def mark_stale(self):
+        """Lo llaman los importadores tras confirmar un lote."""
+        self._stale = True
+
+    def frame(self) -> pl.DataFrame:
+        if self.df is None:
+            self.load()
+        now = time.monotonic()
+        if not self._stale and now - self._checked >= ANALYTICS_CHECK_SECONDS:
+            self._checked = now
+            with self.bind.connect() as conn:
+                self._stale = _fingerprint(conn) != self.fingerprint
+        if self._stale:
+            # el snapshot nuevo se arma antes de responder: un resultado del anterior
+            # quedaría cacheado (y con ETag) bajo la versión que ya incluye la importación.
+            # Las consultas concurrentes esperan a la misma carga en vez de repetirla.
+            with self._loading:
+                if self._stale:
+                    self._load()
+        return self.df
+
+    def stats(self) -> dict:
+        df = self.df
+        rows = df.height if df is not None else 0
+        size = df.estimated_size() if df is not None else 0
+        return {
+            "engine": ANALYTICS_ENGINE,
+            "rows": rows,
+            "bytes": size,
+            "bytes_per_million_rows": round(size * 1_000_000 / rows) if rows else 0,
+            "load_seconds": round(self.load_seconds, 3),
+            "loaded_at": self.loaded_at,
+            "stale": self._stale,
+        }
+
+    # ---- consultas ----
+    @staticmethod
+    def _filter(df: pl.DataFrame, store, date_from, date_to) -> pl.DataFrame:
+        cond = []
+        if store:
+            cond.append(pl.col("pv") == store)
+        if date_from:
+            cond.append(pl.col("fecha") >= _day(date_from))
+        if date_to:
+            cond.append(pl.col("fecha") <= _day(date_to))
+        return df.filter(*cond) if cond else df
+
+    def kpis(self, store=None, date_from=None, date_to=None, group_by="day", ma_window=None, max_points=None):
+        # igual que el rollup: las filas sin fecha cuentan en el total como NULL_FECHA
+        df = self._filter(self.frame(), store, date_from, date_to)
+        daily = df.group_by(pl.col("fecha").fill_null(NULL_FECHA)).agg(
+            pl.len().cast(pl.Int64).alias("n"),
+            pl.col("osa_flag").cast(pl.Float64).sum().alias("osa"),
+            pl.col("oos_flag").cast(pl.Float64).sum().alias("oos"),
+        ).sort("fecha")
+        skus = df.group_by(pl.col("codigo_barra").cast(pl.Utf8)).agg(
+            pl.len().cast(pl.Int64).alias("n"), pl.col("osa_flag").cast(pl.Float64).sum().alias("osa"))
+        # el snapshot solo tiene lo que está en la BD: los meses archivados se leen del Parquet
+        archived = partitions.archived_in_range(date_from, date_to, self.bind)
+        if archived:
+            daily, skus = merge_archived(daily, skus, archived, store, date_from, date_to)
+        worst = worst_of(skus)
+        return assemble_kpis(
+            int(daily["n"].sum() or 0),
+            float(daily["osa"].sum() or 0),
+            float(daily["oos"].sum() or 0),
+            daily,
+            worst,
+            group_by, ma_window, max_points,
+        )
+
+    def page(self, columns, store=None, date_from=None, date_to=None, limit=200, after=None):
+        """Página en orden (fecha desc, id desc); after = (fecha, id) del cursor."""
+        df = self._filter(self.frame(), store, date_from, date_to)
+        if after is not None:
+            f, i = after
+            fecha, id_ = pl.col("fecha"), pl.col("id")
+            if f is None:
+                df = df.filter(fecha.is_null() & (id_ < i))
+            else:
+                df = df.filter((fecha < f) | ((fecha == f) & (id_ < i)) | fecha.is_null())
+        out = (
+            df.head(limit + 1)
+            .select(columns)
+            .with_columns(pl.col(pl.Categorical).cast(pl.Utf8), pl.col(pl.UInt8).cast(pl.Int64))
+        )
+        more = out.height > limit
+        rows = out.head(limit).to_dicts()
+        last = (rows[-1]["fecha"], rows[-1]["id"]) if more else None
+        return rows, last
+
+
+_store: ColumnarStore | None = None
+
+
+def get_store() -> ColumnarStore:
+    global _store
+    if _store is None:
+        _store = ColumnarStore()
+    return _store
+
+
+def enabled() -> bool:
+    return ANALYTICS_ENGINE == "memory"
+
+
+def mark_stale():
+    if _store is not None:
+        _store.mark_stale()
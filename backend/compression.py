@@ -0,0 +1,107 @@
+# backend/compression.py
+# Compresión de respuestas (brotli si el cliente lo acepta y el paquete está
+# instalado, si no gzip) a partir de COMPRESS_MIN_BYTES. Funciona también con
+# StreamingResponse (export, eventos): cada bloque se comprime y se vacía al enviarse.
+import os
+import zlib
+
+try:
+    import brotli  # opcional: pip install brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() == "true"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+# tipos que vale la pena comprimir (imágenes, xlsx, etc. ya vienen comprimidos)
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/")
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        else:
+            self._c = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = formato gzip
+
+    def chunk(self, data: bytes) -> bytes:
+        # flush por bloque: el cliente recibe cada parte del stream sin esperar al final
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.finish()
+        return self._c.compress(data) + self._c.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESS_ENABLED:
+            return await self.app(scope, receive, send)
+        headers = dict((k.lower(), v) for k, v in scope.get("headers", []))
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message  # se envía al ver el primer bloque del cuerpo
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if encoder is None:
+                resp_headers = {k.lower(): v for k, v in start.get("headers", [])}
+                ctype = resp_headers.get(b"content-type", b"").decode("latin-1")
+                small = not more and len(body) < self.minimum_size
+                if (small or b"content-encoding" in resp_headers or start["status"] in (204, 304)
+                        or not ctype.startswith(COMPRESSIBLE)):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                encoder = _Encoder(encoding)
+                vary = resp_headers.get(b"vary")
+                out = [(k, v) for k, v in start.get("headers", []) if k.lower() not in (b"content-length", b"vary")]
+                out += [(b"content-encoding", encoding.encode()),
+                        (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding")]
+                data = encoder.chunk(body) if more else encoder.finish(body)
+                if not more:
+                    out.append((b"content-length", str(len(data)).encode()))
+                await send({**start, "headers": out})
+                return await send({"type": "http.response.body", "body": data, "more_body": more})
+            data = encoder.chunk(body) if more else encoder.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, wrapped_send)
@@ -0,0 +1,220 @@
+# backend/cube.py
+# Cubos OLAP (measurement_cube) para /api/kpis/breakdown.
+# Cada cubo agrega (n, osa, oos) por fecha + un subconjunto de dimensiones, en grano
+# mensual y, en los cubos chicos, también diario: los meses completos de un rango se
+# leen del grano mensual y los bordes del diario (o de la tabla cruda si el cubo no lo
+# tiene). Los importadores acumulan deltas igual que con el
+# rollup y los aplican en la misma transacción. Una consulta se sirve del cubo más
+# chico que contenga todas sus dimensiones (filtros + agrupación).
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select, func, delete
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from .db import engine, Base
+from .models import MeasurementCube, CUBE_DIMENSIONS
+from . import storage
+
+# nombre → dimensiones, del más chico al más grande (se elige el primero que sirva)
+CUBES = {
+    "geo": ("pv", "provincia", "cliente", "formato"),
+    "product": ("categoria", "marca", "proveedor"),
+    "causal": ("provincia", "categoria", "causal"),
+    "geo_product": ("provincia", "cliente", "formato", "categoria", "marca", "proveedor"),
+}
+# cubos con grano diario. En los anchos (geo_product, causal) el diario casi no agrega
+# (con 500k mediciones geo_product/d tiene ~0,9 filas por medición y causal/d ~0,2) y
+# solo encarece cada importación: se guardan solo por mes
+DAILY_CUBES = {"geo", "product"}
+
+REBUILD_BATCH = 100_000
+FLUSH_BATCH = 5_000
+SUMS = ["n", "osa_sum", "oos_sum"]
+FRAME_KEY = ["cube", "grain", "fecha", *CUBE_DIMENSIONS]
+
+
+def dims_key(values) -> str:
+    return hashlib.sha1("\x1f".join(values).encode("utf-8")).hexdigest()
+
+
+def pick_cube(dimensions) -> str | None:
+    needed = set(dimensions)
+    for name, dims in CUBES.items():
+        if needed <= set(dims):
+            return name
+    return None
+
+
+def _as_date(x):
+    return x.date() if isinstance(x, datetime) else x
+
+
+def has_daily(name: str) -> bool:
+    return name in DAILY_CUBES
+
+
+def _grains(name: str, fecha):
+    month = ("m", fecha.replace(day=1))
+    return (("d", fecha), month) if has_daily(name) else (month,)
+
+
+class CubeAccumulator:
+    """Acumula (n, osa, oos) por (cubo, grano, fecha, valores de dimensión).
+    add_frame agrega lotes enteros en Polars; add_record queda para filas sueltas.
+    rows() junta ambos."""
+
+    def __init__(self, cubes: dict = CUBES):
+        self.cubes = cubes
+        self.deltas = defaultdict(lambda: [0, 0, 0])
+        self.frames = []
+
+    def add_record(self, r: dict, sign: int = 1):
+        fecha = _as_date(r.get("fecha"))
+        if fecha is None:
+            return
+        osa, oos = int(r.get("osa_flag") or 0), int(r.get("oos_flag") or 0)
+        for name, dims in self.cubes.items():
+            values = tuple(r.get(c) or "" for c in dims)
+            for grain, f in _grains(name, fecha):
+                d = self.deltas[(name, grain, f, values)]
+                d[0] += sign
+                d[1] += sign * osa
+                d[2] += sign * oos
+
+    def add_frame(self, df, sign: int = 1):
+        """Agrega un DataFrame Polars con las columnas de Measurement: un group_by por cubo
+        en grano diario y otro sobre ese resultado para el mensual. sign=-1 descuenta."""
+        import polars as pl
+        df = df.filter(pl.col("fecha").is_not_null()).select(
+            pl.col("fecha").cast(pl.Date),
+            *(pl.col(c).cast(pl.Utf8).fill_null("") if c in df.columns else pl.lit("").alias(c)
+              for c in CUBE_DIMENSIONS),
+            pl.col("osa_flag").cast(pl.Int64).fill_null(0), pl.col("oos_flag").cast(pl.Int64).fill_null(0),
+        )
+        if df.is_empty():
+            return
+        for name, dims in self.cubes.items():
+            day = df.group_by(["fecha", *dims]).agg(
+                (pl.len().cast(pl.Int64) * sign).alias("n"), (pl.col("osa_flag").sum() * sign).alias("osa_sum"),
+                (pl.col("oos_flag").sum() * sign).alias("oos_sum"),
+            )
+            month = (day.with_columns(pl.col("fecha").dt.truncate("1mo"))
+                     .group_by(["fecha", *dims]).agg(pl.col(SUMS).sum()))
+            self.frames.append(_frame(month, name, "m", dims))
+            if has_daily(name):
+                self.frames.append(_frame(day, name, "d", dims))
+
+    def frame(self):
+        """Deltas acumulados en un solo DataFrame (sin los que suman cero)."""
+        import polars as pl
+        parts = list(self.frames)
+        if self.deltas:
+            records = [(name, grain, f, *(dict(zip(self.cubes[name], values)).get(c, "") for c in CUBE_DIMENSIONS),
+                        n, osa, oos)
+                       for (name, grain, f, values), (n, osa, oos) in self.deltas.items()]
+            parts.append(pl.DataFrame(records, schema=_schema(), orient="row"))
+        if not parts:
+            return None
+        return (pl.concat(parts).group_by(FRAME_KEY).agg(pl.col(SUMS).sum())
+                .filter(pl.any_horizontal(pl.col(SUMS) != 0)))
+
+    def rows(self):
+        df = self.frame()
+        if df is None:
+            return []
+        out = []
+        for (name,), part in df.partition_by("cube", as_dict=True).items():
+            # sha1 una vez por combinación de valores, no por fila × grano × fecha
+            values = part.select(self.cubes[name]).rows()
+            keys = {v: dims_key(v) for v in set(values)}
+            out.extend(dict(row, dims_key=keys[v]) for row, v in zip(part.to_dicts(), values))
+        return out
+
+    def flush(self, conn):
+        rows = self.rows()
+        stmt = upsert_statement(conn)
+        for i in range(0, len(rows), FLUSH_BATCH):
+            conn.execute(stmt, rows[i:i + FLUSH_BATCH])
+        self.deltas.clear()
+        self.frames.clear()
+        return len(rows)
+
+
+def _schema() -> dict:
+    import polars as pl
+    return {"cube": pl.Utf8, "grain": pl.Utf8, "fecha": pl.Date, **{c: pl.Utf8 for c in CUBE_DIMENSIONS},
+            **{c: pl.Int64 for c in SUMS}}
+
+
+def _frame(part, name: str, grain: str, dims):
+    """Agregado de un cubo con las columnas de measurement_cube ("" en las que no usa)."""
+    import polars as pl
+    return part.select(
+        pl.lit(name).alias("cube"), pl.lit(grain).alias("grain"), pl.col("fecha"),
+        *(pl.col(c) if c in dims else pl.lit("").alias(c) for c in CUBE_DIMENSIONS),
+        *(pl.col(c).cast(pl.Int64) for c in SUMS),
+    )
+
+
+def upsert_statement(conn):
+    table = MeasurementCube.__table__
+    backend = conn.get_bind().dialect.name if hasattr(conn, "get_bind") else conn.dialect.name
+    if backend == "sqlite":
+        stmt = sqlite_dialect.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=["cube", "grain", "fecha", "dims_key"],
+            set_={
+                "n": table.c.n + stmt.excluded.n,
+                "osa_sum": table.c.osa_sum + stmt.excluded.osa_sum,
+                "oos_sum": table.c.oos_sum + stmt.excluded.oos_sum,
+            },
+        )
+    from sqlalchemy.dialects import mysql as mysql_dialect  # solo en despliegues MySQL
+    stmt = mysql_dialect.insert(table)
+    return stmt.on_duplicate_key_update(
+        n=table.c.n + stmt.inserted.n,
+        osa_sum=table.c.osa_sum + stmt.inserted.osa_sum,
+        oos_sum=table.c.oos_sum + stmt.inserted.oos_sum,
+    )
+
+
+def rebuild(bind=engine) -> int:
+    """Recalcula todos los cubos desde measurements leyendo por bloques (vectorizado)."""
+    import polars as pl
+    Base.metadata.create_all(bind)
+    cols = ["fecha", *CUBE_DIMENSIONS, "osa_flag", "oos_flag"]
+    m = storage.measurements(cols)
+    q = select(*(m.c[c] for c in cols)).execution_options(yield_per=REBUILD_BATCH)
+    acc = CubeAccumulator()
+    with bind.connect() as conn:
+        for part in conn.execute(q).partitions():
+            acc.add_frame(pl.DataFrame([tuple(r) for r in part], schema=cols, orient="row"))
+    with bind.begin() as conn:
+        conn.execute(delete(MeasurementCube.__table__))
+        acc.flush(conn)
+        count = conn.execute(select(func.count()).select_from(MeasurementCube.__table__)).scalar() or 0
+    from .cache import query_cache
+    query_cache.clear()
+    return count
+
+
+def ensure_populated(bind=engine):
+    """Si hay mediciones pero los cubos están vacíos (BD previa a esta tabla) → backfill.
+    Borra el grano diario que quede de cubos que ya no lo llevan."""
+    t = MeasurementCube.__table__
+    with bind.begin() as conn:
+        conn.execute(delete(t).where(t.c.grain == "d", t.c.cube.not_in(sorted(DAILY_CUBES))))
+    with bind.connect() as conn:
+        has_cube = conn.execute(select(MeasurementCube.cube).limit(1)).first() is not None
+        has_raw = conn.execute(select(storage.measurements(["id"]).c.id).limit(1)).first() is not None
+    if has_raw and not has_cube:
+        return rebuild(bind)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Uso: python -m backend.cube rebuild")
+        raise SystemExit(1)
+    print(f"Filas en cubos: {rebuild()}")
@@ -1,7 +1,10 @@
 # backend/db.py
 import os
-from sqlalchemy import create_engine, text
+import time
+from collections import deque
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -9,18 +12,110 @@ load_dotenv()
 
 # Modo BD: SQLite (Render) o MySQL (local)
 USE_SQLITE = os.getenv("USE_SQLITE", "false").lower() == "true"
+# Engine async opcional (aiosqlite / asyncmy) para los handlers async de kpis/measurements
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+# Pool de conexiones: pool_size + max_overflow debería ser >= hilos que consultan la BD
+# (threadpool de FastAPI + workers de importación) para que no se bloqueen entre sí
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))     # s esperando una conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))     # s antes de reabrir (wait_timeout de MySQL)
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+
+
+class _MeteredPoolMixin:
+    """Mide la espera al pedir una conexión al pool (checkout) y los timeouts."""
+
+    WAIT_SAMPLES = 2048
+
+    def _init_metrics(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits = deque(maxlen=self.WAIT_SAMPLES)
+
+    def _do_get(self):
+        if not hasattr(self, "waits"):
+            self._init_metrics()
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - t0
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.waits.append(wait)
+
+    def metrics(self) -> dict:
+        if not hasattr(self, "waits"):
+            self._init_metrics()
+        waits = sorted(self.waits)
+        pct = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3) if waits else 0.0
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms_avg": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+            "wait_ms_p50": pct(0.50),
+            "wait_ms_p99": pct(0.99),
+            "wait_ms_max": round(self.wait_max * 1000, 3),
+        }
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+POOL_KWARGS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+}
+
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL: lectores no bloquean al escritor (importaciones) y viceversa
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")      # seguro con WAL, menos fsync
+    cur.execute("PRAGMA busy_timeout=5000")       # espera al lock en vez de fallar
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.close()
+
 
 if USE_SQLITE:
-    # archivo SQLite persistente en /app/data/app.db
+    # archivo SQLite persistente en /app/data/app.db (SQLITE_PATH para otro archivo, p.ej. benchmarks)
     DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    DB_URL = f"sqlite:///{DATA_DIR.as_posix()}/app.db"
+    SQLITE_PATH = Path(os.getenv("SQLITE_PATH", DATA_DIR / "app.db"))
+    SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    DB_URL = f"sqlite:///{SQLITE_PATH.as_posix()}"
+    ASYNC_DB_URL = f"sqlite+aiosqlite:///{SQLITE_PATH.as_posix()}"
 
     engine = create_engine(
         DB_URL,
         future=True,
-        connect_args={"check_same_thread": False}  # requerido por SQLite en hilos
+        poolclass=MeteredQueuePool,
+        connect_args={"check_same_thread": False},  # requerido por SQLite en hilos
+        **POOL_KWARGS,
     )
+    event.listen(engine, "connect", _sqlite_pragmas)
 else:
     # Variables MySQL (docker-compose / .env local)
     DB_USER = os.getenv("DB_USER", "osa_user")
@@ -29,12 +124,32 @@ else:
     DB_PORT = os.getenv("DB_PORT", "3306")
     DB_NAME = os.getenv("DB_NAME", "osa_db")
     DB_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    ASYNC_DB_URL = f"mysql+asyncmy://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-    engine = create_engine(DB_URL, future=True, pool_pre_ping=True)
+    # LOAD DATA LOCAL INFILE (importación masiva) debe habilitarse también en el cliente
+    MYSQL_LOAD_DATA = os.getenv("MYSQL_LOAD_DATA", "false").lower() == "true"
+    connect_args = {"allow_local_infile": True} if MYSQL_LOAD_DATA else {}
+
+    engine = create_engine(
+        DB_URL, future=True, pool_pre_ping=True, poolclass=MeteredQueuePool,
+        connect_args=connect_args, **POOL_KWARGS,
+    )
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 Base = declarative_base()
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    # requiere aiosqlite (SQLite) o asyncmy (MySQL)
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    async_engine = create_async_engine(
+        ASYNC_DB_URL, poolclass=MeteredAsyncQueuePool, pool_pre_ping=not USE_SQLITE, **POOL_KWARGS,
+    )
+    if USE_SQLITE:
+        event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -42,22 +157,21 @@ def get_db():
     finally:
         db.close()
 
-def ensure_indexes():
-    """Crea índices típicos; tolera si ya existen."""
-    backend = engine.url.get_backend_name()
-    with engine.begin() as conn:
-        if backend == "sqlite":
-            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_measurements_fecha  ON measurements (fecha)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_measurements_pv     ON measurements (pv)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_measurements_codigo ON measurements (codigo_barra)"))
-        else:
-            # MySQL: no soporta IF NOT EXISTS en CREATE INDEX → try/except
-            for sql in [
-                "CREATE INDEX ix_measurements_fecha  ON measurements (fecha)",
-                "CREATE INDEX ix_measurements_pv     ON measurements (pv)",
-                "CREATE INDEX ix_measurements_codigo ON measurements (codigo_barra)",
-            ]:
-                try:
-                    conn.execute(text(sql))
-                except Exception:
-                    pass
+async def run_query(fn):
+    """Ejecuta fn(session) (código sync de consultas) sin bloquear el event loop: en el
+    engine async vía run_sync, o en el threadpool con una Session del engine sync."""
+    if async_engine is not None:
+        async with AsyncSessionLocal() as session:
+            return await session.run_sync(fn)
+    from starlette.concurrency import run_in_threadpool
+
+    def call():
+        with SessionLocal() as session:
+            return fn(session)
+    return await run_in_threadpool(call)
+
+def pool_stats() -> dict:
+    stats = {"sync": engine.pool.metrics()}
+    if async_engine is not None:
+        stats["async"] = async_engine.pool.metrics()
+    return stats
@@ -0,0 +1,114 @@
+# backend/dedup.py
+# Importaciones idempotentes: índice único por clave natural y hash de contenido para
+# omitir archivos idénticos. En BD previas al índice con mediciones repetidas el
+# arranque no borra nada: avisa y la limpieza se corre a mano.
+# Uso: python -m backend.dedup apply [--dry-run]
+import hashlib
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+from .db import engine
+from .models import Measurement, ImportedFile, MEASUREMENT_NATURAL_KEY
+
+NATURAL_INDEX = "uq_measurements_natural"
+
+log = logging.getLogger("uvicorn.error")
+
+
+def file_sha256(path: str, block: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def seen_file(db, sha256: str) -> ImportedFile | None:
+    return db.get(ImportedFile, sha256)
+
+
+def record_file(db, sha256: str, filename: str, rows: int, job_id: str | None = None):
+    db.merge(ImportedFile(sha256=sha256, filename=filename, rows=rows, job_id=job_id,
+                          imported_at=datetime.utcnow()))
+    db.commit()
+
+
+def _complete() -> str:
+    return " AND ".join(f"{c} IS NOT NULL" for c in MEASUREMENT_NATURAL_KEY)
+
+
+def count_duplicates(bind=engine) -> int:
+    """Mediciones que sobran por clave natural (las que borraría remove_duplicates)."""
+    key = ", ".join(MEASUREMENT_NATURAL_KEY)
+    sql = (
+        f"SELECT COALESCE(SUM(n - 1), 0) FROM (SELECT COUNT(*) AS n FROM measurements "
+        f"WHERE {_complete()} GROUP BY {key} HAVING COUNT(*) > 1) AS dups"
+    )
+    with bind.connect() as conn:
+        return int(conn.execute(text(sql)).scalar() or 0)
+
+
+def remove_duplicates(bind=engine) -> int:
+    """Borra mediciones repetidas por clave natural dejando la última (mayor id)."""
+    key = ", ".join(MEASUREMENT_NATURAL_KEY)
+    # MySQL no permite leer la misma tabla en el DELETE salvo vía tabla derivada
+    sql = (
+        f"DELETE FROM measurements WHERE {_complete()} AND id NOT IN "
+        f"(SELECT id FROM (SELECT MAX(id) AS id FROM measurements GROUP BY {key}) AS keep_ids)"
+    )
+    with bind.begin() as conn:
+        return conn.execute(text(sql)).rowcount or 0
+
+
+def _has_index(bind) -> bool:
+    return NATURAL_INDEX in {ix["name"] for ix in inspect(bind).get_indexes("measurements")}
+
+
+def _create_index(bind):
+    index = next(ix for ix in Measurement.__table__.indexes if ix.name == NATURAL_INDEX)
+    index.create(bind)
+
+
+def ensure_natural_key(bind=engine) -> bool:
+    """Crea el índice único en BD previas a él si no hay duplicados; con duplicados solo
+    avisa (borrar mediciones es una migración explícita: python -m backend.dedup apply)."""
+    if _has_index(bind):
+        return True
+    dups = count_duplicates(bind)
+    if dups:
+        log.warning("measurements: %d filas repetidas por clave natural; sin índice único "
+                    "(re-importar puede duplicar). Revisar con python -m backend.dedup apply --dry-run", dups)
+        return False
+    _create_index(bind)
+    return True
+
+
+def apply(bind=engine, dry_run: bool = False) -> int:
+    """Migración: borra los duplicados (queda el de mayor id), crea el índice único y
+    recalcula rollup, cubos y muestra. Con dry_run solo cuenta."""
+    if dry_run:
+        return count_duplicates(bind)
+    removed = remove_duplicates(bind)
+    if not _has_index(bind):
+        _create_index(bind)
+    if removed:
+        from .rollup import rebuild
+        from .cube import rebuild as rebuild_cube
+        from .approx import rebuild as rebuild_approx
+        rebuild(bind)
+        rebuild_cube(bind)
+        rebuild_approx(bind)
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(prog="python -m backend.dedup")
+    ap.add_argument("command", choices=["apply"])
+    ap.add_argument("--dry-run", action="store_true", help="solo contar las filas que se borrarían")
+    args = ap.parse_args()
+    n = apply(dry_run=args.dry_run)
+    if args.dry_run:
+        print(f"Duplicados a eliminar: {n} (sin cambios)")
+    else:
+        print(f"Duplicados eliminados: {n}; índice {NATURAL_INDEX} creado")
@@ -0,0 +1,58 @@
+# backend/gunicorn_conf.py
+# Despliegue con varios procesos: gunicorn como maestro y workers uvicorn.
+# Uso: gunicorn -c backend/gunicorn_conf.py backend.main:app
+# - WEB_CONCURRENCY workers (por defecto uno por núcleo, hasta 4). Cada worker tiene su
+#   propio pool de BD: DB_POOL_SIZE + DB_MAX_OVERFLOW por worker debe caber en el
+#   max_connections del servidor MySQL.
+# - Antes de crear los workers se sincroniza el esquema y se re-encolan los jobs
+#   interrumpidos una sola vez (prestart).
+# - Con más de un worker hace falta SHARED_STATE=sqlite para que la caché, el ETag, el
+#   snapshot columnar y los clientes SSE vean las importaciones de cualquier proceso.
+#   Sin él se arranca un solo worker (con un aviso), aunque WEB_CONCURRENCY pida más.
+# - /metrics es por worker (cada scrape lo atiende uno): en Prometheus sumar por instancia.
+import multiprocessing
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or min(multiprocessing.cpu_count(), 4)
+# sin estado compartido, una importación solo invalidaría la caché de su propio worker
+shared_state = os.getenv("SHARED_STATE", "none").lower() == "sqlite"
+requested_workers = workers
+if not shared_state:
+    workers = 1
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# reciclar workers cada N peticiones acota fugas de memoria (0 = nunca)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+
+
+def prestart():
+    """Sincroniza el esquema y re-encola jobs interrumpidos (una vez por despliegue)."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    from backend import jobs
+    from backend.schema import sync_schema
+
+    sync_schema()
+    jobs.requeue_interrupted()
+
+
+def on_starting(server):
+    if requested_workers > 1 and not shared_state:
+        server.log.warning("SHARED_STATE no es sqlite: se usa 1 worker en vez de %d "
+                           "(la caché y los clientes SSE no verían importaciones de otros workers)",
+                           requested_workers)
+    # en un intérprete aparte: si el maestro cargara Polars (backfills del esquema), su
+    # pool de hilos no sobrevive al fork y las consultas de los workers se colgarían
+    subprocess.run([sys.executable, "-c", "from backend.gunicorn_conf import prestart; prestart()"],
+                   cwd=str(Path(__file__).resolve().parent.parent), check=True)
+    # ya se hizo aquí: los workers no vuelven a tocar la DDL ni a re-encolar
+    os.environ["SCHEMA_SYNC"] = "auto"
+    os.environ["IMPORT_REQUEUE_ON_STARTUP"] = "false"
@@ -1,97 +1,52 @@
 import os
-import pandas as pd
-import polars as pl
-from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from .db import engine, Base, SessionLocal
-from .models import Measurement
+from .db import SessionLocal
+from .dedup import file_sha256, seen_file, record_file
+from .schema import sync_schema
+from .ingest import IngestStats
+from .normalize import COLS_MAP  # noqa: F401  (mapeo Excel → BD, reexportado)
+from .streaming import ingest_file
 
-# Column mapping from Excel (Spanish) to DB fields
-COLS_MAP = {
-    "IdConjuntoProducto": "id_conjunto",
-    "Fecha": "fecha",
-    "Dia de la semana": "dia_semana",
-    "Nro de Semana": "nro_semana",
-    "PV": "pv",
-    "Formato": "formato",
-    "Codigo de Barra": "codigo_barra",
-    "Descripcion SKU": "descripcion_sku",
-    "Causal": "causal",
-    "ESTADO": "estado",
-    "Tipo de Resultado": "tipo_resultado",
-    "Categoría": "categoria",
-    "Marca": "marca",
-    "Formato Marketing": "formato_marketing",
-    "Responsable": "responsable",
-    "Sector Operativo Cadena": "sector_operativo",
-    "Provincia": "provincia",
-    "Nombre Cliente": "cliente",
-    "Proveedor": "proveedor",
-    "FechaHoraMedicion": "fecha_hora_medicion",
-}
+# opciones de normalización del CLI: fechas dd/mm, flags también por ESTADO,
+# sin filtro de rango ni descarte de filas incompletas
+NORMALIZE_OPTS = {"dayfirst": True, "estado_fallback": True, "date_range": None, "drop_nulls": False}
 
-def _coerce_date(x):
-    if pd.isna(x):
-        return None
-    if isinstance(x, datetime):
-        return x.date()
-    try:
-        return pd.to_datetime(x, dayfirst=True).date()
-    except Exception:
-        return None
 
-def _coerce_datetime(x):
-    if pd.isna(x):
-        return None
-    if isinstance(x, datetime):
-        return x
-    try:
-        return pd.to_datetime(x, dayfirst=True).to_pydatetime()
-    except Exception:
-        return None
+def load_excel(path: str, chunk_size: int | None = None, force: bool = False) -> int:
+    """Importa el archivo y devuelve las filas insertadas (detalle en load_excel_stats)."""
+    return load_excel_stats(path, chunk_size=chunk_size, force=force).inserted
 
-def load_excel(path: str):
-    # Read with pandas to support Excel; force barcode as string
-    df = pd.read_excel(path, dtype={"Codigo de Barra": str})
-    # Rename to internal names if present
-    rename = {k: v for k, v in COLS_MAP.items() if k in df.columns}
-    df = df.rename(columns=rename)
-    # Minimal required columns check
-    required = ["id_conjunto", "fecha", "pv", "codigo_barra", "estado", "tipo_resultado", "descripcion_sku"]
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        raise ValueError(f"Faltan columnas requeridas en Excel: {missing}")
 
-    # Coercions
-    df["fecha"] = df["fecha"].apply(_coerce_date)
-    if "fecha_hora_medicion" in df.columns:
-        df["fecha_hora_medicion"] = df["fecha_hora_medicion"].apply(_coerce_datetime)
-    else:
-        df["fecha_hora_medicion"] = pd.to_datetime(df["fecha"], errors="coerce")
-
-    # Flags
-    def osa_flag(row):
-        return 1 if (str(row.get("tipo_resultado","")).upper() == "OSA" or str(row.get("estado","")).upper()=="ENCONTRADO") else 0
-    def oos_flag(row):
-        return 1 if (str(row.get("tipo_resultado","")).upper() == "OOS" or str(row.get("estado","")).upper()=="FALTANTE") else 0
-    df["osa_flag"] = df.apply(osa_flag, axis=1)
-    df["oos_flag"] = df.apply(oos_flag, axis=1)
-
-    # Push to DB
-    Base.metadata.create_all(engine)
-    records = df.to_dict(orient="records")
+def load_excel_stats(path: str, chunk_size: int | None = None, force: bool = False) -> IngestStats:
+    # Lectura por bloques (openpyxl read-only / CSV) + normalización Polars + upsert masivo
+    sync_schema()
+    sha256 = file_sha256(path)
     with SessionLocal() as db:
-        for r in records:
-            db.add(Measurement(**{k: r.get(k) for k in Measurement.__table__.columns.keys() if k != "id"}))
-        db.commit()
-    return len(records)
+        prev = None if force else seen_file(db, sha256)
+    if prev:
+        # archivo idéntico ya importado: no se parsea
+        return IngestStats(unchanged=prev.rows, duplicate_file=True)
+    stats = ingest_file(path, chunk_size=chunk_size, **NORMALIZE_OPTS)
+    if not stats.skipped:
+        with SessionLocal() as db:
+            record_file(db, sha256, os.path.basename(path), stats.rows)
+    return stats
+
 
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 2:
-        print("Uso: python -m backend.import_excel <path_excel>")
+        print("Uso: python -m backend.import_excel <path_excel> [chunk_size] [--force]")
         raise SystemExit(1)
-    path = sys.argv[1]
-    added = load_excel(path)
-    print(f"Filas insertadas: {added}")
+    force = "--force" in sys.argv
+    args = [a for a in sys.argv[1:] if a != "--force"]
+    path = args[0]
+    chunk = int(args[1]) if len(args) > 1 else None
+    stats = load_excel_stats(path, chunk_size=chunk, force=force)
+    if stats.duplicate_file:
+        print(f"Archivo idéntico ya importado ({stats.unchanged} filas); use --force para reimportar")
+        raise SystemExit(0)
+    print(f"Filas insertadas: {stats.inserted}, actualizadas: {stats.updated}, "
+          f"sin cambios: {stats.unchanged} (omitidas: {stats.skipped}) "
+          f"en {stats.seconds:.1f}s → {stats.rows_per_sec} filas/s, {stats.chunks} lotes")
+    for err in stats.errors[:5]:
+        print(f"  error: {err}")
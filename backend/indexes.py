@@ -0,0 +1,108 @@
+# backend/indexes.py
+# Índices gestionados según la forma real de las consultas: todas filtran por pv
+# + rango de fecha y agrupan por fecha o por codigo_barra. Se comprueba qué
+# índices existen (inspect) antes de crear, y al arrancar se reporta el EXPLAIN
+# de las consultas de /api/kpis.
+import logging
+import os
+from sqlalchemy import Index, inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from .db import engine
+from .models import Measurement, MeasurementDailyRollup
+from .aggregates import kpis_statement, raw_source, rollup_source, measurement_filters, raw_measurements
+
+log = logging.getLogger("uvicorn.error")
+
+INDEX_EXPLAIN_REPORT = os.getenv("INDEX_EXPLAIN_REPORT", "true").lower() == "true"
+
+M, R = Measurement, MeasurementDailyRollup
+
+# (nombre, columnas): el orden importa — igualdad (pv) primero, luego rango/agrupación,
+# y al final las columnas que el SELECT necesita para no tocar la tabla (cubriente)
+MANAGED_INDEXES = [
+    # KPIs crudos por tienda: WHERE pv = ? AND fecha BETWEEN; flags y codigo_barra al
+    # final para que la serie diaria y los peores SKU se lean solo del índice
+    Index("ix_measurements_pv_fecha_cover", M.pv, M.fecha, M.osa_flag, M.oos_flag, M.codigo_barra),
+    # consultas por SKU dentro de una tienda (GROUP BY codigo_barra sin rango de fecha)
+    Index("ix_measurements_pv_codigo_osa", M.pv, M.codigo_barra, M.osa_flag),
+    # sin filtro de tienda: rango de fecha (también el keyset fecha desc, id desc)
+    Index("ix_measurements_fecha", M.fecha),
+    Index("ix_measurements_codigo", M.codigo_barra),
+    # rollup por tienda: cubre fecha, codigo_barra y las sumas
+    Index("ix_rollup_pv_fecha_cover", R.pv, R.fecha, R.codigo_barra, R.n, R.osa_sum, R.oos_sum),
+]
+
+# índices de versiones previas que quedan cubiertos por un prefijo de los anteriores
+OBSOLETE_INDEXES = {"measurements": ["ix_measurements_pv"]}
+
+
+def existing_indexes(bind, table: str) -> set[str]:
+    return {ix["name"] for ix in inspect(bind).get_indexes(table)}
+
+
+def ensure_indexes(bind=engine) -> list[str]:
+    """Crea los índices gestionados que falten y elimina los obsoletos; devuelve los creados."""
+    created = []
+    for index in MANAGED_INDEXES:
+        table = index.table.name
+        if index.name in existing_indexes(bind, table):
+            continue
+        try:
+            index.create(bind)
+            created.append(index.name)
+        except (OperationalError, ProgrammingError):
+            # otro proceso pudo crearlo entre la comprobación y el CREATE
+            if index.name not in existing_indexes(bind, table):
+                raise
+    for table, names in OBSOLETE_INDEXES.items():
+        present = existing_indexes(bind, table)
+        for name in names:
+            if name in present:
+                with bind.begin() as conn:
+                    conn.execute(text(f"DROP INDEX {name}" if bind.dialect.name == "sqlite"
+                                      else f"DROP INDEX {name} ON {table}"))
+    if created:
+        # estadísticas actualizadas para que el planificador elija los índices nuevos
+        with bind.begin() as conn:
+            conn.execute(text("ANALYZE" if bind.dialect.name == "sqlite"
+                              else "ANALYZE TABLE measurements, measurement_daily_rollup"))
+    return created
+
+
+def kpi_queries(store="__store__", date_from="2025-01-01", date_to="2025-12-31") -> dict:
+    """Las sentencias de /api/kpis (cruda y rollup, con y sin tienda) con parámetros de ejemplo."""
+    return {
+        "raw_store": kpis_statement(raw_source(measurement_filters(store, date_from, date_to, raw_measurements()))),
+        "raw_all": kpis_statement(raw_source(measurement_filters(None, date_from, date_to, raw_measurements()))),
+        "rollup_store": kpis_statement(rollup_source(measurement_filters(store, date_from, date_to, R))),
+        "rollup_all": kpis_statement(rollup_source(measurement_filters(None, date_from, date_to, R))),
+    }
+
+
+def explain(bind, stmt) -> list[str]:
+    sql = str(stmt.compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True}))
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            return [r[-1] for r in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        rows = conn.execute(text(f"EXPLAIN {sql}")).mappings().all()
+        return [f"{r['table']}: type={r['type']} key={r['key']} extra={r['Extra']}" for r in rows]
+
+
+def explain_kpis(bind=engine, **params) -> dict[str, list[str]]:
+    return {name: explain(bind, stmt) for name, stmt in kpi_queries(**params).items()}
+
+
+def report_plans(bind=engine):
+    """Escribe en el log del servidor el plan de cada consulta de KPIs."""
+    if not INDEX_EXPLAIN_REPORT:
+        return
+    for name, plan in explain_kpis(bind).items():
+        log.info("EXPLAIN kpis[%s]:\n  %s", name, "\n  ".join(plan))
+
+
+if __name__ == "__main__":
+    print("Índices creados:", ensure_indexes() or "ninguno")
+    for name, plan in explain_kpis().items():
+        print(f"[{name}]")
+        for line in plan:
+            print("  " + line)
@@ -0,0 +1,257 @@
+# backend/ingest.py
+# Inserción masiva compartida por los importadores (router y CLI).
+# El DataFrame normalizado (Polars) se parte en lotes columnares; cada lote se
+# clasifica contra la clave natural (nuevo / cambiado / igual) con un join contra una
+# tabla temporal de claves, se escribe con un upsert masivo (o LOAD DATA LOCAL INFILE en
+# MySQL para filas nuevas) y se confirma por separado junto con sus deltas de rollup,
+# cubos y muestra, calculados con group_by de Polars sobre el lote.
+# Con MEASUREMENT_STORAGE=normalized el lote se escribe en measurement_fact con los
+# ids de dimensión resueltos en bloque (storage.DimensionBatch).
+# Los deltas de rollup de cada lote se publican tras su commit (live.py → SSE).
+from __future__ import annotations
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from sqlalchemy import select, text, and_
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from .db import engine
+from .models import Measurement, MEASUREMENT_NATURAL_KEY
+from .normalize import MEASUREMENT_COLUMNS
+from .rollup import RollupAccumulator
+from .cube import CubeAccumulator
+from .approx import ApproxAccumulator
+from .cache import query_cache
+from .metrics import import_stage
+from . import columnar
+from . import storage
+from . import partitions
+from . import live
+from .lazy import lazy_import
+
+pl = lazy_import("polars")
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+# LOAD DATA LOCAL INFILE requiere local_infile=1 en el servidor MySQL
+MYSQL_LOAD_DATA = os.getenv("MYSQL_LOAD_DATA", "false").lower() == "true"
+
+UPDATE_COLUMNS = [c for c in MEASUREMENT_COLUMNS if c not in MEASUREMENT_NATURAL_KEY]
+STAGED_KEYS = storage.staging_table("import_keys", Measurement.__table__, MEASUREMENT_NATURAL_KEY)
+
+
+@dataclass
+class IngestStats:
+    rows: int = 0          # filas procesadas (insertadas + actualizadas + sin cambios)
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    duplicate_file: bool = False  # archivo idéntico ya importado (no se parseó)
+    errors: list = field(default_factory=list)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return round(self.rows / self.seconds, 1) if self.seconds else 0.0
+
+    def merge(self, other: "IngestStats"):
+        self.rows += other.rows
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.skipped += other.skipped
+        self.chunks += other.chunks
+        self.seconds += other.seconds
+        self.errors.extend(other.errors)
+        return self
+
+    def as_dict(self):
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "skipped": self.skipped,
+            "chunks": self.chunks,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": self.rows_per_sec,
+            "duplicate_file": self.duplicate_file,
+            "errors": self.errors[:10],
+        }
+
+
+def column_batches(df: pl.DataFrame, chunk_size: int):
+    """Lotes de a chunk_size filas (el DataFrame normalizado ya es columnar)."""
+    for start in range(0, df.height, chunk_size):
+        yield df.slice(start, chunk_size)
+
+
+def upsert_statement(conn):
+    """INSERT ... ON CONFLICT (SQLite) / ON DUPLICATE KEY UPDATE (MySQL) sobre la clave natural."""
+    table = Measurement.__table__
+    if conn.dialect.name == "sqlite":
+        stmt = sqlite_dialect.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=list(MEASUREMENT_NATURAL_KEY),
+            set_={c: stmt.excluded[c] for c in UPDATE_COLUMNS},
+        )
+    from sqlalchemy.dialects import mysql as mysql_dialect  # solo en despliegues MySQL
+    stmt = mysql_dialect.insert(table)
+    return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in UPDATE_COLUMNS})
+
+
+def existing_rows(conn, keys, columns: list[str]) -> list[tuple]:
+    """[(pos, valores de columns)] de las claves de keys (DataFrame pos + clave natural) que
+    ya están en BD: las claves van a una tabla temporal y se cruzan en un solo join contra
+    el índice único."""
+    t, S = Measurement.__table__, STAGED_KEYS
+    storage.stage(conn, S, keys.to_dicts())
+    on = and_(*(t.c[c] == S.c[c] for c in MEASUREMENT_NATURAL_KEY))
+    return [tuple(r) for r in conn.execute(select(S.c.pos, *(t.c[c] for c in columns)).select_from(S.join(t, on)))]
+
+
+# LOAD DATA (ESCAPED BY '\\'): barra, tab, salto de línea, retorno y NUL se escapan;
+# NULL es \N sin escapar (csv.writer escaparía también esa barra y guardaría "\N" literal)
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+
+def tsv_value(v) -> str:
+    if v is None:
+        return "\\N"
+    if isinstance(v, bool):
+        return "1" if v else "0"
+    return str(v).translate(_TSV_ESCAPES)
+
+
+def tsv_lines(batch: dict):
+    """Líneas TSV (con \\n final) del lote columnar en el formato que lee LOAD DATA."""
+    for vals in zip(*batch.values()):
+        yield "\t".join(tsv_value(v) for v in vals) + "\n"
+
+
+def _load_data_infile(conn, batch: dict):
+    """Vía rápida MySQL: vuelca el lote a un TSV temporal y usa LOAD DATA LOCAL INFILE."""
+    fd, path = tempfile.mkstemp(suffix=".tsv")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as fh:
+            fh.writelines(tsv_lines(batch))
+        cols = ", ".join(batch)
+        conn.execute(text(
+            f"LOAD DATA LOCAL INFILE '{path}' IGNORE INTO TABLE measurements "
+            f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+            f"LINES TERMINATED BY '\\n' ({cols})"
+        ))
+    finally:
+        os.remove(path)
+
+
+def write_batch(conn, batch: pl.DataFrame, touched: set | None = None,
+                dims: storage.DimensionBatch | None = None, deltas: list | None = None) -> tuple[int, int, int]:
+    """Escribe un lote deduplicado; devuelve (insertadas, actualizadas, sin cambios).
+    touched recibe los (fecha, pv) modificados, incluida la fecha previa de las filas actualizadas.
+    dims: ids de dimensión del lote (tiendas en modo wide); el llamador publica tras el commit.
+    deltas recibe las filas [fecha ISO, pv, codigo_barra, n, osa, oos] sumadas al rollup."""
+    key = list(MEASUREMENT_NATURAL_KEY)
+    # columnas comparadas contra lo guardado (el modo normalizado no guarda las de calendario)
+    compared = storage.stored_columns(UPDATE_COLUMNS)
+    keyed = batch.drop_nulls(subset=key)
+    # sin clave completa (p.ej. sin fecha) no se puede deduplicar: siempre son nuevas
+    unkeyed = batch.filter(pl.any_horizontal(pl.col(key).is_null()))
+    # dentro del mismo archivo gana la última aparición de cada clave
+    deduped = keyed.unique(subset=key, keep="last", maintain_order=True).with_row_index("pos")
+
+    dims = dims or storage.DimensionBatch()
+    if storage.normalized():
+        ids = dims.resolve_frame(conn, pl.concat([deduped.drop("pos"), unkeyed]))
+        found = storage.existing_rows(conn, deduped.select("pos", *key), ids, compared)
+    else:
+        # tiendas nuevas → stores (selector de PV de /api/stores/search)
+        dims.resolve_frame(conn, pl.concat([deduped.drop("pos"), unkeyed]), stores_only=True)
+        found = existing_rows(conn, deduped.select("pos", *key), compared)
+    old = pl.DataFrame(found, orient="row", strict=False,
+                       schema={"pos": pl.UInt32, **{c: batch.schema[c] for c in compared}})
+    both = deduped.join(old, on="pos", suffix="_old")
+    both = both.filter(pl.any_horizontal(pl.col(c).ne_missing(pl.col(f"{c}_old")) for c in compared))
+    new = pl.concat([unkeyed, deduped.join(old.select("pos"), on="pos", how="anti").drop("pos")])
+    changed = both.select(batch.columns)
+    # versión anterior de las filas cambiadas: rollup y cubos la descuentan
+    previous = both.select(*key, *(pl.col(f"{c}_old").alias(c) for c in compared))
+    unchanged = keyed.height - deduped.height + old.height - changed.height
+
+    written = pl.concat([new, changed])
+    rollup = RollupAccumulator()
+    cube = CubeAccumulator()
+    sample = ApproxAccumulator()
+    rollup.add_frame(written)
+    cube.add_frame(written)
+    if previous.height:
+        rollup.add_frame(previous, sign=-1)
+        cube.add_frame(previous, sign=-1)
+    # muestra estratificada y sketches de SKU del modo aproximado (approx.py)
+    sample.add_frame(new)
+    for r in changed.iter_rows(named=True):
+        sample.update_record(r)
+    delta = rollup.frame()
+    sample.add_deltas(delta)
+
+    if storage.normalized():
+        if written.height:
+            conn.execute(storage.upsert_statement(conn), storage.fact_rows(written, ids))
+    elif new.height and MYSQL_LOAD_DATA and conn.dialect.name == "mysql":
+        _load_data_infile(conn, {c: new[c].to_list() for c in MEASUREMENT_COLUMNS})
+        if changed.height:
+            conn.execute(upsert_statement(conn), changed.to_dicts())
+    elif written.height:
+        conn.execute(upsert_statement(conn), written.to_dicts())
+    if delta is not None:
+        if touched is not None:
+            touched.update(delta.select("fecha", "pv").unique().iter_rows())
+        if deltas is not None:
+            deltas.extend([f.isoformat(), pv, cb, n, osa, oos] for f, pv, cb, n, osa, oos in delta.iter_rows()
+                          if n | osa | oos)
+    rollup.flush(conn, delta)
+    cube.flush(conn)
+    sample.flush(conn)
+    return new.height, changed.height, unchanged
+
+
+def bulk_insert(df: pl.DataFrame, chunk_size: int | None = None, bind=engine) -> IngestStats:
+    """Inserta df (salida de normalize.normalize) en lotes; un commit por lote."""
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    stats = IngestStats()
+    t0 = time.perf_counter()
+    # los meses archivados a Parquet ya no se escriben: quedarían contados dos veces
+    df, archived = partitions.split_archived(df, bind)
+    if archived:
+        stats.skipped += archived
+        stats.errors.append(f"{archived} filas de meses archivados omitidas")
+    for batch in column_batches(df, chunk_size):
+        n = batch.height
+        try:
+            # cada lote en su propia transacción (mediciones + rollup)
+            touched = set()
+            dims = storage.DimensionBatch()
+            deltas = [] if live.LIVE_ENABLED else None
+            with bind.connect() as conn, conn.begin() as trans:
+                with import_stage("insert", n):
+                    ins, upd, same = write_batch(conn, batch, touched, dims, deltas)
+                # commit y aviso juntos: una vista en vivo no se carga entre los dos
+                with live.publishing():
+                    with import_stage("commit", n):
+                        trans.commit()
+                    dims.publish()
+                    # tras el commit: invalida solo las respuestas cacheadas que cubren
+                    # lo escrito y publica los deltas del lote (live.py)
+                    if ins or upd:
+                        query_cache.invalidate_touched(touched, deltas)
+                        columnar.mark_stale()
+            stats.rows += n
+            stats.inserted += ins
+            stats.updated += upd
+            stats.unchanged += same
+        except Exception as e:
+            stats.skipped += n
+            stats.errors.append(str(e).splitlines()[0])
+        stats.chunks += 1
+    stats.seconds = time.perf_counter() - t0
+    return stats
@@ -0,0 +1,289 @@
+# backend/jobs.py
+# Importaciones en segundo plano: el upload se guarda en disco, se registra un
+# ImportJob en BD y un pool (hilos o procesos) hace el parseo e inserción.
+# El estado vive en la tabla import_jobs, así que sobrevive a reinicios.
+# IMPORT_MODE=queue separa importación y consultas: la API solo registra el job y un
+# proceso aparte (python -m backend.worker) lo toma de la tabla y lo ejecuta.
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import select, func, update, inspect, text
+from .db import engine, SessionLocal
+from .models import ImportJob
+from .dedup import record_file
+from .normalize import UPLOAD_OPTS
+
+# Hilos/procesos dedicados a importar (< tamaño del pool de BD, para no dejar sin
+# conexiones a las consultas) y tope de jobs en cola antes de rechazar con 429
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+IMPORT_POOL = os.getenv("IMPORT_POOL", "thread").lower()  # thread | process
+IMPORT_MAX_PENDING = int(os.getenv("IMPORT_MAX_PENDING", "20"))
+IMPORT_MODE = os.getenv("IMPORT_MODE", "inline").lower()  # inline | queue
+UPLOAD_DIR = Path(os.getenv("IMPORT_UPLOAD_DIR", Path(__file__).resolve().parent.parent / "data" / "uploads"))
+# Cada job en curso guarda su dueño (host:pid) y un latido: al re-encolar solo se
+# toman los "running" cuyo proceso ya no existe o que dejaron de latir
+IMPORT_HEARTBEAT_SECONDS = float(os.getenv("IMPORT_HEARTBEAT_SECONDS", "15"))
+IMPORT_STALE_SECONDS = float(os.getenv("IMPORT_STALE_SECONDS", "120"))
+HOST = socket.gethostname()
+
+_executor = None
+_running_here = set()  # jobs que ejecuta este proceso
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _init_process_worker():
+    # en un proceso hijo no se reutilizan las conexiones heredadas del padre
+    engine.dispose(close=False)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        if IMPORT_POOL == "process":
+            _executor = ProcessPoolExecutor(max_workers=IMPORT_WORKERS, initializer=_init_process_worker)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _after_process_job(_future):
+    # el job corrió en otro proceso: su caché y versión de datos no son las de este
+    from .cache import query_cache
+    from . import columnar
+    if query_cache.shared is not None:
+        # sus invalidaciones ya están en el registro compartido
+        query_cache.sync(force=True)
+        return
+    query_cache.clear()
+    columnar.mark_stale()
+
+
+def submit(job_id: str):
+    future = get_executor().submit(run_job, job_id)
+    if IMPORT_POOL == "process":
+        future.add_done_callback(_after_process_job)
+    return future
+
+
+def upload_dir() -> str:
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    return str(UPLOAD_DIR)
+
+
+def pending_count(db) -> int:
+    return db.execute(
+        select(func.count()).select_from(ImportJob).where(ImportJob.status.in_(("queued", "running")))
+    ).scalar() or 0
+
+
+def create_job(path: str, filename: str, chunk_size: int | None = None, sha256: str | None = None) -> ImportJob:
+    with SessionLocal() as db:
+        if pending_count(db) >= IMPORT_MAX_PENDING:
+            raise QueueFull(f"Hay {IMPORT_MAX_PENDING} importaciones pendientes; reintente luego")
+        job = ImportJob(
+            id=uuid.uuid4().hex,
+            filename=filename,
+            path=str(path),
+            status="queued",
+            chunk_size=chunk_size,
+            sha256=sha256,
+            created_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        db.expunge(job)
+    if IMPORT_MODE != "queue":
+        submit(job.id)
+    return job
+
+
+def _update(job_id: str, **fields):
+    with SessionLocal() as db:
+        job = db.get(ImportJob, job_id)
+        for k, v in fields.items():
+            setattr(job, k, v)
+        db.commit()
+
+
+def owner_id() -> str:
+    return f"{HOST}:{os.getpid()}"
+
+
+def ensure_owner_columns(bind=engine):
+    """owner y heartbeat_at en una tabla import_jobs creada antes de que existieran."""
+    cols = {c["name"] for c in inspect(bind).get_columns("import_jobs")}
+    with bind.begin() as conn:
+        if "owner" not in cols:
+            conn.execute(text("ALTER TABLE import_jobs ADD COLUMN owner VARCHAR(120)"))
+        if "heartbeat_at" not in cols:
+            conn.execute(text("ALTER TABLE import_jobs ADD COLUMN heartbeat_at DATETIME"))
+
+
+def claim(job_id: str) -> bool:
+    """queued → running en un solo UPDATE: si hay varios procesos, solo uno lo toma."""
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        result = db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job_id, ImportJob.status == "queued")
+            .values(status="running", started_at=now, owner=owner_id(), heartbeat_at=now)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+
+def _heartbeat(job_id: str, owner: str, stop: threading.Event):
+    while not stop.wait(IMPORT_HEARTBEAT_SECONDS):
+        try:
+            with SessionLocal() as db:
+                db.execute(
+                    update(ImportJob)
+                    .where(ImportJob.id == job_id, ImportJob.owner == owner, ImportJob.status == "running")
+                    .values(heartbeat_at=datetime.utcnow())
+                )
+                db.commit()
+        except Exception:
+            pass  # BD caída un momento: el próximo latido reintenta
+
+
+def owner_alive(job: ImportJob) -> bool:
+    """El proceso que tomó el job sigue vivo: si es este, lo está ejecutando (tras un
+    reinicio el pid puede repetirse); si es otro de este host, su pid existe; y en
+    cualquier caso el último latido es reciente."""
+    if not job.owner or job.heartbeat_at is None:
+        return False
+    if job.owner == owner_id():
+        return job.id in _running_here
+    host, _, pid = job.owner.rpartition(":")
+    if host == HOST:
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass  # existe, pero es de otro usuario
+    return (datetime.utcnow() - job.heartbeat_at).total_seconds() < IMPORT_STALE_SECONDS
+
+
+def queued_ids(limit: int) -> list[str]:
+    with SessionLocal() as db:
+        return list(db.execute(
+            select(ImportJob.id).where(ImportJob.status == "queued").order_by(ImportJob.created_at).limit(limit)
+        ).scalars())
+
+
+def run_job(job_id: str):
+    """Ejecuta el job (en el pool): lectura por bloques, normalización e inserción."""
+    from .streaming import ingest_file
+
+    if not claim(job_id):
+        return
+    _running_here.add(job_id)
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, owner_id(), stop), daemon=True,
+                     name=f"heartbeat-{job_id[:8]}").start()
+    with SessionLocal() as db:
+        job = db.get(ImportJob, job_id)
+        path, chunk_size, sha256, filename = job.path, job.chunk_size, job.sha256, job.filename
+    t0 = time.perf_counter()
+
+    def progress(stats):
+        elapsed = time.perf_counter() - t0
+        _update(
+            job_id,
+            rows_processed=stats.rows,
+            rows_inserted=stats.inserted,
+            rows_updated=stats.updated,
+            rows_unchanged=stats.unchanged,
+            rows_skipped=stats.skipped,
+            throughput=round(stats.rows / elapsed, 1) if elapsed else 0.0,
+        )
+
+    try:
+        stats = ingest_file(path, chunk_size=chunk_size, on_progress=progress, **UPLOAD_OPTS)
+        progress(stats)
+        errors = "; ".join(stats.errors[:5]) or None
+        _update(job_id, status="done", error=errors, finished_at=datetime.utcnow())
+        if sha256 and not stats.skipped:
+            with SessionLocal() as db:
+                record_file(db, sha256, filename, stats.rows, job_id)
+    except Exception as e:
+        _update(job_id, status="failed", error=str(e)[:1000], finished_at=datetime.utcnow())
+    finally:
+        stop.set()
+        _running_here.discard(job_id)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def job_as_dict(job: ImportJob):
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "rows_processed": job.rows_processed,
+        "inserted": job.rows_inserted,
+        "updated": job.rows_updated,
+        "unchanged": job.rows_unchanged,
+        "rows_skipped": job.rows_skipped,
+        "throughput": job.throughput,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def requeue_interrupted() -> list[str]:
+    """Jobs en cola o interrumpidos → queued (o failed si se perdió el archivo).
+    Un job "running" solo se considera interrumpido si su dueño ya no está (owner_alive):
+    con varios procesos (uvicorn --workers, reinicio de un worker) los que siguen
+    ejecutándose en otro no se toman dos veces. Re-ejecutar un job a medias es seguro
+    porque la inserción es un upsert por clave natural."""
+    with SessionLocal() as db:
+        jobs = db.execute(select(ImportJob).where(ImportJob.status.in_(("queued", "running")))).scalars().all()
+        requeue = []
+        for job in jobs:
+            if job.status == "running" and owner_alive(job):
+                continue
+            if not os.path.exists(job.path):
+                job.status = "failed"
+                job.error = "Archivo no disponible tras reinicio del servidor"
+                job.finished_at = datetime.utcnow()
+            else:
+                job.status = "queued"
+                requeue.append(job.id)
+            job.owner = job.heartbeat_at = None
+        db.commit()
+    return requeue
+
+
+def resume_pending():
+    """Al arrancar en modo inline: re-encola los jobs pendientes en el pool de este proceso.
+    IMPORT_REQUEUE_ON_STARTUP=false cuando otro proceso ya lo hizo (maestro de gunicorn)."""
+    if os.getenv("IMPORT_REQUEUE_ON_STARTUP", "true").lower() == "true":
+        requeue = requeue_interrupted()
+    else:
+        # cada worker toma los que sigan en cola; claim() evita ejecutarlos dos veces
+        requeue = queued_ids(IMPORT_MAX_PENDING)
+    for job_id in requeue:
+        submit(job_id)
+    return len(requeue)
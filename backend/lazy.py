@@ -0,0 +1,32 @@
+# backend/lazy.py
+# Importación diferida de dependencias pesadas (polars, numpy): el módulo real se
+# carga en el primer acceso a un atributo (pl.DataFrame, pl.col...), no al importar
+# el paquete. Así un worker arranca sin pagar polars hasta la primera consulta o
+# importación. Los módulos que lo usan en anotaciones llevan
+# "from __future__ import annotations".
+import importlib
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            # import_module es seguro entre hilos (lock de importación por módulo)
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "cargado" if self.__dict__["_module"] is not None else "sin cargar"
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
@@ -0,0 +1,327 @@
+# backend/live.py
+# Actualizaciones en vivo de /api/kpis por Server-Sent Events (/api/kpis/stream).
+# Cada filtro suscrito (tienda, rango) tiene una vista en memoria: n/osa/oos por día y
+# n/osa por SKU, cargados una vez desde el rollup (con los meses archivados). Cada
+# commit de importación publica los deltas de rollup de su lote junto con la
+# invalidación de la caché (cache.add_change_listener; con SHARED_STATE viajan por
+# shared_state a los demás workers). La vista suma solo los deltas de su filtro y envía
+# a sus clientes los puntos de la serie que cambiaron, los totales y los peores SKU si
+# cambiaron: entre importaciones un cliente conectado solo cuesta el keep-alive.
+# Un cambio sin deltas (rebuild del rollup, archivo, limpieza de caché) recarga la
+# vista y envía un snapshot completo.
+# Todo lo que toca las vistas corre en un único hilo (orden de los commits); los
+# eventos llegan a cada conexión por una cola acotada en su event loop.
+import asyncio
+import heapq
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Lock
+from .aggregates import assemble_kpis, kpi_state, WORST_SKU_LIMIT
+from .cache import query_cache, _as_iso
+from .db import SessionLocal
+from .responses import dumps
+from .shared_state import SHARED_STATE
+from .lazy import lazy_import
+
+pl = lazy_import("polars")
+
+log = logging.getLogger("uvicorn.error")
+
+LIVE_ENABLED = os.getenv("LIVE_ENABLED", "true").lower() == "true"
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+# eventos pendientes por conexión; un cliente más lento recibe un snapshot nuevo
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "64"))
+# SHARED_STATE: cada cuánto se miran los commits de otros procesos mientras hay clientes
+LIVE_POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", "1"))
+# recarga de control de las vistas que recibieron deltas (0 = nunca). Con SHARED_STATE
+# un commit de otro proceso puede quedar dentro de una carga y llegar además como delta.
+LIVE_RESYNC_SECONDS = float(os.getenv("LIVE_RESYNC_SECONDS", "60" if SHARED_STATE == "sqlite" else "0"))
+
+# commit + aviso de un lote vs carga de una vista: la carga ve los dos o ninguno
+_commit_lock = Lock()
+
+
+@contextmanager
+def publishing():
+    """Envuelve commit e invalidación de un lote importado en este proceso."""
+    with _commit_lock:
+        yield
+
+
+def format_event(kind: str, data) -> bytes:
+    return b"event: " + kind.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def _version() -> str:
+    return f"{query_cache.epoch}-{query_cache.data_version}"
+
+
+class Subscriber:
+    """Una conexión SSE: presentación de la serie y cola en su event loop."""
+
+    def __init__(self, key: tuple, options: tuple, loop: asyncio.AbstractEventLoop):
+        self.key = key
+        self.options = options  # (group_by, ma_window, max_points)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.stale = False
+
+    def offer(self, kind: str, data):
+        """Desde el hilo de las vistas."""
+        self.loop.call_soon_threadsafe(self._put, kind, data)
+
+    def _put(self, kind, data):
+        if self.stale:
+            return
+        try:
+            self.queue.put_nowait((kind, data))
+        except asyncio.QueueFull:
+            # se descarta lo pendiente; el stream pide un snapshot al llegar a la marca
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(("resync", None))
+            self.stale = True
+
+
+class LiveView:
+    """Estado de un filtro (store, date_from, date_to) y sus suscriptores."""
+
+    def __init__(self, key: tuple):
+        self.store, self.date_from, self.date_to = key
+        self.daily = {}   # fecha ISO → [n, osa, oos]
+        self.skus = {}    # codigo_barra → [n, osa]
+        self.worst = []
+        self.loaded = False
+        self.dirty_at = None  # primer delta sumado desde la última carga
+        self.subscribers = set()
+        self.last = {}    # opciones → última respuesta enviada (base de los deltas)
+
+    def load(self, session_factory):
+        with session_factory() as db, _commit_lock:
+            daily, skus = kpi_state(db, self.store, self.date_from, self.date_to)
+        self.daily = {d.isoformat(): [int(n), float(osa), float(oos)] for d, n, osa, oos in daily.iter_rows()}
+        self.skus = {k: [int(n), float(osa)] for k, n, osa in skus.iter_rows() if n}
+        self.worst = self._worst()
+        self.loaded, self.dirty_at = True, None
+        self.last = {}
+
+    def covers(self, fecha: str, pv: str) -> bool:
+        if self.store and pv != self.store:
+            return False
+        if self.date_from and fecha < self.date_from:
+            return False
+        return not (self.date_to and fecha > self.date_to)
+
+    def apply(self, deltas) -> bool:
+        changed = False
+        for fecha, pv, cb, n, osa, oos in deltas:
+            if not self.covers(fecha, pv):
+                continue
+            d = self.daily.setdefault(fecha, [0, 0.0, 0.0])
+            d[0] += n
+            d[1] += osa
+            d[2] += oos
+            if d[0] <= 0:
+                del self.daily[fecha]
+            s = self.skus.setdefault(cb, [0, 0.0])
+            s[0] += n
+            s[1] += osa
+            if s[0] <= 0:
+                del self.skus[cb]
+            changed = True
+        if changed:
+            self.worst = self._worst()
+            self.dirty_at = self.dirty_at or time.monotonic()
+        return changed
+
+    def _worst(self) -> list:
+        # mismo orden que kpis_statement: osa/n y luego el código
+        top = heapq.nsmallest(WORST_SKU_LIMIT, self.skus.items(), key=lambda kv: (kv[1][1] / kv[1][0], kv[0]))
+        return [(k, n, osa) for k, (n, osa) in top]
+
+    def _frame(self) -> pl.DataFrame:
+        days = sorted(self.daily)
+        return pl.DataFrame(
+            {
+                "fecha": days,
+                "n": [self.daily[d][0] for d in days],
+                "osa": [self.daily[d][1] for d in days],
+                "oos": [self.daily[d][2] for d in days],
+            },
+            schema={"fecha": pl.Utf8, "n": pl.Int64, "osa": pl.Float64, "oos": pl.Float64},
+        ).with_columns(pl.col("fecha").str.to_date("%Y-%m-%d"))
+
+    def kpis(self, frame: pl.DataFrame, options: tuple) -> dict:
+        total = sum(d[0] for d in self.daily.values())
+        osa = sum(d[1] for d in self.daily.values())
+        oos = sum(d[2] for d in self.daily.values())
+        data = assemble_kpis(total, osa, oos, frame, self.worst, *options)
+        data["version"] = _version()
+        return data
+
+    def snapshot(self, options: tuple) -> dict:
+        # los clientes con la misma presentación comparten la última respuesta
+        if options not in self.last:
+            self.last[options] = self.kpis(self._frame(), options)
+        return self.last[options]
+
+    def deltas(self, old_worst: list) -> dict:
+        """{opciones: evento} para las presentaciones suscritas tras apply()."""
+        frame = self._frame()
+        events = {}
+        for options in {s.options for s in self.subscribers}:
+            data = self.kpis(frame, options)
+            previous = self.last.get(options)
+            self.last[options] = data
+            if data["total"] == 0 or previous is None:
+                events[options] = ("snapshot", data)
+                continue
+            before = {p["date"]: p for p in previous["series"]}
+            labels = {p["date"] for p in data["series"]}
+            event = {k: data[k] for k in ("version", "total", "osa_pct", "oos_pct")}
+            event["series"] = [p for p in data["series"] if before.get(p["date"]) != p]
+            event["removed"] = [label for label in before if label not in labels]
+            if self.worst != old_worst:
+                event["worst_sku"] = data["worst_sku"]
+            events[options] = ("delta", event)
+        return events
+
+
+class LiveHub:
+    """Vistas por filtro; los cambios se aplican en un único hilo, en orden de commit."""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._views = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="live")
+        self._poller = None
+
+    def _run(self, fn, *args):
+        def task():
+            try:
+                return fn(*args)
+            except Exception:
+                log.exception("live: error actualizando vistas")
+                raise
+        return self._executor.submit(task)
+
+    # ---- conexiones ----
+    def subscriber(self, store=None, date_from=None, date_to=None, options=("day", None, None)) -> Subscriber:
+        key = (store or None, _as_iso(date_from), _as_iso(date_to))
+        return Subscriber(key, tuple(options), asyncio.get_running_loop())
+
+    async def subscribe(self, sub: Subscriber):
+        """Carga la vista si hace falta y encola el snapshot; después llegan los deltas."""
+        await asyncio.wrap_future(self._run(self._attach, sub))
+        if self._poller is None and (query_cache.shared is not None or LIVE_RESYNC_SECONDS > 0):
+            self._poller = asyncio.create_task(self._poll())
+
+    def _attach(self, sub: Subscriber):
+        view = self._views.get(sub.key)
+        if view is None:
+            view = self._views[sub.key] = LiveView(sub.key)
+        if not view.loaded:
+            view.load(self.session_factory)
+        view.subscribers.add(sub)
+        sub.offer("snapshot", view.snapshot(sub.options))
+
+    def unsubscribe(self, sub: Subscriber):
+        self._run(self._detach, sub)
+
+    def _detach(self, sub: Subscriber):
+        view = self._views.get(sub.key)
+        if view is None:
+            return
+        view.subscribers.discard(sub)
+        if not view.subscribers:
+            del self._views[sub.key]
+        elif all(s.options != sub.options for s in view.subscribers):
+            view.last.pop(sub.options, None)
+
+    async def resnapshot(self, sub: Subscriber) -> dict:
+        """Snapshot para un cliente que se atrasó (cola llena)."""
+        return await asyncio.wrap_future(self._run(self._resnapshot, sub))
+
+    def _resnapshot(self, sub: Subscriber) -> dict:
+        data = self._views[sub.key].snapshot(sub.options)
+        # los eventos ya encolados hasta acá quedan cubiertos por este snapshot
+        sub.loop.call_soon_threadsafe(setattr, sub, "stale", False)
+        return data
+
+    # ---- cambios de datos (cache.add_change_listener) ----
+    def on_change(self, deltas):
+        if self._views:
+            self._run(self._apply, deltas)
+
+    def _apply(self, deltas):
+        by_store = {}
+        for d in deltas or ():
+            by_store.setdefault(d[1], []).append(d)
+        for view in list(self._views.values()):
+            if deltas is None:
+                self._reload(view)
+                continue
+            old_worst = view.worst
+            rows = deltas if view.store is None else by_store.get(view.store, ())
+            if view.loaded and view.apply(rows):
+                self._send(view, view.deltas(old_worst))
+
+    def _reload(self, view: LiveView, only_if_changed: bool = False):
+        state = (view.daily, view.skus)
+        view.load(self.session_factory)
+        if only_if_changed and (view.daily, view.skus) == state:
+            return
+        self._send(view, {o: ("snapshot", view.snapshot(o)) for o in {s.options for s in view.subscribers}})
+
+    def _send(self, view: LiveView, events: dict):
+        for sub in view.subscribers:
+            kind, data = events[sub.options]
+            sub.offer(kind, data)
+
+    def _resync(self):
+        now = time.monotonic()
+        for view in list(self._views.values()):
+            if view.dirty_at is not None and now - view.dirty_at >= LIVE_RESYNC_SECONDS > 0:
+                self._reload(view, only_if_changed=True)
+
+    async def _poll(self):
+        # commits de otros procesos (SHARED_STATE) y recargas de control
+        try:
+            while self._views:
+                await asyncio.sleep(LIVE_POLL_SECONDS)
+                if query_cache.shared is not None:
+                    await asyncio.to_thread(query_cache.sync)
+                if LIVE_RESYNC_SECONDS > 0:
+                    await asyncio.wrap_future(self._run(self._resync))
+        finally:
+            self._poller = None
+
+    def stats(self) -> dict:
+        views = list(self._views.values())
+        return {"views": len(views), "subscribers": sum(len(v.subscribers) for v in views)}
+
+
+hub = LiveHub()
+
+
+async def stream(request, store=None, date_from=None, date_to=None, options=("day", None, None)):
+    """Cuerpo del StreamingResponse: snapshot, deltas y keep-alive hasta que el cliente corta."""
+    sub = hub.subscriber(store, date_from, date_to, options)
+    try:
+        await hub.subscribe(sub)
+        while True:
+            try:
+                kind, data = await asyncio.wait_for(sub.queue.get(), LIVE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield b": keep-alive\n\n"
+                continue
+            if kind == "resync":
+                kind, data = "snapshot", await hub.resnapshot(sub)
+            yield format_event(kind, data)
+    finally:
+        hub.unsubscribe(sub)
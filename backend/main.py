@@ -1,18 +1,29 @@
 # backend/main.py
 import os
-from decimal import Decimal
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from dotenv import load_dotenv
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from .db import Base, engine, get_db, ensure_indexes
-from .models import Measurement
+from .db import get_db, run_query, pool_stats, DB_POOL_SIZE, DB_MAX_OVERFLOW
+from .indexes import report_plans
+from .aggregates import compute_kpis
+from .approx import compute_approx_kpis, enabled as approx_enabled
+from .breakdown import compute_breakdown
+from .cache import query_cache
+from . import columnar
+from . import partitions
+from . import live
+from . import metrics
+from .compression import CompressionMiddleware
+from .responses import FastJSONResponse, validators, not_modified
+from .schema import sync_schema
+from . import jobs as import_jobs
 from .routers import stores as stores_router
 from .routers import importer as importer_router
-from fastapi.responses import RedirectResponse
+from .routers import measurements as measurements_router
+from fastapi.responses import RedirectResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import anyio
 from fastapi import Response
 
 load_dotenv()
@@ -20,7 +31,7 @@ load_dotenv()
 ADMIN_USER = os.getenv("ADMIN_USER", "admin")
 ADMIN_PASS = os.getenv("ADMIN_PASS", "admin123")
 
-app = FastAPI(title="OSA Dashboard API", version="0.1")
+app = FastAPI(title="OSA Dashboard API", version="0.1", default_response_class=FastJSONResponse)
 
 # CORS (ajusta los orígenes)
 CORS_PERMISSIVE = os.getenv("CORS_PERMISSIVE", "false").lower() == "true"
@@ -38,6 +49,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip / brotli a partir de COMPRESS_MIN_BYTES; va por dentro de las métricas para
+# ver el cuerpo completo de cada respuesta (y no el stream que arma call_next)
+app.add_middleware(CompressionMiddleware)
+
+# latencia por ruta, consultas SQL por petición y consultas lentas (→ /metrics)
+metrics.instrument_engines()
+app.middleware("http")(metrics.middleware)
+
 # Preflight explícito
 @app.options("/api/{path:path}", include_in_schema=False)
 def options_catch_all(path: str):
@@ -57,11 +76,34 @@ def healthz():
 # Routers
 app.include_router(stores_router.router)
 app.include_router(importer_router.router)
+app.include_router(measurements_router.router)
+
+# hilos para handlers sync (por defecto 40 en anyio); con THREADPOOL_SIZE se alinea
+# con el pool de BD para que los hilos no esperen conexiones que no existen
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "0")) or None
 
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
-    ensure_indexes()
+    if THREADPOOL_SIZE:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # DDL, índices y backfills solo si cambió la huella del esquema (schema_meta);
+    # los planes se reportan cuando los índices pudieron cambiar
+    if sync_schema():
+        report_plans()
+    if import_jobs.IMPORT_MODE != "queue":
+        import_jobs.resume_pending()
+    # invalidaciones de otros procesos (workers, importador) → snapshot columnar viejo
+    query_cache.add_listener(columnar.mark_stale)
+    query_cache.add_listener(partitions.forget)
+    # deltas de cada commit (de este proceso o de otro) → clientes de /api/kpis/stream
+    if live.LIVE_ENABLED:
+        query_cache.add_change_listener(live.hub.on_change)
+    if columnar.enabled():
+        columnar.get_store().load()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    import_jobs.shutdown()
 
 @app.get("/health")
 def health():
@@ -74,88 +116,136 @@ def login(body: dict):
     raise HTTPException(status_code=401, detail="Credenciales inválidas")
 
 @app.get("/api/kpis")
-def kpis(
+async def kpis(
+    request: Request,
     store: str | None = None,
     date_from: str | None = None,
     date_to: str | None = None,
-    db: Session = Depends(get_db),
+    group_by: str = Query("day", pattern="^(day|week|month)$"),
+    ma_window: int | None = Query(None, ge=1, le=365),
+    max_points: int | None = Query(None, ge=3, le=10000),
+    approx: bool = False,
 ):
-    filters = []
-    if store:
-        filters.append(Measurement.pv == store)
-    if date_from:
-        filters.append(Measurement.fecha >= date_from)
-    if date_to:
-        filters.append(Measurement.fecha <= date_to)
-
-    def to_float(x):
-        if x is None:
-            return 0.0
-        if isinstance(x, Decimal):
-            return float(x)
-        return float(x)
-
-    total = db.query(func.count(Measurement.id)).filter(*filters).scalar() or 0
-    if total == 0:
-        return {"total": 0, "osa_pct": 0.0, "oos_pct": 0.0, "series": [], "worst_sku": []}
-
-    osa_sum = db.query(func.sum(Measurement.osa_flag)).filter(*filters).scalar() or 0
-    oos_sum = db.query(func.sum(Measurement.oos_flag)).filter(*filters).scalar() or 0
-
-    osa_pct = round((to_float(osa_sum) * 100.0) / float(total), 2)
-    oos_pct = round((to_float(oos_sum) * 100.0) / float(total), 2)
-
-    series_rows = (
-        db.query(Measurement.fecha.label("d"), func.avg(Measurement.osa_flag).label("v"))
-        .filter(*filters)
-        .group_by(Measurement.fecha)
-        .order_by(Measurement.fecha)
-        .all()
-    )
-    series = [{"date": str(d), "osa_pct": round(to_float(v) * 100.0, 2)} for d, v in series_rows]
-
-    worst_rows = (
-        db.query(Measurement.codigo_barra.label("b"), func.avg(Measurement.osa_flag).label("v"))
-        .filter(*filters)
-        .group_by(Measurement.codigo_barra)
-        .order_by(func.avg(Measurement.osa_flag))
-        .limit(5)
-        .all()
+    # sin importaciones desde la última visita: 304 sin tocar caché ni BD
+    headers = validators()
+    if (cached := not_modified(request, headers)) is not None:
+        return cached
+    # una sola sentencia para totales, serie diaria y peores SKU (cacheada hasta que
+    # una importación toque esa tienda/rango). Un acierto de caché no toma hilo ni conexión.
+    approx = approx and approx_enabled()
+    key = query_cache.make_key("kpis", store, date_from, date_to, None, group_by, ma_window, max_points, approx)
+    opts = {"group_by": group_by, "ma_window": ma_window, "max_points": max_points}
+    if approx:
+        # muestra estratificada + sketches de SKU (approx.py): porcentajes con intervalo
+        # de confianza sin recorrer años de mediciones
+        data = await query_cache.get_or_compute_async(key, lambda: run_query(
+            lambda db: compute_approx_kpis(db, store, date_from, date_to, **opts)))
+    elif columnar.enabled():
+        # motor en memoria (ANALYTICS_ENGINE=memory): mismo resultado, sin tocar la BD
+        data = await query_cache.get_or_compute_async(key, lambda: run_in_threadpool(
+            columnar.get_store().kpis, store, date_from, date_to, **opts))
+    else:
+        data = await query_cache.get_or_compute_async(key, lambda: run_query(
+            lambda db: compute_kpis(db, store, date_from, date_to, **opts)))
+    return FastJSONResponse(data, headers=headers)
+
+@app.get("/api/kpis/stream")
+async def kpis_stream(
+    request: Request,
+    store: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    group_by: str = Query("day", pattern="^(day|week|month)$"),
+    ma_window: int | None = Query(None, ge=1, le=365),
+    max_points: int | None = Query(None, ge=3, le=10000),
+):
+    # SSE: event "snapshot" (misma forma que /api/kpis + version) y luego un "delta" por
+    # commit de importación que toque el filtro: puntos de la serie nuevos o cambiados
+    # (por date), labels quitados, totales y worst_sku solo si cambió
+    if not live.LIVE_ENABLED:
+        raise HTTPException(status_code=404, detail="Actualizaciones en vivo deshabilitadas")
+    return StreamingResponse(
+        live.stream(request, store, date_from, date_to, (group_by, ma_window, max_points)),
+        media_type="text/event-stream",
+        # sin buffer en proxies (nginx) ni caché del navegador
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    worst_sku = [{"barcode": b, "osa_pct": round(to_float(v) * 100.0, 2)} for b, v in worst_rows]
 
-    return {"total": total, "osa_pct": osa_pct, "oos_pct": oos_pct, "series": series, "worst_sku": worst_sku}
+def _split(values: list[str] | None) -> list[str]:
+    # admite ?dim=a&dim=b y ?dim=a,b
+    return [v.strip() for raw in values or [] for v in raw.split(",") if v.strip()]
 
-@app.get("/api/measurements")
-def measurements(
-    store: str | None = None,
+@app.get("/api/kpis/breakdown")
+def kpis_breakdown(
+    request: Request,
+    group_by: str = "",
     date_from: str | None = None,
     date_to: str | None = None,
-    limit: int = 200,
+    pv: list[str] | None = Query(None),
+    provincia: list[str] | None = Query(None),
+    cliente: list[str] | None = Query(None),
+    formato: list[str] | None = Query(None),
+    categoria: list[str] | None = Query(None),
+    marca: list[str] | None = Query(None),
+    proveedor: list[str] | None = Query(None),
+    causal: list[str] | None = Query(None),
+    codigo_barra: list[str] | None = Query(None),
+    order: str = Query("worst", pattern="^(worst|best)$"),
+    limit: int = Query(20, ge=1, le=1000),
+    min_support: int = Query(1, ge=1),
     db: Session = Depends(get_db),
 ):
-    q = db.query(Measurement)
-    if store:
-        q = q.filter(Measurement.pv == store)
-    if date_from:
-        q = q.filter(Measurement.fecha >= date_from)
-    if date_to:
-        q = q.filter(Measurement.fecha <= date_to)
-    q = q.order_by(Measurement.fecha.desc()).limit(limit)
-    rows = q.all()
-
-    def as_dict(m):
-        return {
-            "id": m.id,
-            "fecha": str(m.fecha),
-            "pv": m.pv,
-            "codigo_barra": m.codigo_barra,
-            "descripcion_sku": m.descripcion_sku,
-            "estado": m.estado,
-            "tipo_resultado": m.tipo_resultado,
-            "provincia": m.provincia,
-            "osa_flag": m.osa_flag,
-            "oos_flag": m.oos_flag,
-        }
-
-    return {"items": [as_dict(r) for r in rows]}
+    headers = validators()
+    if (cached := not_modified(request, headers)) is not None:
+        return cached
+    # group_by=provincia,categoria; filtros con varios valores; worst = menor OSA% primero
+    dims = _split([group_by])
+    filters = {
+        "pv": _split(pv), "provincia": _split(provincia), "cliente": _split(cliente),
+        "formato": _split(formato), "categoria": _split(categoria), "marca": _split(marca),
+        "proveedor": _split(proveedor), "causal": _split(causal), "codigo_barra": _split(codigo_barra),
+    }
+    stores = filters["pv"]
+    key = query_cache.make_key(
+        "breakdown", stores[0] if len(stores) == 1 else None, date_from, date_to, limit,
+        ",".join(dims), tuple((k, tuple(sorted(v))) for k, v in sorted(filters.items()) if v), order, min_support,
+    )
+    try:
+        data = query_cache.get_or_compute(key, lambda: compute_breakdown(
+            db, dims, filters, date_from, date_to, limit=limit, order=order, min_support=min_support))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(data, headers=headers)
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return query_cache.stats()
+
+@app.get("/api/db/pool")
+def db_pool():
+    # conexiones en uso / overflow / espera de checkout (p50, p99) por engine
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, **pool_stats()}
+
+@app.get("/api/engine/stats")
+def engine_stats():
+    # filas, bytes y bytes por millón de filas del motor en memoria
+    if not columnar.enabled():
+        return {"engine": columnar.ANALYTICS_ENGINE}
+    return columnar.get_store().stats()
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    # formato de texto Prometheus; pool y caché como gauges además de los contadores propios
+    pools = pool_stats()
+    extra = metrics.gauges("db_pool", pools, "Estado del pool de conexiones", label="engine")
+    extra += metrics.gauges("query_cache", query_cache.stats(), "Caché de respuestas")
+    extra += metrics.gauges("live", live.hub.stats(), "Vistas y clientes de /api/kpis/stream")
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/profiles/{profile_id}", include_in_schema=False)
+def get_profile(profile_id: str):
+    # pilas plegadas de una petición hecha con "X-Profile: 1" (PROFILING_ENABLED=true)
+    text = metrics.get_profile(profile_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return PlainTextResponse(text)
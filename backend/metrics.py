@@ -0,0 +1,328 @@
+# backend/metrics.py
+# Instrumentación de rendimiento expuesta en /metrics (formato de texto Prometheus):
+# latencia por ruta, consultas SQL por petición (eventos before/after_cursor_execute
+# de SQLAlchemy), log de consultas lentas y tiempos por etapa del importador
+# (parse, clean, insert, commit). Sin dependencias: contadores e histogramas propios.
+# Con IMPORT_POOL=process las etapas medidas en procesos hijos no llegan al padre.
+import bisect
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Tally, OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# perfil por muestreo de una petición con la cabecera "X-Profile: 1"
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = 20
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+log = logging.getLogger("uvicorn.error")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{n}="{esc(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels=()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        super().__init__(name, doc, labels)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, value: float = 1.0):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + value
+
+    def render(self):
+        with self._lock:
+            items = sorted(self.values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self.values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        self.series: dict[tuple, list] = {}  # labels -> [conteos por bucket (+Inf), suma]
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    def render(self):
+        out = self.header()
+        with self._lock:
+            items = sorted((k, (list(c), total)) for k, (c, total) in self.series.items())
+        names = self.labelnames + ("le",)
+        for k, (counts, total) in items:
+            acc = 0
+            for le, c in zip((*self.buckets, "+Inf"), counts):
+                acc += c
+                out.append(f"{self.name}_bucket{_labels(names, (*k, le if le == '+Inf' else _num(le)))} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {acc}")
+        return out
+
+
+REQUESTS = Counter("http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Latencia por ruta (hasta enviar las cabeceras)",
+                            ("method", "route"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "Consultas SQL por petición", ("route",), COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Tiempo en la BD por petición", ("route",), QUERY_BUCKETS)
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Duración de cada sentencia SQL", (), QUERY_BUCKETS)
+SLOW_QUERIES = Counter("db_slow_queries_total", "Sentencias más lentas que SLOW_QUERY_MS")
+STAGE_SECONDS = Counter("import_stage_seconds_total", "Tiempo acumulado por etapa de importación", ("stage",))
+STAGE_ROWS = Counter("import_stage_rows_total", "Filas procesadas por etapa de importación", ("stage",))
+STAGE_RATE = Gauge("import_stage_rows_per_second", "Filas/s de la última ejecución de cada etapa", ("stage",))
+
+REGISTRY = [REQUESTS, REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, QUERY_SECONDS,
+            SLOW_QUERIES, STAGE_SECONDS, STAGE_ROWS, STAGE_RATE]
+
+
+# ---------- consultas SQL por petición ----------
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# objeto mutable: el threadpool y run_sync copian el contexto, no el objeto
+_current: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    QUERY_SECONDS.observe(elapsed)
+    st = _current.get()
+    if st is not None:
+        st.queries += 1
+        st.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc()
+        sql = " ".join(statement.split())
+        log.warning("consulta lenta %.1f ms%s: %s", elapsed * 1000,
+                    " (executemany)" if executemany else "", sql[:500])
+
+
+def instrument_engines():
+    """Escucha todas las Engine (sync y la sync_engine del engine async)."""
+    if METRICS_ENABLED and not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------- etapas del importador ----------
+def _record_stage(stage: str, elapsed: float, rows: int):
+    STAGE_SECONDS.inc(stage, value=elapsed)
+    STAGE_ROWS.inc(stage, value=rows)
+    if elapsed > 0 and rows:
+        STAGE_RATE.set(stage, value=round(rows / elapsed, 1))
+
+
+class _Stage:
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: int):
+        self.rows = rows
+
+
+@contextmanager
+def import_stage(stage: str, rows: int = 0):
+    """with import_stage("insert", n): ... acumula tiempo y filas de la etapa.
+    Si las filas se conocen al final: with import_stage("parse") as st: ...; st.rows = n"""
+    st = _Stage(rows)
+    t0 = time.perf_counter()
+    try:
+        yield st
+    finally:
+        _record_stage(stage, time.perf_counter() - t0, st.rows)
+
+
+def timed_frames(frames):
+    """Envuelve el generador de bloques del archivo para medir la etapa parse."""
+    it = iter(frames)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            frame = next(it)
+        except StopIteration:
+            return
+        _record_stage("parse", time.perf_counter() - t0, frame.height)
+        yield frame
+
+
+# ---------- perfil por muestreo ----------
+_BACKEND_DIR = str(Path(__file__).resolve().parent)
+_profiles: OrderedDict[str, str] = OrderedDict()
+
+
+class Sampler:
+    """Muestrea las pilas de todos los hilos cada PROFILE_INTERVAL_MS y guarda las que
+    pasan por código de backend/ (hilo del handler, del threadpool o del event loop).
+    Con peticiones concurrentes el perfil incluye también su trabajo."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.stacks = _Tally()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack, ours = [], False
+                while frame is not None:
+                    code = frame.f_code
+                    ours = ours or (code.co_filename.startswith(_BACKEND_DIR) and not code.co_filename.endswith("metrics.py"))
+                    stack.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if ours:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        # formato "pila;plegada conteo": flamegraph.pl, speedscope, etc.
+        return "\n".join(f"{s} {n}" for s, n in self.stacks.most_common()) + "\n"
+
+
+def save_profile(text: str) -> str:
+    pid = uuid.uuid4().hex[:12]
+    _profiles[pid] = text
+    while len(_profiles) > PROFILE_KEEP:
+        _profiles.popitem(last=False)
+    return pid
+
+
+def get_profile(pid: str) -> str | None:
+    return _profiles.get(pid)
+
+
+# ---------- middleware ----------
+def _route_of(request) -> str:
+    # plantilla de la ruta (/api/import/jobs/{job_id}) para no crear una serie por id
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "sin_ruta"
+
+
+async def middleware(request, call_next):
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    st = RequestStats()
+    token = _current.set(st)
+    sampler = None
+    if PROFILING_ENABLED and request.headers.get("x-profile") == "1":
+        sampler = Sampler().__enter__()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - t0
+        _current.reset(token)
+        if sampler is not None:
+            sampler.__exit__(None, None, None)
+        route = _route_of(request)
+        REQUESTS.inc(request.method, route, str(status))
+        REQUEST_SECONDS.observe(elapsed, request.method, route)
+        REQUEST_QUERIES.observe(st.queries, route)
+        REQUEST_DB_SECONDS.observe(st.db_seconds, route)
+    response.headers["Server-Timing"] = (
+        f'app;dur={elapsed * 1000:.1f}, db;dur={st.db_seconds * 1000:.1f};desc="{st.queries} consultas"'
+    )
+    if sampler is not None:
+        response.headers["X-Profile-Id"] = save_profile(sampler.collapsed())
+    return response
+
+
+def render(extra: list[str] | None = None) -> str:
+    lines = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    lines.extend(extra or [])
+    return "\n".join(lines) + "\n"
+
+
+def gauges(prefix: str, stats: dict, doc: str, label: str | None = None) -> list[str]:
+    """Convierte stats (pool, caché) en gauges; con label, stats es {valor: dict}.
+    Ignora valores no numéricos."""
+    series = stats if label else {None: stats}
+    values: dict[str, list] = {}
+    for lv, d in series.items():
+        for k, v in d.items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                values.setdefault(k, []).append((lv, v))
+    out = []
+    for k, items in values.items():
+        name = f"{prefix}_{k}"
+        out += [f"# HELP {name} {doc}", f"# TYPE {name} gauge"]
+        out += [f"{name}{_labels((label,), (lv,)) if label else ''} {_num(v)}" for lv, v in items]
+    return out
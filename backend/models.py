@@ -1,17 +1,44 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Integer, Date, DateTime, Float
+from sqlalchemy import String, Integer, SmallInteger, Date, DateTime, Float, Boolean, Index, ForeignKey, UniqueConstraint, LargeBinary
+from sqlalchemy.ext.compiler import compiles
+from datetime import date
 from .db import Base
 
+
+class TinyInt(SmallInteger):
+    """Entero de 1 byte en MySQL (TINYINT UNSIGNED); SMALLINT en el resto."""
+
+
+@compiles(TinyInt, "mysql")
+def _tinyint_mysql(type_, compiler, **kw):
+    return "TINYINT UNSIGNED"
+
 class Store(Base):
     __tablename__ = "stores"
+    # duplicados y prefijos del selector de tiendas (store_search.py)
+    __table_args__ = (Index("uq_stores_name_norm", "name_norm", unique=True),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(120), unique=True)   # nombre de la tienda (PV)
+    name_norm: Mapped[str | None] = mapped_column(String(120), nullable=True)  # normalize_name(name)
     provincia: Mapped[str | None] = mapped_column(String(80), nullable=True)
     formato: Mapped[str | None] = mapped_column(String(60), nullable=True)
     cliente: Mapped[str | None] = mapped_column(String(120), nullable=True)
 
+class User(Base):
+    __tablename__ = "users"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    username: Mapped[str] = mapped_column(String(80), unique=True)
+    email: Mapped[str] = mapped_column(String(160), index=True)
+    password: Mapped[str] = mapped_column(String(255))
+    role: Mapped[str] = mapped_column(String(40), index=True)
+    active: Mapped[bool] = mapped_column(Boolean, default=True)
+
+# clave natural de una medición: re-importar el mismo archivo no duplica filas
+MEASUREMENT_NATURAL_KEY = ("id_conjunto", "pv", "codigo_barra", "fecha_hora_medicion")
+
 class Measurement(Base):
     __tablename__ = "measurements"
+    __table_args__ = (Index("uq_measurements_natural", *MEASUREMENT_NATURAL_KEY, unique=True),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     id_conjunto: Mapped[str] = mapped_column(String(50))
     fecha: Mapped["Date"] = mapped_column(Date)
@@ -36,4 +63,178 @@ class Measurement(Base):
     osa_flag: Mapped[int] = mapped_column(Integer)  # 1 OSA / 0 no
     oos_flag: Mapped[int] = mapped_column(Integer)  # 1 OOS / 0 no
 
+class DimSku(Base):
+    """Dimensión SKU del almacenamiento normalizado (storage.py)."""
+    __tablename__ = "dim_sku"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    codigo_barra: Mapped[str] = mapped_column(String(32), unique=True)
+
+class DimValue(Base):
+    """Valores de texto repetidos (marca, proveedor, categoría, descripción...): uno por (kind, value)."""
+    __tablename__ = "dim_value"
+    __table_args__ = (UniqueConstraint("kind", "value", name="uq_dim_value"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(20))    # nombre de la columna en measurements
+    value: Mapped[str] = mapped_column(String(300))
+
+def _dim_value_fk():
+    return mapped_column(Integer, ForeignKey("dim_value.id"))
+
+# clave natural en el hecho: los textos de la clave pasan a ids de dimensión
+FACT_NATURAL_KEY = ("id_conjunto", "store_id", "sku_id", "fecha_hora_medicion")
+
+class MeasurementFact(Base):
+    """Medición en formato angosto (MEASUREMENT_STORAGE=normalized): ids enteros a
+    dimensiones, fecha y flags en un byte (bit 0 OSA, bit 1 OOS). dia_semana y
+    nro_semana no se guardan: se derivan de la fecha."""
+    __tablename__ = "measurement_fact"
+    __table_args__ = (
+        Index("uq_fact_natural", *FACT_NATURAL_KEY, unique=True),
+        # KPIs crudos por tienda + rango, cubriente (como ix_measurements_pv_fecha_cover)
+        Index("ix_fact_store_fecha_cover", "store_id", "fecha", "flags", "sku_id"),
+        # sin filtro de tienda: rango de fecha y keyset (fecha desc, id desc)
+        Index("ix_fact_fecha", "fecha"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    id_conjunto: Mapped[str] = mapped_column(String(50))
+    fecha: Mapped["Date"] = mapped_column(Date)
+    fecha_hora_medicion: Mapped["DateTime"] = mapped_column(DateTime)
+    store_id: Mapped[int] = mapped_column(Integer, ForeignKey("stores.id"))
+    sku_id: Mapped[int] = mapped_column(Integer, ForeignKey("dim_sku.id"))
+    flags: Mapped[int] = mapped_column(TinyInt)
+    formato_id: Mapped[int] = _dim_value_fk()
+    descripcion_sku_id: Mapped[int] = _dim_value_fk()
+    causal_id: Mapped[int] = _dim_value_fk()
+    estado_id: Mapped[int] = _dim_value_fk()
+    tipo_resultado_id: Mapped[int] = _dim_value_fk()
+    categoria_id: Mapped[int] = _dim_value_fk()
+    marca_id: Mapped[int] = _dim_value_fk()
+    formato_marketing_id: Mapped[int] = _dim_value_fk()
+    responsable_id: Mapped[int] = _dim_value_fk()
+    sector_operativo_id: Mapped[int] = _dim_value_fk()
+    provincia_id: Mapped[int] = _dim_value_fk()
+    cliente_id: Mapped[int] = _dim_value_fk()
+    proveedor_id: Mapped[int] = _dim_value_fk()
+
+# fecha del rollup para las mediciones sin fecha (fecha es parte de la PK): cuentan en
+# los totales como en count(id), pero no en la serie ni en filtros por rango
+NULL_FECHA = date(1000, 1, 1)
+
+
+class MeasurementDailyRollup(Base):
+    """Agregado diario por (fecha, pv, codigo_barra); lo mantienen los importadores."""
+    __tablename__ = "measurement_daily_rollup"
+    fecha: Mapped["Date"] = mapped_column(Date, primary_key=True)
+    pv: Mapped[str] = mapped_column(String(120), primary_key=True)
+    codigo_barra: Mapped[str] = mapped_column(String(32), primary_key=True)
+    n: Mapped[int] = mapped_column(Integer, default=0)         # nro de mediciones
+    osa_sum: Mapped[int] = mapped_column(Integer, default=0)
+    oos_sum: Mapped[int] = mapped_column(Integer, default=0)
+
+# dimensiones que se pueden cortar en /api/kpis/breakdown a partir de los cubos
+CUBE_DIMENSIONS = ("pv", "provincia", "cliente", "formato", "categoria", "marca", "proveedor", "causal")
+
+class MeasurementCube(Base):
+    """Cubos pre-agregados: cada `cube` usa un subconjunto de CUBE_DIMENSIONS (las
+    dimensiones fuera del cubo se guardan como ''), en grano diario ('d') y mensual
+    ('m', fecha = día 1). dims_key es un hash de los valores (la PK con todas las
+    columnas de texto excede el límite de MySQL)."""
+    __tablename__ = "measurement_cube"
+    cube: Mapped[str] = mapped_column(String(20), primary_key=True)
+    grain: Mapped[str] = mapped_column(String(1), primary_key=True)   # d | m
+    fecha: Mapped["Date"] = mapped_column(Date, primary_key=True)
+    dims_key: Mapped[str] = mapped_column(String(40), primary_key=True)  # sha1 hex
+    pv: Mapped[str] = mapped_column(String(120), default="")
+    provincia: Mapped[str] = mapped_column(String(80), default="")
+    cliente: Mapped[str] = mapped_column(String(120), default="")
+    formato: Mapped[str] = mapped_column(String(60), default="")
+    categoria: Mapped[str] = mapped_column(String(100), default="")
+    marca: Mapped[str] = mapped_column(String(120), default="")
+    proveedor: Mapped[str] = mapped_column(String(160), default="")
+    causal: Mapped[str] = mapped_column(String(200), default="")
+    n: Mapped[int] = mapped_column(Integer, default=0)
+    osa_sum: Mapped[int] = mapped_column(Integer, default=0)
+    oos_sum: Mapped[int] = mapped_column(Integer, default=0)
+
+class ImportJob(Base):
+    """Importación en segundo plano; el estado persiste en BD (sobrevive reinicios)."""
+    __tablename__ = "import_jobs"
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)   # uuid4 hex
+    filename: Mapped[str] = mapped_column(String(255))
+    path: Mapped[str] = mapped_column(String(500))                  # archivo en disco (spool)
+    status: Mapped[str] = mapped_column(String(20), default="queued")  # queued|running|done|failed
+    chunk_size: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    sha256: Mapped[str | None] = mapped_column(String(64), nullable=True)  # hash del archivo
+    rows_processed: Mapped[int] = mapped_column(Integer, default=0)
+    rows_inserted: Mapped[int] = mapped_column(Integer, default=0)
+    rows_updated: Mapped[int] = mapped_column(Integer, default=0)
+    rows_unchanged: Mapped[int] = mapped_column(Integer, default=0)
+    rows_skipped: Mapped[int] = mapped_column(Integer, default=0)
+    throughput: Mapped[float] = mapped_column(Float, default=0.0)  # filas/s
+    error: Mapped[str | None] = mapped_column(String(1000), nullable=True)
+    created_at: Mapped["DateTime"] = mapped_column(DateTime)
+    started_at: Mapped["DateTime | None"] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped["DateTime | None"] = mapped_column(DateTime, nullable=True)
+    owner: Mapped[str | None] = mapped_column(String(120), nullable=True)  # host:pid que lo ejecuta
+    heartbeat_at: Mapped["DateTime | None"] = mapped_column(DateTime, nullable=True)
+
+class ImportedFile(Base):
+    """Hash de contenido de cada archivo importado: un archivo idéntico se omite sin parsearlo."""
+    __tablename__ = "imported_files"
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    filename: Mapped[str] = mapped_column(String(255))
+    job_id: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    rows: Mapped[int] = mapped_column(Integer, default=0)
+    imported_at: Mapped["DateTime"] = mapped_column(DateTime)
+
+class SchemaMeta(Base):
+    """Huella del esquema aplicado: al arrancar solo se corre DDL si cambió (schema.py)."""
+    __tablename__ = "schema_meta"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[str] = mapped_column(String(128))
+    updated_at: Mapped["DateTime"] = mapped_column(DateTime)
+
+class ArchivedPeriod(Base):
+    """Mes de mediciones archivado a Parquet y borrado de la BD (partitions.py)."""
+    __tablename__ = "archived_periods"
+    period: Mapped[str] = mapped_column(String(7), primary_key=True)  # YYYY-MM
+    path: Mapped[str] = mapped_column(String(255))    # archivo dentro de ARCHIVE_DIR
+    rows: Mapped[int] = mapped_column(Integer, default=0)
+    bytes: Mapped[int] = mapped_column(Integer, default=0)
+    osa_sum: Mapped[int] = mapped_column(Integer, default=0)
+    oos_sum: Mapped[int] = mapped_column(Integer, default=0)
+    archived_at: Mapped["DateTime"] = mapped_column(DateTime)
+
+class SampleStratum(Base):
+    """Estrato (pv, mes) del modo aproximado (approx.py): mediciones que tiene (n) y
+    cuántas guarda su reservorio en measurement_samples (k)."""
+    __tablename__ = "sample_strata"
+    pv: Mapped[str] = mapped_column(String(120), primary_key=True)
+    period: Mapped[str] = mapped_column(String(7), primary_key=True)  # YYYY-MM
+    n: Mapped[int] = mapped_column(Integer, default=0)
+    k: Mapped[int] = mapped_column(Integer, default=0)
+
+class MeasurementSample(Base):
+    """Reservorio uniforme de mediciones de cada (pv, mes); slot = posición 0..k-1.
+    row_key (sha1 de la clave natural) ubica la copia cuando una importación actualiza la fila."""
+    __tablename__ = "measurement_samples"
+    __table_args__ = (
+        Index("ix_samples_row_key", "row_key"),
+        Index("ix_samples_fecha", "fecha", "pv", "period", "codigo_barra", "osa_flag", "oos_flag"),
+    )
+    pv: Mapped[str] = mapped_column(String(120), primary_key=True)
+    period: Mapped[str] = mapped_column(String(7), primary_key=True)
+    slot: Mapped[int] = mapped_column(Integer, primary_key=True)
+    row_key: Mapped[str | None] = mapped_column(String(40), nullable=True)
+    fecha: Mapped["Date"] = mapped_column(Date)
+    codigo_barra: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    osa_flag: Mapped[int] = mapped_column(TinyInt, default=0)
+    oos_flag: Mapped[int] = mapped_column(TinyInt, default=0)
 
+class SkuSketch(Base):
+    """Count-min sketch mensual de (n, osa) por codigo_barra: int32 [2, depth, width]."""
+    __tablename__ = "sku_sketches"
+    period: Mapped[str] = mapped_column(String(7), primary_key=True)
+    depth: Mapped[int] = mapped_column(Integer)
+    width: Mapped[int] = mapped_column(Integer)
+    data: Mapped[bytes] = mapped_column(LargeBinary(length=2 ** 24))  # MEDIUMBLOB en MySQL
@@ -0,0 +1,136 @@
+# backend/normalize.py
+# Etapa única de normalización (Polars, lazy y vectorizada) para ambos importadores:
+# renombrado, trim/mayúsculas, limpieza de código de barras, fechas, filtro de rango,
+# descarte de nulos, flags OSA/OOS y día de semana / semana ISO.
+from __future__ import annotations
+import unicodedata
+from datetime import date
+from .models import Measurement
+from .lazy import lazy_import
+
+pl = lazy_import("polars")
+
+# Column mapping from Excel (Spanish) to DB fields
+COLS_MAP = {
+    "IdConjuntoProducto": "id_conjunto",
+    "Fecha": "fecha",
+    "Dia de la semana": "dia_semana",
+    "Nro de Semana": "nro_semana",
+    "PV": "pv",
+    "Formato": "formato",
+    "Codigo de Barra": "codigo_barra",
+    "Descripcion SKU": "descripcion_sku",
+    "Causal": "causal",
+    "ESTADO": "estado",
+    "Tipo de Resultado": "tipo_resultado",
+    "Categoría": "categoria",
+    "Marca": "marca",
+    "Formato Marketing": "formato_marketing",
+    "Responsable": "responsable",
+    "Sector Operativo Cadena": "sector_operativo",
+    "Provincia": "provincia",
+    "Nombre Cliente": "cliente",
+    "Proveedor": "proveedor",
+    "FechaHoraMedicion": "fecha_hora_medicion",
+}
+
+REQUIRED = ["id_conjunto", "fecha", "pv", "codigo_barra", "descripcion_sku", "estado", "tipo_resultado"]
+
+MEASUREMENT_COLUMNS = [c for c in Measurement.__table__.columns.keys() if c != "id"]
+TEXT_COLUMNS = [
+    "id_conjunto", "pv", "formato", "codigo_barra", "descripcion_sku", "causal", "estado",
+    "tipo_resultado", "categoria", "marca", "formato_marketing", "responsable",
+    "sector_operativo", "provincia", "cliente", "proveedor",
+]
+
+# rango de fechas razonable para las mediciones
+DATE_RANGE = (date(2023, 1, 1), date(2026, 12, 31))
+
+# opciones del upload (router/jobs): fechas mm/dd ambiguas como pandas, flags solo
+# por "Tipo de Resultado", rango de fechas y descarte de nulos clave
+UPLOAD_OPTS = {"dayfirst": False, "estado_fallback": False}
+
+_ISO_FORMATS = ["%Y-%m-%d %H:%M:%S%.f", "%Y-%m-%dT%H:%M:%S%.f", "%Y-%m-%d"]
+_DAYFIRST_FORMATS = ["%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y"]
+_MONTHFIRST_FORMATS = ["%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y", "%m-%d-%Y"]
+
+
+def normalize_name(name: str | None) -> str:
+    """Clave de búsqueda/duplicados de una tienda: minúsculas, sin tildes, espacios colapsados."""
+    folded = unicodedata.normalize("NFKD", name or "")
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return " ".join(folded.casefold().split())
+
+
+def _parse_datetime(col: str, dayfirst: bool) -> pl.Expr:
+    fmts = _ISO_FORMATS + (_DAYFIRST_FORMATS if dayfirst else _MONTHFIRST_FORMATS)
+    c = pl.col(col).str.strip_chars()
+    return pl.coalesce([c.str.to_datetime(f, strict=False, time_unit="us") for f in fmts])
+
+
+def _empty_to_null(e: pl.Expr) -> pl.Expr:
+    return pl.when(e == "").then(None).otherwise(e)
+
+
+def normalize(frame: pl.DataFrame | pl.LazyFrame, *, dayfirst: bool = False, estado_fallback: bool = False,
+              date_range: tuple | None = DATE_RANGE, drop_nulls: bool = True) -> pl.DataFrame:
+    """Devuelve un DataFrame con exactamente las columnas de Measurement listo para insertar.
+
+    dayfirst: fechas ambiguas dd/mm (CLI) o mm/dd (router).
+    estado_fallback: los flags también miran ESTADO (ENCONTRADO/FALTANTE), no solo el tipo.
+    date_range / drop_nulls: filtro de fechas y descarte de filas con campos clave vacíos.
+    """
+    lf = frame.lazy() if isinstance(frame, pl.DataFrame) else frame
+    present = lf.collect_schema().names()
+    rename = {k: v for k, v in COLS_MAP.items() if k in present}
+    cols = set(present) - set(rename) | set(rename.values())
+    missing = [c for c in REQUIRED if c not in cols]
+    if missing:
+        inv = {v: k for k, v in COLS_MAP.items()}
+        raise ValueError(f"Columnas faltantes: {', '.join(inv.get(c, c) for c in missing)}")
+
+    lf = lf.rename(rename).with_columns(pl.col(c).cast(pl.Utf8) for c in cols)
+
+    # texto: trim; estado/tipo en mayúscula; código de barras sin ".0" (notación de Excel)
+    text = []
+    for c in TEXT_COLUMNS:
+        e = pl.col(c).str.strip_chars() if c in cols else pl.lit(None, dtype=pl.Utf8)
+        if c in ("estado", "tipo_resultado"):
+            e = e.str.to_uppercase()
+        if c == "codigo_barra":
+            e = e.str.replace(r"\.0$", "").str.strip_chars()
+        text.append(_empty_to_null(e).alias(c))
+
+    fhm = _parse_datetime("fecha_hora_medicion", dayfirst) if "fecha_hora_medicion" in cols else pl.lit(None, dtype=pl.Datetime("us"))
+    lf = lf.with_columns(
+        *text,
+        _parse_datetime("fecha", dayfirst).dt.date().alias("fecha"),
+        fhm.alias("fecha_hora_medicion"),
+    )
+
+    if date_range:
+        lf = lf.filter(pl.col("fecha").is_between(date_range[0], date_range[1]))
+    if drop_nulls:
+        lf = lf.drop_nulls(subset=REQUIRED)
+
+    tipo, estado = pl.col("tipo_resultado"), pl.col("estado")
+    osa = tipo == "OSA"
+    oos = tipo == "OOS"
+    if estado_fallback:
+        osa = osa | (estado == "ENCONTRADO")
+        oos = oos | (estado == "FALTANTE")
+
+    derived_day = pl.col("fecha").dt.strftime("%A")
+    derived_week = pl.col("fecha").dt.strftime("%V")
+    lf = lf.with_columns(
+        osa.fill_null(False).cast(pl.Int8).alias("osa_flag"),
+        oos.fill_null(False).cast(pl.Int8).alias("oos_flag"),
+        (pl.coalesce(_empty_to_null(pl.col("dia_semana").str.strip_chars()), derived_day)
+         if "dia_semana" in cols else derived_day).alias("dia_semana"),
+        (pl.coalesce(_empty_to_null(pl.col("nro_semana").str.strip_chars()), derived_week)
+         if "nro_semana" in cols else derived_week).alias("nro_semana"),
+        # sin hora de medición → medianoche de la fecha
+        pl.coalesce(pl.col("fecha_hora_medicion"), pl.col("fecha").cast(pl.Datetime("us"))).alias("fecha_hora_medicion"),
+        *(pl.col(c).fill_null("") for c in TEXT_COLUMNS),
+    )
+    return lf.select(MEASUREMENT_COLUMNS).collect()
@@ -0,0 +1,405 @@
+# backend/partitions.py
+# Particionado mensual, retención y archivo de mediciones frías a Parquet.
+# - MySQL: la tabla de mediciones (measurements o measurement_fact según
+#   MEASUREMENT_STORAGE) se particiona con RANGE (TO_DAYS(fecha)), una partición pYYYYMM
+#   por mes y pmax para lo que venga. `maintain` la convierte la primera vez y agrega
+#   los meses siguientes (PARTITION_MONTHS_AHEAD); archivar un mes es DROP PARTITION.
+# - SQLite no tiene particiones: un período es un rango sobre el índice de fecha y
+#   archivar es un DELETE por ese rango.
+# Retención (RETENTION_MONTHS): cada mes anterior a la ventana se escribe en
+# ARCHIVE_DIR/measurements_YYYY-MM.parquet (todas las columnas de measurements, ordenado
+# por pv y fecha para que las estadísticas de cada row group filtren por tienda), se
+# relee para verificarlo, se registra en archived_periods y se borra de la BD junto con
+# su rollup diario. Los cubos se conservan (breakdown sigue cubriendo esos meses).
+# /api/kpis suma los meses archivados con un scan de Polars cuando el rango los alcanza;
+# las importaciones descartan filas de meses ya archivados.
+# Uso: python -m backend.partitions status | maintain | archive [--months N] [--dry-run]
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from sqlalchemy import select, func, text, insert, delete
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from .db import engine
+from .models import (ArchivedPeriod, Measurement, MeasurementDailyRollup, MEASUREMENT_NATURAL_KEY,
+                     FACT_NATURAL_KEY)
+from .normalize import MEASUREMENT_COLUMNS
+from . import storage
+from .lazy import lazy_import
+
+pl = lazy_import("polars")
+
+log = logging.getLogger("uvicorn.error")
+
+# meses completos que quedan en la BD además del actual (0 = sin retención)
+RETENTION_MONTHS = int(os.getenv("RETENTION_MONTHS", "0"))
+# MySQL: particiones creadas por adelantado
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", Path(__file__).resolve().parent.parent / "data" / "archive"))
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+# cada cuánto (s) se relee archived_periods (otros procesos pueden haber archivado)
+ARCHIVE_CHECK_SECONDS = float(os.getenv("ARCHIVE_CHECK_SECONDS", "30"))
+ARCHIVE_BATCH = 100_000
+ARCHIVE_ROW_GROUP = 100_000
+ARCHIVE_COLUMNS = ["id", *MEASUREMENT_COLUMNS]
+
+
+# ---------- períodos ----------
+def period_of(d: date) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def add_months(d: date, n: int) -> date:
+    y, m = divmod(d.year * 12 + d.month - 1 + n, 12)
+    return date(y, m + 1, 1)
+
+
+def bounds(period: str) -> tuple[date, date]:
+    """[primer día del mes, primer día del mes siguiente)."""
+    start = date(int(period[:4]), int(period[5:7]), 1)
+    return start, add_months(start, 1)
+
+
+def cutoff(months: int, today: date | None = None) -> date:
+    """Primer día que se conserva: los meses anteriores son fríos."""
+    today = today or date.today()
+    return add_months(today.replace(day=1), -months)
+
+
+def measurement_table():
+    """Tabla física de las mediciones en el modo de almacenamiento actual."""
+    return storage.F if storage.normalized() else Measurement.__table__
+
+
+def _natural_key():
+    if storage.normalized():
+        return "uq_fact_natural", FACT_NATURAL_KEY
+    return "uq_measurements_natural", MEASUREMENT_NATURAL_KEY
+
+
+def _in_period(column, period: str):
+    start, end = bounds(period)
+    return (column >= start) & (column < end)
+
+
+# ---------- MySQL: particiones ----------
+def _partition_name(start: date) -> str:
+    return f"p{start.year:04d}{start.month:02d}"
+
+
+def _partition_sql(start: date) -> str:
+    return f"PARTITION {_partition_name(start)} VALUES LESS THAN (TO_DAYS('{add_months(start, 1).isoformat()}'))"
+
+
+def mysql_partitions(conn, table: str) -> list[tuple[str, int]]:
+    """[(nombre, filas estimadas)] en orden; vacío si la tabla no está particionada."""
+    return [tuple(r) for r in conn.execute(text(
+        "SELECT partition_name, table_rows FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = :t AND partition_name IS NOT NULL "
+        "ORDER BY partition_ordinal_position"), {"t": table})]
+
+
+def _partition(conn, table, months: list[date]):
+    """Conversión inicial. MySQL exige la columna de partición en toda clave única (PK
+    incluida) y no admite claves foráneas en tablas particionadas."""
+    name = table.name
+    fks = conn.execute(text(
+        "SELECT constraint_name FROM information_schema.table_constraints "
+        "WHERE table_schema = DATABASE() AND table_name = :t AND constraint_type = 'FOREIGN KEY'"),
+        {"t": name}).scalars().all()
+    for fk in fks:
+        conn.execute(text(f"ALTER TABLE {name} DROP FOREIGN KEY {fk}"))
+    conn.execute(text(f"ALTER TABLE {name} DROP PRIMARY KEY, ADD PRIMARY KEY (id, fecha)"))
+    index, cols = _natural_key()
+    conn.execute(text(f"ALTER TABLE {name} DROP INDEX {index}, "
+                      f"ADD UNIQUE INDEX {index} ({', '.join([*cols, 'fecha'])})"))
+    parts = ", ".join(_partition_sql(m) for m in months)
+    conn.execute(text(f"ALTER TABLE {name} PARTITION BY RANGE (TO_DAYS(fecha)) "
+                      f"({parts}, PARTITION pmax VALUES LESS THAN MAXVALUE)"))
+
+
+def maintain(bind=engine, today: date | None = None) -> dict:
+    """MySQL: particiona la tabla si hace falta y crea los meses hasta hoy +
+    PARTITION_MONTHS_AHEAD partiendo pmax. En SQLite no hay nada que hacer."""
+    if bind.dialect.name != "mysql":
+        return {"partitioned": False, "added": []}
+    table = measurement_table()
+    today = today or date.today()
+    last = add_months(today.replace(day=1), PARTITION_MONTHS_AHEAD)
+    with bind.connect() as conn:
+        existing = [n for n, _ in mysql_partitions(conn, table.name)]
+        if not existing:
+            first = conn.execute(select(func.min(table.c.fecha))).scalar() or today
+            months, m = [], first.replace(day=1)
+            while m <= last:
+                months.append(m)
+                m = add_months(m, 1)
+            _partition(conn, table, months)
+            log.info("%s particionada por mes: %d particiones", table.name, len(months))
+            return {"partitioned": True, "added": [_partition_name(m) for m in months]}
+        monthly = sorted(n for n in existing if n != "pmax")
+        m = add_months(date(int(monthly[-1][1:5]), int(monthly[-1][5:7]), 1), 1) if monthly else today.replace(day=1)
+        months = []
+        while m <= last:
+            months.append(m)
+            m = add_months(m, 1)
+        if months:
+            parts = ", ".join(_partition_sql(m) for m in months)
+            conn.execute(text(f"ALTER TABLE {table.name} REORGANIZE PARTITION pmax INTO "
+                              f"({parts}, PARTITION pmax VALUES LESS THAN MAXVALUE)"))
+        return {"partitioned": True, "added": [_partition_name(m) for m in months]}
+
+
+# ---------- archivo ----------
+def _schema() -> dict:
+    types = {"id": pl.Int64, "fecha": pl.Date, "fecha_hora_medicion": pl.Datetime("us"),
+             "osa_flag": pl.Int8, "oos_flag": pl.Int8}
+    return {c: types.get(c, pl.Utf8) for c in ARCHIVE_COLUMNS}
+
+
+def _read_period(conn, period: str) -> pl.DataFrame:
+    """Filas del mes con las columnas de measurements (en ambos modos de almacenamiento)."""
+    stored = storage.stored_columns(ARCHIVE_COLUMNS)
+    m = storage.measurements(stored).c
+    build = storage.row_builder(ARCHIVE_COLUMNS)
+    q = select(*(m[c] for c in stored)).where(_in_period(m.fecha, period)).execution_options(yield_per=ARCHIVE_BATCH)
+    schema = _schema()
+    parts = [
+        pl.DataFrame([build(r) if build else tuple(r) for r in part], schema=schema, orient="row")
+        for part in conn.execute(q).partitions()
+    ]
+    return pl.concat(parts) if parts else pl.DataFrame(schema=schema)
+
+
+def _purge(bind, period: str) -> str:
+    """Borra de la BD las filas crudas del mes: DROP PARTITION si la partición del mes
+    contiene exactamente esas filas, DELETE por rango si no."""
+    table = measurement_table()
+    start, _ = bounds(period)
+    if bind.dialect.name == "mysql":
+        name = _partition_name(start)
+        with bind.connect() as conn:
+            if name in {n for n, _ in mysql_partitions(conn, table.name)}:
+                in_partition = conn.execute(text(f"SELECT COUNT(*) FROM {table.name} PARTITION ({name})")).scalar()
+                in_period = conn.execute(
+                    select(func.count()).select_from(table).where(_in_period(table.c.fecha, period))).scalar()
+                # la primera partición también guarda lo anterior a su mes
+                if in_partition == in_period:
+                    conn.execute(text(f"ALTER TABLE {table.name} DROP PARTITION {name}"))
+                    return "drop partition"
+    with bind.begin() as conn:
+        conn.execute(delete(table).where(_in_period(table.c.fecha, period)))
+    return "delete"
+
+
+def archive_period(period: str, bind=engine) -> dict:
+    """Escribe el mes a Parquet, lo verifica releyéndolo y lo borra de la BD."""
+    with bind.connect() as conn:
+        df = _read_period(conn, period)
+    if df.height == 0:
+        return {"period": period, "rows": 0}
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"measurements_{period}.parquet"
+    path = ARCHIVE_DIR / name
+    tmp = path.with_name(name + ".tmp")
+    df.sort(["pv", "fecha", "id"], nulls_last=True).write_parquet(
+        tmp, compression=ARCHIVE_COMPRESSION, statistics=True, row_group_size=ARCHIVE_ROW_GROUP)
+    os.replace(tmp, path)
+
+    expected = (df.height, int(df["osa_flag"].sum() or 0), int(df["oos_flag"].sum() or 0))
+    got = pl.scan_parquet(path).select(
+        pl.len(), pl.col("osa_flag").cast(pl.Int64).sum(), pl.col("oos_flag").cast(pl.Int64).sum(),
+    ).collect().row(0)
+    if tuple(int(x or 0) for x in got) != expected:
+        path.unlink(missing_ok=True)
+        raise RuntimeError(f"{name}: el archivo no coincide con la BD ({got} != {expected})")
+
+    # registro + rollup (+ filas crudas fuera de MySQL) en una transacción: nunca queda
+    # un mes a la vez en Parquet y en la BD sin estar registrado
+    in_mysql = bind.dialect.name == "mysql"
+    with bind.begin() as conn:
+        conn.execute(delete(ArchivedPeriod.__table__).where(ArchivedPeriod.period == period))
+        conn.execute(insert(ArchivedPeriod.__table__).values(
+            period=period, path=name, rows=expected[0], bytes=path.stat().st_size,
+            osa_sum=expected[1], oos_sum=expected[2], archived_at=datetime.utcnow(),
+        ))
+        conn.execute(delete(MeasurementDailyRollup.__table__).where(_in_period(MeasurementDailyRollup.fecha, period)))
+        if not in_mysql:
+            table = measurement_table()
+            conn.execute(delete(table).where(_in_period(table.c.fecha, period)))
+    # DROP PARTITION es DDL (commit implícito): va después; si falla, archive lo reintenta
+    how = _purge(bind, period) if in_mysql else "delete"
+    return {"period": period, "rows": expected[0], "bytes": path.stat().st_size, "purge": how}
+
+
+def archive(months: int | None = None, bind=engine, today: date | None = None, dry_run: bool = False) -> list[dict]:
+    """Archiva los meses anteriores a la ventana de retención que sigan en la BD."""
+    months = RETENTION_MONTHS if months is None else months
+    if months <= 0:
+        return []
+    table = measurement_table()
+    limit = cutoff(months, today)
+    done = archived_periods(bind, refresh=True)
+    out = []
+    with bind.connect() as conn:
+        first = conn.execute(select(func.min(table.c.fecha)).where(table.c.fecha.is_not(None))).scalar()
+    m = first.replace(day=1) if first else limit
+    while m < limit:
+        period = period_of(m)
+        m = add_months(m, 1)
+        if dry_run or period in done:
+            with bind.connect() as conn:
+                n = conn.execute(select(func.count()).select_from(table)
+                                 .where(_in_period(table.c.fecha, period))).scalar()
+            if n and dry_run:
+                out.append({"period": period, "rows": n, "archived": period in done})
+            elif n:
+                # registrado pero con filas en la BD (DROP PARTITION interrumpido): se termina de borrar
+                out.append({"period": period, "rows": 0, "purge": _purge(bind, period)})
+        else:
+            res = archive_period(period, bind)
+            if res["rows"]:
+                log.info("archivado %s: %d filas, %d bytes", period, res["rows"], res["bytes"])
+                out.append(res)
+    if out and not dry_run:
+        _after_archive()
+    return out
+
+
+def _after_archive():
+    # import tardío: cache/columnar importan aggregates, que importa este módulo
+    from .cache import query_cache
+    from . import columnar
+    forget()
+    query_cache.clear()
+    columnar.mark_stale()
+
+
+# ---------- lectura de lo archivado ----------
+_periods: dict[str, str] = {}
+_checked_at = float("-inf")
+_lock = threading.Lock()
+
+
+def archived_periods(bind=engine, refresh: bool = False) -> dict[str, str]:
+    """{YYYY-MM: archivo} de archived_periods, releído cada ARCHIVE_CHECK_SECONDS.
+    Solo se cachea el de la BD de la app; con otro bind se lee siempre."""
+    global _periods, _checked_at
+    if bind is not engine:
+        return _read_periods(bind)
+    if refresh or time.monotonic() - _checked_at > ARCHIVE_CHECK_SECONDS:
+        with _lock:
+            _periods = _read_periods(bind)
+            _checked_at = time.monotonic()
+    return _periods
+
+
+def _read_periods(bind) -> dict[str, str]:
+    try:
+        with bind.connect() as conn:
+            return dict(conn.execute(select(ArchivedPeriod.period, ArchivedPeriod.path)).all())
+    except (OperationalError, ProgrammingError):
+        return {}  # BD previa a archived_periods
+
+
+def forget():
+    """Fuerza a releer archived_periods en la próxima consulta (listener de la caché)."""
+    global _checked_at
+    _checked_at = float("-inf")
+
+
+def archived_in_range(date_from=None, date_to=None, bind=engine) -> list[Path]:
+    """Archivos Parquet de los meses archivados que se solapan con [date_from, date_to]."""
+    periods = archived_periods(bind)
+    if not periods:
+        return []
+    lo = str(date_from)[:7] if date_from else None
+    hi = str(date_to)[:7] if date_to else None
+    return [ARCHIVE_DIR / name for p, name in sorted(periods.items())
+            if (lo is None or p >= lo) and (hi is None or p <= hi)]
+
+
+def _day(s) -> date:
+    return s if isinstance(s, date) else date.fromisoformat(str(s)[:10])
+
+
+def kpi_frames(paths, store=None, date_from=None, date_to=None) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """(diario: fecha, n, osa, oos; por SKU: codigo_barra, n, osa) de los archivos Parquet.
+    Los filtros se empujan al scan: row groups sin la tienda/rango no se leen."""
+    cond = [pl.col("fecha").is_not_null()]
+    if store:
+        cond.append(pl.col("pv") == store)
+    if date_from:
+        cond.append(pl.col("fecha") >= _day(date_from))
+    if date_to:
+        cond.append(pl.col("fecha") <= _day(date_to))
+    lf = pl.scan_parquet([str(p) for p in paths]).filter(*cond)
+    daily = lf.group_by("fecha").agg(
+        pl.len().cast(pl.Int64).alias("n"),
+        pl.col("osa_flag").cast(pl.Float64).sum().alias("osa"),
+        pl.col("oos_flag").cast(pl.Float64).sum().alias("oos"),
+    )
+    skus = lf.group_by("codigo_barra").agg(
+        pl.len().cast(pl.Int64).alias("n"),
+        pl.col("osa_flag").cast(pl.Float64).sum().alias("osa"),
+    )
+    return tuple(pl.collect_all([daily, skus]))
+
+
+def split_archived(df: pl.DataFrame, bind=engine) -> tuple[pl.DataFrame, int]:
+    """(filas a importar, filas descartadas por caer en meses archivados de bind)."""
+    periods = archived_periods(bind)
+    if not periods or df.height == 0:
+        return df, 0
+    archived = pl.col("fecha").dt.strftime("%Y-%m").is_in(list(periods)).fill_null(False)
+    dropped = df.filter(archived).height
+    return (df.filter(~archived), dropped) if dropped else (df, 0)
+
+
+def status(bind=engine) -> dict:
+    table = measurement_table()
+    out = {"table": table.name, "retention_months": RETENTION_MONTHS, "archive_dir": str(ARCHIVE_DIR)}
+    with bind.connect() as conn:
+        if bind.dialect.name == "mysql":
+            out["partitions"] = mysql_partitions(conn, table.name)
+        else:
+            month = func.substr(table.c.fecha, 1, 7)
+            out["periods"] = [tuple(r) for r in conn.execute(
+                select(month, func.count()).select_from(table).group_by(month).order_by(month))]
+        try:
+            out["archived"] = [tuple(r) for r in conn.execute(
+                select(ArchivedPeriod.period, ArchivedPeriod.rows, ArchivedPeriod.bytes).order_by(ArchivedPeriod.period))]
+        except (OperationalError, ProgrammingError):
+            out["archived"] = []
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    ap = argparse.ArgumentParser(prog="python -m backend.partitions")
+    ap.add_argument("command", choices=["status", "maintain", "archive"])
+    ap.add_argument("--months", type=int, default=None, help="meses a conservar (por defecto RETENTION_MONTHS)")
+    ap.add_argument("--dry-run", action="store_true", help="solo listar los meses que se archivarían")
+    args = ap.parse_args()
+    if args.command == "status":
+        st = status()
+        print(f"tabla {st['table']}  retención {st['retention_months']} meses  archivo {st['archive_dir']}")
+        for name, rows in st.get("partitions", st.get("periods", [])):
+            print(f"  {name}: {rows} filas")
+        for period, rows, size in st["archived"]:
+            print(f"  archivado {period}: {rows} filas, {size / 2**20:.1f} MB")
+    elif args.command == "maintain":
+        res = maintain()
+        print("particiones nuevas: " + (", ".join(res["added"]) or "ninguna") if res["partitioned"]
+              else "SQLite: sin particiones (períodos por rango de fecha)")
+    else:
+        res = archive(args.months, dry_run=args.dry_run)
+        for r in res:
+            print("  " + "  ".join(f"{k}={v}" for k, v in r.items()))
+        print(f"{len(res)} meses {'a archivar' if args.dry_run else 'archivados'}")
@@ -0,0 +1,61 @@
+# backend/responses.py
+# Respuestas JSON de los endpoints del dashboard:
+# - serialización con orjson (fechas nativas, sin jsonable_encoder fila a fila);
+#   sin orjson instalado se usa json estándar con el mismo resultado
+# - GET condicional: ETag / Last-Modified a partir de la versión de datos de la caché,
+#   que sube con cada commit de importación; If-None-Match coincidente → 304 sin
+#   tocar caché ni BD
+import json
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from .cache import query_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def validators() -> dict:
+    """Cabeceras de la versión actual. Se toman antes de consultar: si una importación
+    confirma a mitad de la consulta, el cliente revalida en la siguiente petición."""
+    version, modified = query_cache.version_info()
+    return {
+        "ETag": f'W/"{version}"',
+        "Last-Modified": formatdate(modified, usegmt=True),
+        # el navegador guarda la respuesta pero revalida siempre (If-None-Match)
+        "Cache-Control": "no-cache",
+    }
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    tags = {t.strip() for t in if_none_match.split(",")}
+    # comparación débil: W/"x" y "x" son equivalentes
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+
+def not_modified(request: Request, headers: dict) -> Response | None:
+    """304 si el cliente ya tiene esta versión; None si hay que responder el cuerpo."""
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        fresh = _matches(inm, headers["ETag"])
+    else:
+        # If-Modified-Since tiene resolución de segundos; el ETag es el validador preciso
+        ims = request.headers.get("if-modified-since")
+        try:
+            fresh = bool(ims) and int(query_cache.modified_at) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            fresh = False
+    return Response(status_code=304, headers=headers) if fresh else None
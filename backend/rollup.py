@@ -0,0 +1,161 @@
+# backend/rollup.py
+# Mantenimiento del agregado diario measurement_daily_rollup.
+# Los importadores acumulan deltas por (fecha, pv, codigo_barra) y los aplican
+# con un upsert en la misma transacción que las mediciones. Las filas sin fecha
+# van al día NULL_FECHA (models.py) para que el total siga siendo count(id).
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select, func, delete, insert, literal, Date
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from .db import engine, Base
+from .models import MeasurementDailyRollup, NULL_FECHA
+from . import storage
+
+ROLLUP_KEY = ("fecha", "pv", "codigo_barra")
+
+
+def _as_date(x):
+    if x is None:
+        return NULL_FECHA
+    if isinstance(x, datetime):
+        return x.date()
+    return x
+
+
+class RollupAccumulator:
+    """Acumula (n, osa, oos) por clave del rollup antes de escribirlos.
+    add_frame agrega lotes enteros en Polars; add/add_record quedan para filas sueltas.
+    frame() junta ambos."""
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [0, 0, 0])
+        self.frames = []
+
+    def add(self, fecha, pv, codigo_barra, osa_flag, oos_flag, n: int = 1):
+        d = self.deltas[(_as_date(fecha), pv, codigo_barra)]
+        d[0] += n
+        d[1] += int(osa_flag or 0)
+        d[2] += int(oos_flag or 0)
+
+    def add_record(self, r):
+        get = r.get if isinstance(r, dict) else (lambda k: getattr(r, k))
+        self.add(get("fecha"), get("pv"), get("codigo_barra"), get("osa_flag"), get("oos_flag"))
+
+    def add_frame(self, df, sign: int = 1):
+        """Agrega un DataFrame Polars normalizado de una vez (group_by vectorizado);
+        sign=-1 descuenta (versión anterior de filas actualizadas)."""
+        import polars as pl
+        if df.is_empty():
+            return
+        self.frames.append(df.with_columns(pl.col("fecha").cast(pl.Date).fill_null(NULL_FECHA)).group_by(list(ROLLUP_KEY)).agg(
+            (pl.len().cast(pl.Int64) * sign).alias("n"),
+            (pl.col("osa_flag").cast(pl.Int64).fill_null(0).sum() * sign).alias("osa_sum"),
+            (pl.col("oos_flag").cast(pl.Int64).fill_null(0).sum() * sign).alias("oos_sum"),
+        ))
+
+    def frame(self):
+        """Deltas acumulados en un DataFrame (fecha, pv, codigo_barra, n, osa_sum, oos_sum),
+        incluidas las claves que suman cero; None si no hay ninguno."""
+        import polars as pl
+        parts = list(self.frames)
+        if self.deltas:
+            parts.append(pl.DataFrame(
+                [(*k, *v) for k, v in self.deltas.items()], orient="row",
+                schema={"fecha": pl.Date, "pv": pl.Utf8, "codigo_barra": pl.Utf8,
+                        "n": pl.Int64, "osa_sum": pl.Int64, "oos_sum": pl.Int64}))
+        if not parts:
+            return None
+        sums = ["n", "osa_sum", "oos_sum"]
+        return pl.concat(parts, how="vertical_relaxed").group_by(list(ROLLUP_KEY)).agg(pl.col(sums).sum())
+
+    def rows(self, df=None):
+        """Filas para el upsert (df: el frame() ya calculado)."""
+        import polars as pl
+        df = self.frame() if df is None else df
+        if df is None:
+            return []
+        return df.filter(pl.any_horizontal(pl.col(["n", "osa_sum", "oos_sum"]) != 0)).to_dicts()
+
+    def flush(self, conn, df=None):
+        """Aplica los deltas acumulados (conn puede ser Session o Connection)."""
+        rows = self.rows(df)
+        if rows:
+            conn.execute(upsert_statement(conn), rows)
+        self.deltas.clear()
+        self.frames.clear()
+        return len(rows)
+
+
+def upsert_statement(conn):
+    table = MeasurementDailyRollup.__table__
+    backend = conn.get_bind().dialect.name if hasattr(conn, "get_bind") else conn.dialect.name
+    if backend == "sqlite":
+        stmt = sqlite_dialect.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=list(ROLLUP_KEY),
+            set_={
+                "n": table.c.n + stmt.excluded.n,
+                "osa_sum": table.c.osa_sum + stmt.excluded.osa_sum,
+                "oos_sum": table.c.oos_sum + stmt.excluded.oos_sum,
+            },
+        )
+    from sqlalchemy.dialects import mysql as mysql_dialect  # solo en despliegues MySQL
+    stmt = mysql_dialect.insert(table)
+    return stmt.on_duplicate_key_update(
+        n=table.c.n + stmt.inserted.n,
+        osa_sum=table.c.osa_sum + stmt.inserted.osa_sum,
+        oos_sum=table.c.oos_sum + stmt.inserted.oos_sum,
+    )
+
+
+def rebuild(bind=engine):
+    """Recalcula el rollup completo desde measurements (backfill)."""
+    table = MeasurementDailyRollup.__table__
+    Base.metadata.create_all(bind)
+    m = storage.measurements(["fecha", "pv", "codigo_barra", "osa_flag", "oos_flag"]).c
+    sums = (func.count(), func.sum(m.osa_flag), func.sum(m.oos_flag))
+    src = (
+        select(m.fecha, m.pv, m.codigo_barra, *sums)
+        .where(m.fecha.is_not(None))
+        .group_by(m.fecha, m.pv, m.codigo_barra)
+    )
+    # sin fecha → NULL_FECHA, aparte para no cambiar el plan del GROUP BY principal
+    undated = (
+        select(literal(NULL_FECHA, Date), m.pv, m.codigo_barra, *sums)
+        .where(m.fecha.is_(None))
+        .group_by(m.pv, m.codigo_barra)
+    )
+    with bind.begin() as conn:
+        conn.execute(delete(table))
+        for q in (src, undated):
+            conn.execute(insert(table).from_select(["fecha", "pv", "codigo_barra", "n", "osa_sum", "oos_sum"], q))
+        count = conn.execute(select(func.count()).select_from(table)).scalar() or 0
+    from .cache import query_cache
+    query_cache.clear()
+    return count
+
+
+def ensure_populated(bind=engine):
+    """Si hay mediciones pero el rollup está vacío (BD previa a esta tabla) o le faltan
+    las filas sin fecha (rollup previo a NULL_FECHA) → backfill."""
+    r = MeasurementDailyRollup
+    m = storage.measurements(["id", "fecha"]).c
+    with bind.connect() as conn:
+        has_rollup = conn.execute(select(r.fecha).limit(1)).first() is not None
+        has_raw = conn.execute(select(m.id).limit(1)).first() is not None
+        missing_null = (
+            has_rollup
+            and conn.execute(select(m.id).where(m.fecha.is_(None)).limit(1)).first() is not None
+            and conn.execute(select(r.fecha).where(r.fecha == NULL_FECHA).limit(1)).first() is None
+        )
+    if has_raw and (not has_rollup or missing_null):
+        return rebuild(bind)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Uso: python -m backend.rollup rebuild")
+        raise SystemExit(1)
+    print(f"Filas en rollup: {rebuild()}")
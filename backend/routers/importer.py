@@ -1,131 +1,120 @@
 # backend/routers/importer.py
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
-import pandas as pd
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+import hashlib
+import os
 from io import BytesIO
-from ..db import get_db
-from ..models import Measurement
+from .. import jobs
+from ..dedup import seen_file, record_file
+from ..db import SessionLocal
+from ..models import ImportJob
+from ..ingest import bulk_insert
+from ..metrics import import_stage
+from ..normalize import normalize, UPLOAD_OPTS
+from ..streaming import spool_upload, ingest_file, read_xlsx, unsupported_format, FORMATS
 
 router = APIRouter(prefix="/api/import", tags=["import"])
 
 
+def _previous_import(sha256: str):
+    with SessionLocal() as db:
+        prev = seen_file(db, sha256)
+        return None if prev is None else {"job_id": prev.job_id, "rows": prev.rows, "filename": prev.filename}
+
+
+def _record_import(sha256: str, filename: str, rows: int):
+    with SessionLocal() as db:
+        record_file(db, sha256, filename, rows)
+
+
+def _duplicate_response(sha256: str, prev: dict):
+    # archivo idéntico: no se parsea ni se toca measurements
+    return {
+        "status": "duplicate", "duplicate_file": True, "sha256": sha256,
+        "previous_job_id": prev["job_id"], "previous_filename": prev["filename"],
+        "inserted": 0, "updated": 0, "unchanged": prev["rows"], "skipped": 0,
+    }
+
+
 @router.post("/excel")
-async def import_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def import_excel(file: UploadFile = File(...), chunk_size: int | None = None,
+                       stream: bool = True, background: bool = True, force: bool = False):
     fname = file.filename or ""
-    if not fname.lower().endswith((".xlsx", ".xls")):
-        raise HTTPException(400, "Archivo debe ser .xlsx o .xls") 
+    if jobs.IMPORT_MODE == "queue":
+        # los workers web no importan: el job lo ejecuta el proceso backend.worker
+        background = True
+    if fname.lower().endswith(".xls"):
+        raise HTTPException(415, unsupported_format(".xls"))
+    allowed = FORMATS if stream or background else (".xlsx",)
+    if not fname.lower().endswith(allowed):
+        raise HTTPException(400, f"Archivo debe ser {' o '.join(allowed)}")
+
+    if background or stream:
+        path, sha256 = await spool_upload(file, directory=jobs.upload_dir() if background else None)
+        prev = None if force else await run_in_threadpool(_previous_import, sha256)
+        if prev:
+            os.remove(path)
+            return _duplicate_response(sha256, prev)
+
+    if background:
+        # job en segundo plano: se responde de inmediato con el id para consultar progreso
+        try:
+            job = await run_in_threadpool(jobs.create_job, path, fname, chunk_size, sha256)
+        except jobs.QueueFull as e:
+            os.remove(path)
+            raise HTTPException(429, str(e))
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
+    if stream:
+        # modo streaming: a disco y por bloques → memoria acotada sin importar el tamaño
+        try:
+            stats = await run_in_threadpool(ingest_file, path, None, chunk_size, **UPLOAD_OPTS)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        except Exception as e:
+            raise HTTPException(400, f"Error leyendo archivo: {e}")
+        finally:
+            os.remove(path)
+        if not stats.skipped:
+            await run_in_threadpool(_record_import, sha256, fname, stats.rows)
+        return {**stats.as_dict(), "total_rows": stats.rows + stats.skipped}
 
     content = await file.read()
+    sha256 = hashlib.sha256(content).hexdigest()
+    prev = None if force else await run_in_threadpool(_previous_import, sha256)
+    if prev:
+        return _duplicate_response(sha256, prev)
     try:
-        # leer excel forzando strings (evita notación científica en códigos)
-        df = pd.read_excel(BytesIO(content), dtype=str, engine="openpyxl")
+        # todas las celdas como texto (evita notación científica en códigos)
+        with import_stage("parse") as stage:
+            raw = read_xlsx(BytesIO(content))
+            stage.rows = raw.height
+        with import_stage("clean", raw.height):
+            df = normalize(raw, **UPLOAD_OPTS)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         raise HTTPException(400, f"Error leyendo Excel: {e}")
 
-    # mapeo de columnas esperadas -> nombres en BD
-    colmap = {
-        "IdConjuntoProducto": "id_conjunto",
-        "Fecha": "fecha",
-        "PV": "pv",
-        "Formato": "formato",
-        "Codigo de Barra": "codigo_barra",
-        "Descripcion SKU": "descripcion_sku",
-        "Causal": "causal",
-        "ESTADO": "estado",
-        "Tipo de Resultado": "tipo_resultado",
-        "Categoría": "categoria",
-        "Marca": "marca",
-        "Formato Marketing": "formato_marketing",
-        "Responsable": "responsable",
-        "Sector Operativo Cadena": "sector_operativo",
-        "Provincia": "provincia",
-        "Nombre Cliente": "cliente",
-        "Proveedor": "proveedor",
-        "FechaHoraMedicion": "fecha_hora_medicion",
-    }
+    # inserción masiva por lotes (un commit por lote; rollup incluido)
+    stats = await run_in_threadpool(bulk_insert, df, chunk_size)
+    if not stats.skipped:
+        await run_in_threadpool(_record_import, sha256, fname, stats.rows)
+    return {**stats.as_dict(), "total_rows": df.height}
 
-    # validar columnas mínimas
-    missing = [k for k in ["IdConjuntoProducto","Fecha","PV","Codigo de Barra","Descripcion SKU","ESTADO","Tipo de Resultado"] if k not in df.columns]
-    if missing:
-        raise HTTPException(400, f"Columnas faltantes: {', '.join(missing)}")
-
-    # renombrar y normalizar
-    df = df.rename(columns=colmap)
-
-    # asegurar que fecha siempre sea Timestamp
-    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
-
-    if "fecha_hora_medicion" in df.columns:
-        df["fecha_hora_medicion"] = pd.to_datetime(
-            df["fecha_hora_medicion"], errors="coerce"
-        )
-    else:
-        df["fecha_hora_medicion"] = pd.NaT
-    
-    # normalización extra (strings limpios)
-    for col in ["pv","formato","descripcion_sku","causal","estado","tipo_resultado",
-                "categoria","marca","formato_marketing","responsable","sector_operativo",
-                "provincia","cliente","proveedor"]:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
-
-    # estado/tipo en mayúscula:
-    df["estado"] = df["estado"].str.upper()
-    df["tipo_resultado"] = df["tipo_resultado"].str.upper()
-
-    # código de barras sin espacios, sin notación científica
-    df["codigo_barra"] = df["codigo_barra"].astype(str).str.replace(r"\.0$", "", regex=True).str.strip()
-
-    # filtra fechas fuera de rango razonable
-    df = df[(df["fecha"] >= pd.to_datetime("2023-01-01")) & (df["fecha"] <= pd.to_datetime("2026-12-31"))]
-
-    # limpieza básica (requisito: eliminar nulos en campos clave)
-    df = df.dropna(subset=["id_conjunto","fecha","pv","codigo_barra","descripcion_sku","estado","tipo_resultado"])
-
-    # flags OSA / OOS
-    def flag_osa(x): return 1 if str(x).strip().upper()=="OSA" else 0
-    def flag_oos(x): return 1 if str(x).strip().upper()=="OOS" else 0
-    df["osa_flag"] = df["tipo_resultado"].apply(flag_osa)
-    df["oos_flag"] = df["tipo_resultado"].apply(flag_oos)
-
-    inserted, skipped = 0, 0
-
-    for _, r in df.iterrows():
-        try:
-            fecha = r.get("fecha")
-            dia_semana = fecha.strftime("%A") if pd.notna(fecha) else None
-            nro_semana = fecha.strftime("%V") if pd.notna(fecha) else None
-
-            m = Measurement(
-                id_conjunto = r.get("id_conjunto"),
-                fecha = fecha,
-                dia_semana = dia_semana,
-                nro_semana = nro_semana,
-                pv = r.get("pv"),
-                formato = r.get("formato"),
-                codigo_barra = str(r.get("codigo_barra") or ""),
-                descripcion_sku = r.get("descripcion_sku"),
-                causal = r.get("causal") or "",
-                estado = r.get("estado") or "",
-                tipo_resultado = r.get("tipo_resultado") or "",
-                categoria = r.get("categoria") or "",
-                marca = r.get("marca") or "",
-                formato_marketing = r.get("formato_marketing") or "",
-                responsable = r.get("responsable") or "",
-                sector_operativo = r.get("sector_operativo") or "",
-                provincia = r.get("provincia") or "",
-                cliente = r.get("cliente") or "",
-                proveedor = r.get("proveedor") or "",
-                fecha_hora_medicion = r.get("fecha_hora_medicion"),
-                osa_flag = int(r.get("osa_flag") or 0),
-                oos_flag = int(r.get("oos_flag") or 0),
-            )
-            db.add(m)
-            inserted += 1
-
-        except Exception:
-            skipped += 1
-            db.rollback()
-
-    db.commit()
-    return {"inserted": inserted, "skipped": skipped, "total_rows": int(df.shape[0])}
+
+@router.get("/jobs")
+def list_jobs(limit: int = 20):
+    with SessionLocal() as db:
+        rows = db.query(ImportJob).order_by(ImportJob.created_at.desc()).limit(limit).all()
+        return {"items": [jobs.job_as_dict(j) for j in rows]}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    with SessionLocal() as db:
+        job = db.get(ImportJob, job_id)
+        if not job:
+            raise HTTPException(404, "Job not found")
+        return jobs.job_as_dict(job)
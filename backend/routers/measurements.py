@@ -0,0 +1,159 @@
+# backend/routers/measurements.py
+# Listado paginado por keyset (fecha desc, id desc) con cursor opaco y exportación
+# en streaming (NDJSON/CSV) desde un cursor del servidor con yield_per.
+import base64
+import csv
+import io
+import json
+from datetime import date
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, and_, or_
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal, run_query
+from ..aggregates import measurement_filters
+from ..cache import query_cache
+from ..responses import FastJSONResponse, dumps, validators, not_modified
+from ..normalize import MEASUREMENT_COLUMNS
+from .. import columnar
+from .. import storage
+
+router = APIRouter(prefix="/api/measurements", tags=["measurements"])
+
+# filas por página al seguir un cursor; la primera página (sin cursor) acepta cualquier
+# limit, como el listado original
+MAX_PAGE = 1000
+EXPORT_BATCH = 5000
+
+# columnas del listado (solo estas se leen; sin objetos ORM)
+LIST_COLUMNS = [
+    "id", "fecha", "pv", "codigo_barra", "descripcion_sku", "estado",
+    "tipo_resultado", "provincia", "osa_flag", "oos_flag",
+]
+EXPORT_COLUMNS = ["id", *MEASUREMENT_COLUMNS]
+
+
+def encode_cursor(fecha, id_: int) -> str:
+    raw = json.dumps([fecha.isoformat() if fecha else None, id_]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[date | None, int]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        fecha, id_ = json.loads(raw)
+        return (date.fromisoformat(fecha) if fecha else None), int(id_)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def after_cursor(m, fecha: date | None, id_: int):
+    """Filas posteriores al cursor en el orden (fecha desc, id desc); fecha NULL va al final."""
+    f, i = m.c.fecha, m.c.id
+    if fecha is None:
+        return and_(f.is_(None), i < id_)
+    return or_(f < fecha, and_(f == fecha, i < id_), f.is_(None))
+
+
+def _columns(m, names):
+    return [m.c[c] for c in storage.stored_columns(names)]
+
+
+def _row_dict(names, row):
+    # las fechas quedan como date: orjson las serializa en ISO sin un recorrido extra
+    return dict(zip(names, row))
+
+
+def list_page(db: Session, store, date_from, date_to, limit: int, cursor: str | None):
+    if columnar.enabled():
+        items, last = columnar.get_store().page(
+            LIST_COLUMNS, store, date_from, date_to, limit, decode_cursor(cursor) if cursor else None)
+        return {"items": items, "next_cursor": encode_cursor(*last) if last else None}
+    m = storage.measurements(LIST_COLUMNS)
+    q = select(*_columns(m, LIST_COLUMNS)).where(*measurement_filters(store, date_from, date_to, m.c))
+    if cursor:
+        q = q.where(after_cursor(m, *decode_cursor(cursor)))
+    # una fila extra indica si hay página siguiente
+    q = q.order_by(m.c.fecha.desc(), m.c.id.desc()).limit(limit + 1)
+    rows = db.execute(q).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [_row_dict(LIST_COLUMNS, r) for r in rows]
+    next_cursor = encode_cursor(rows[-1].fecha, rows[-1].id) if more else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("")
+async def measurements(
+    request: Request,
+    store: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    limit: int = Query(200, ge=1),
+    cursor: str | None = None,
+):
+    if cursor:
+        decode_cursor(cursor)  # 400 antes de tocar caché o BD
+        limit = min(limit, MAX_PAGE)
+    headers = validators()
+    if (cached := not_modified(request, headers)) is not None:
+        return cached
+    key = query_cache.make_key("measurements", store, date_from, date_to, limit, cursor)
+    if columnar.enabled():
+        # el motor en memoria no usa sesión: directo al threadpool
+        data = await query_cache.get_or_compute_async(key, lambda: run_in_threadpool(
+            list_page, None, store, date_from, date_to, limit, cursor))
+    else:
+        data = await query_cache.get_or_compute_async(key, lambda: run_query(
+            lambda db: list_page(db, store, date_from, date_to, limit, cursor)))
+    return FastJSONResponse(data, headers=headers)
+
+
+def export_rows(store, date_from, date_to, session_factory=SessionLocal):
+    # sesión propia: la de Depends(get_db) se cierra antes de que el cuerpo se envíe
+    m = storage.measurements(EXPORT_COLUMNS)
+    q = (
+        select(*_columns(m, EXPORT_COLUMNS))
+        .where(*measurement_filters(store, date_from, date_to, m.c))
+        .order_by(m.c.fecha.desc(), m.c.id.desc())
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+    # modo normalizado: dia_semana / nro_semana se derivan de la fecha
+    build = storage.row_builder(EXPORT_COLUMNS)
+    with session_factory() as db:
+        for row in db.execute(q):
+            yield build(row) if build else row
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield dumps(_row_dict(EXPORT_COLUMNS, row)) + b"\n"
+
+
+def csv_chunks(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % EXPORT_BATCH == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+@router.get("/export")
+def export_measurements(
+    store: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+):
+    rows = export_rows(store, date_from, date_to)
+    if format == "csv":
+        return StreamingResponse(csv_chunks(rows), media_type="text/csv",
+                                 headers={"Content-Disposition": 'attachment; filename="measurements.csv"'})
+    return StreamingResponse(ndjson_lines(rows), media_type="application/x-ndjson")
@@ -1,11 +1,13 @@
 # backend/routers/stores.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from ..db import get_db
-from ..models import Store
+from ..models import Store, MeasurementFact
+from ..normalize import normalize_name
+from .. import storage
+from .. import store_search
 
 router = APIRouter(prefix="/api/stores", tags=["stores"])
 
@@ -20,14 +22,30 @@ class StoreOut(StoreIn):
     class Config:
         from_attributes = True
 
+class StorePage(BaseModel):
+    items: list[StoreOut]
+    next_cursor: str | None
+
 @router.get("", response_model=list[StoreOut])
 def list_stores(limit: int = 100, q: str | None = None, db: Session = Depends(get_db)):
-    query = db.query(Store)
-    if q:
-        like = f"%{q.strip()}%"
-        # ILIKE en MySQL no existe; usamos LOWER para búsqueda case-insensitive
-        query = query.filter(func.lower(Store.name).like(func.lower(like)))
-    return query.order_by(Store.id.desc()).limit(limit).all()
+    if q and q.strip():
+        # misma búsqueda indexada y ordenada que /search (primera página)
+        return store_search.search(db, q, limit)[0]
+    return db.query(Store).order_by(Store.id.desc()).limit(limit).all()
+
+@router.get("/search", response_model=StorePage)
+def search_stores(
+    q: str | None = None,
+    limit: int = Query(20, ge=1, le=200),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Type-ahead del selector de PV: exacta, prefijo, palabra, resto; páginas por cursor."""
+    try:
+        items, next_cursor = store_search.search(db, q, limit, cursor)
+    except ValueError:
+        raise HTTPException(400, "Cursor inválido")
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.get("/{store_id}", response_model=StoreOut)
 def get_store(store_id: int, db: Session = Depends(get_db)):
@@ -38,11 +56,13 @@ def get_store(store_id: int, db: Session = Depends(get_db)):
 
 @router.post("", response_model=StoreOut, status_code=201)
 def create_store(data: StoreIn, db: Session = Depends(get_db)):
-    exists = db.query(Store).filter(func.lower(Store.name) == func.lower(data.name)).first()
+    # índice único de name_norm: sin LOWER(name) fila por fila
+    exists = db.query(Store.id).filter(Store.name_norm == normalize_name(data.name)).first()
     if exists:
         raise HTTPException(409, "Store name already exists")
     s = Store(
         name=data.name.strip(),
+        name_norm=normalize_name(data.name),
         provincia=(data.provincia or None),
         formato=(data.formato or None),
         cliente=(data.cliente or None),
@@ -57,16 +77,22 @@ def update_store(store_id: int, data: StoreIn, db: Session = Depends(get_db)):
     s = db.get(Store, store_id)
     if not s:
         raise HTTPException(404, "Store not found")
-    if data.name.strip().lower() != (s.name or "").lower():
-        exists = db.query(Store).filter(func.lower(Store.name) == func.lower(data.name)).first()
+    name_norm = normalize_name(data.name)
+    if name_norm != s.name_norm:
+        exists = db.query(Store.id).filter(Store.name_norm == name_norm, Store.id != store_id).first()
         if exists:
             raise HTTPException(409, "Store name already exists")
+    renamed = s.name != data.name.strip()
     s.name = data.name.strip()
+    s.name_norm = name_norm
     s.provincia = data.provincia or None
     s.formato = data.formato or None
     s.cliente = data.cliente or None
     db.commit()
     db.refresh(s)
+    if renamed:
+        # el nombre es la clave pv de las importaciones normalizadas
+        storage.dimension_cache.clear()
     return s
 
 @router.delete("/{store_id}", status_code=204)
@@ -74,6 +100,8 @@ def delete_store(store_id: int, db: Session = Depends(get_db)):
     s = db.get(Store, store_id)
     if not s:
         raise HTTPException(404, "Store not found")
+    if db.query(MeasurementFact.id).filter(MeasurementFact.store_id == store_id).first():
+        raise HTTPException(409, "Store has measurements")
     db.delete(s)
     db.commit()
     return
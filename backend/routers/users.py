@@ -1,15 +1,19 @@
 # backend/routers/users.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from typing import List
-import mysql.connector
-import os
-from dotenv import load_dotenv
+from typing import List, Union
+from sqlalchemy import select, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
-load_dotenv()
+from ..db import get_db
+from ..models import User
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+MAX_PAGE = 500
+MAX_BULK = 5000
+
 # ----------- MODELOS -----------
 class UserBase(BaseModel):
     username: str
@@ -22,38 +26,68 @@ class UserCreate(UserBase):
 
 class UserOut(UserBase):
     id: int
+    class Config:
+        from_attributes = True
+
+class UserPage(BaseModel):
+    items: List[UserOut]
+    next_cursor: int | None = None
 
-# ----------- DB CONNECTION -----------
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
+class BulkResult(BaseModel):
+    inserted: int
 
 # ----------- RUTAS -----------
-@router.get("/", response_model=List[UserOut])
-def get_users():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, username, email, role, active FROM users")
-    users = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return users
+# Conexiones del pool compartido (db.engine) en vez de un connect() por petición.
+# Sin cursor devuelve la lista completa (como siempre); con ?cursor= (0 para la primera
+# página) pagina por keyset y devuelve {items, next_cursor}.
+@router.get("/", response_model=Union[List[UserOut], UserPage])
+def get_users(
+    limit: int = Query(50, ge=1, le=MAX_PAGE),
+    cursor: int | None = Query(None, description="id del último usuario de la página anterior"),
+    q: str | None = None,
+    role: str | None = None,
+    active: bool | None = None,
+    db: Session = Depends(get_db),
+):
+    stmt = select(User.id, User.username, User.email, User.role, User.active)
+    if q:
+        like = f"%{q.strip()}%"
+        stmt = stmt.where(or_(User.username.like(like), User.email.like(like)))
+    if role:
+        stmt = stmt.where(User.role == role)
+    if active is not None:
+        stmt = stmt.where(User.active == active)
+    stmt = stmt.order_by(User.id)
+    if cursor is None:
+        return db.execute(stmt).mappings().all()
+    # keyset por id: cada página es un range scan sobre la PK, sin OFFSET
+    rows = db.execute(stmt.where(User.id > cursor).limit(limit + 1)).mappings().all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {"items": rows, "next_cursor": rows[-1]["id"] if more else None}
 
 @router.post("/", response_model=UserOut)
-def create_user(user: UserCreate):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO users (username, email, password, role, active) VALUES (%s,%s,%s,%s,%s)",
-        (user.username, user.email, user.password, user.role, user.active),
-    )
-    conn.commit()
-    new_id = cursor.lastrowid
-    cursor.close()
-    conn.close()
-    return {**user.dict(), "id": new_id}
\ No newline at end of file
+def create_user(user: UserCreate, db: Session = Depends(get_db)):
+    row = User(**user.model_dump())
+    db.add(row)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="El usuario ya existe")
+    return {**user.model_dump(), "id": row.id}
+
+@router.post("/bulk", response_model=BulkResult)
+def create_users_bulk(users: List[UserCreate], db: Session = Depends(get_db)):
+    # un solo INSERT multi-fila (executemany) en una transacción
+    if not users:
+        return {"inserted": 0}
+    if len(users) > MAX_BULK:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_BULK} usuarios por petición")
+    try:
+        db.execute(insert(User), [u.model_dump() for u in users])
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Hay usuarios repetidos o ya existentes")
+    return {"inserted": len(users)}
@@ -0,0 +1,83 @@
+# backend/schema.py
+# Versión del esquema: una huella (hash) de tablas, columnas e índices del modelo y
+# de los índices gestionados se guarda en schema_meta. Al arrancar, si coincide con
+# la del código no se corre DDL (create_all, CREATE INDEX, backfills): una sola
+# consulta en vez de reflexión e intentos de CREATE por cada worker que arranca.
+# Uso manual: python -m backend.schema sync [--force]
+import hashlib
+import logging
+import os
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from .db import Base, engine
+from .models import SchemaMeta
+from .indexes import MANAGED_INDEXES, OBSOLETE_INDEXES, ensure_indexes
+from .dedup import ensure_natural_key
+from .rollup import ensure_populated as ensure_rollup
+from .cube import ensure_populated as ensure_cube
+from .approx import ensure_populated as ensure_approx
+from .store_search import ensure_search
+from .jobs import ensure_owner_columns
+
+log = logging.getLogger("uvicorn.error")
+
+# auto: DDL solo si cambió la huella | always: en cada arranque (comportamiento anterior)
+SCHEMA_SYNC = os.getenv("SCHEMA_SYNC", "auto").lower()
+# subir a mano cuando un cambio requiera re-ejecutar los pasos sin cambiar el modelo
+# (p.ej. un backfill nuevo)
+SCHEMA_REVISION = 3
+SCHEMA_KEY = "schema"
+
+
+def fingerprint() -> str:
+    parts = [f"rev={SCHEMA_REVISION}"]
+    for table in Base.metadata.sorted_tables:
+        parts.append(f"table {table.name}")
+        for c in table.columns:
+            parts.append(f"  {c.name} {c.type!r} null={c.nullable} pk={c.primary_key} unique={c.unique}")
+        for ix in sorted(table.indexes, key=lambda i: i.name):
+            parts.append(f"  index {ix.name} {[c.name for c in ix.columns]} unique={ix.unique}")
+    for ix in MANAGED_INDEXES:
+        parts.append(f"managed {ix.table.name}.{ix.name} {[c.name for c in ix.columns]}")
+    for table, names in sorted(OBSOLETE_INDEXES.items()):
+        parts.append(f"obsolete {table} {sorted(names)}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def applied_version(bind=engine) -> str | None:
+    try:
+        with bind.connect() as conn:
+            return conn.execute(select(SchemaMeta.value).where(SchemaMeta.key == SCHEMA_KEY)).scalar()
+    except (OperationalError, ProgrammingError):
+        return None  # BD nueva o previa a schema_meta
+
+
+def sync_schema(bind=engine, force: bool = False) -> bool:
+    """Aplica DDL y backfills si la huella cambió; devuelve True si se ejecutaron."""
+    target = fingerprint()
+    if not force and SCHEMA_SYNC != "always" and applied_version(bind) == target:
+        return False
+    Base.metadata.create_all(bind=bind)
+    ensure_owner_columns(bind)
+    created = ensure_indexes(bind)
+    ensure_natural_key(bind)
+    ensure_rollup(bind)
+    ensure_cube(bind)
+    ensure_approx(bind)
+    ensure_search(bind)
+    with bind.begin() as conn:
+        # merge portable: borrar + insertar dentro de la misma transacción
+        conn.execute(SchemaMeta.__table__.delete().where(SchemaMeta.key == SCHEMA_KEY))
+        conn.execute(SchemaMeta.__table__.insert().values(key=SCHEMA_KEY, value=target, updated_at=datetime.utcnow()))
+    log.info("Esquema sincronizado (%s); índices creados: %s", target[:12], ", ".join(created) or "ninguno")
+    return True
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2 or sys.argv[1] != "sync":
+        print("Uso: python -m backend.schema sync [--force]")
+        raise SystemExit(1)
+    ran = sync_schema(force="--force" in sys.argv)
+    print("Esquema sincronizado" if ran else "Esquema al día; nada que hacer")
@@ -0,0 +1,82 @@
+# backend/series.py
+# Serie de OSA% para /api/kpis: agrupación día/semana/mes ponderada por número de
+# mediciones (suma de osa / suma de n, no promedio de porcentajes), media móvil
+# ponderada y reducción de puntos con LTTB para rangos largos.
+from __future__ import annotations
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+pl = lazy_import("polars")
+
+GROUP_BY = ("day", "week", "month")
+
+
+def bucket_label(group_by: str = "day") -> pl.Expr:
+    """Etiqueta del bucket de la columna fecha (Date): día, semana ISO o mes."""
+    if group_by == "week":
+        return pl.col("fecha").dt.strftime("%G-W%V")
+    if group_by == "month":
+        return pl.col("fecha").dt.strftime("%Y-%m")
+    return pl.col("fecha").dt.strftime("%Y-%m-%d")
+
+
+def bucket(daily: pl.DataFrame, group_by: str = "day") -> pl.DataFrame:
+    """daily: columnas fecha (Date), n, osa, oos. Devuelve label, n, osa, oos ordenado."""
+    return (
+        daily.group_by(bucket_label(group_by).alias("label"))
+        .agg(pl.col("n").sum(), pl.col("osa").sum(), pl.col("oos").sum())
+        .sort("label")
+    )
+
+
+def with_moving_average(buckets: pl.DataFrame, window: int) -> pl.DataFrame:
+    """Media móvil de los últimos `window` buckets ponderada por n (ventana parcial al inicio)."""
+    roll_n = pl.col("n").rolling_sum(window, min_periods=1)
+    roll_osa = pl.col("osa").rolling_sum(window, min_periods=1)
+    return buckets.with_columns((roll_osa * 100.0 / roll_n).alias("ma_osa_pct"))
+
+
+def lttb(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets sobre x = posición; devuelve los índices elegidos."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float)
+    keep = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        # promedio del bucket siguiente (el último punto si no hay más)
+        nxt_start, nxt_end = end, min(int(np.floor((i + 2) * every)) + 1, n)
+        if nxt_start >= nxt_end:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            avg_x, avg_y = x[nxt_start:nxt_end].mean(), y[nxt_start:nxt_end].mean()
+        xs, ys = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (ys - y[a]) - (x[a] - xs) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep.append(a)
+    keep.append(n - 1)
+    return np.array(keep)
+
+
+def build_series(daily: pl.DataFrame, group_by: str = "day", ma_window: int | None = None,
+                 max_points: int | None = None) -> list[dict]:
+    if daily.height == 0:
+        return []
+    out = bucket(daily, group_by).with_columns((pl.col("osa") * 100.0 / pl.col("n")).alias("osa_pct"))
+    if ma_window and ma_window > 1:
+        out = with_moving_average(out, ma_window)
+    if max_points and out.height > max_points:
+        out = out[lttb(out["osa_pct"].to_numpy(), max_points).tolist()]
+    has_ma = "ma_osa_pct" in out.columns
+    # redondeo en Python (mitad al par), igual que el resto de porcentajes de /api/kpis
+    series = []
+    for r in out.iter_rows(named=True):
+        item = {"date": r["label"], "osa_pct": round(r["osa_pct"], 2), "n": r["n"]}
+        if has_ma:
+            item["ma_osa_pct"] = round(r["ma_osa_pct"], 2)
+        series.append(item)
+    return series
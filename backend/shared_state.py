@@ -0,0 +1,164 @@
+# backend/shared_state.py
+# Estado compartido entre procesos de la misma máquina (workers de gunicorn, worker
+# de importaciones, CLI) en un archivo SQLite local en modo WAL:
+# - version_log: cada commit de importación agrega (stores, rango) → versión global.
+#   Cada proceso aplica las entradas nuevas a su caché L1 y marca su snapshot
+#   columnar como viejo, así todos invalidan lo mismo y comparten ETag.
+# - live_deltas: deltas de rollup de cada versión (live.py), para que los clientes SSE de
+#   cualquier worker reciban lo importado por otro proceso. Se guardan pocas.
+# - cache_entries: caché L2 compartida (CACHE_SHARED=sqlite) con TTL.
+# Con varias máquinas usar CACHE_SHARED=redis para la L2 (la versión sigue siendo local).
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+SHARED_STATE = os.getenv("SHARED_STATE", "none").lower()  # none | sqlite
+SHARED_STATE_PATH = os.getenv(
+    "SHARED_STATE_PATH", str(Path(__file__).resolve().parent.parent / "data" / "shared_state.db"))
+# entradas del registro que se conservan (un proceso más atrasado que esto limpia todo)
+LOG_KEEP = 1000
+# versiones con deltas para /api/kpis/stream (más atrasado que esto → snapshot completo)
+DELTAS_KEEP = 200
+
+_DDL = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS version_log (version INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "stores TEXT, date_min TEXT, date_max TEXT, created_at REAL)",
+    "CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value TEXT, expires REAL)",
+    "CREATE TABLE IF NOT EXISTS live_deltas (version INTEGER PRIMARY KEY, payload TEXT)",
+)
+
+
+class SqliteStore:
+    """Conexión por hilo al archivo compartido; las escrituras son transacciones cortas."""
+
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self.conn() as c:
+            for ddl in _DDL:
+                c.execute(ddl)
+            # epoch común a todos los procesos que usan el archivo (mismo ETag en cada worker)
+            c.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', ?)", (uuid.uuid4().hex[:8],))
+
+    def conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = _Tx(c)
+            c = self._local.conn
+        return c
+
+
+class _Tx:
+    """with store.conn() as c: → BEGIN IMMEDIATE ... COMMIT (autocommit fuera del with)."""
+
+    def __init__(self, raw: sqlite3.Connection):
+        self.raw = raw
+
+    def execute(self, *args):
+        return self.raw.execute(*args)
+
+    def __enter__(self):
+        self.raw.execute("BEGIN IMMEDIATE")
+        return self.raw
+
+    def __exit__(self, exc_type, *exc):
+        self.raw.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class SharedVersion:
+    """Versión de datos global y registro de invalidaciones."""
+
+    def __init__(self, store: SqliteStore):
+        self.store = store
+        self.epoch = store.conn().execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()[0]
+
+    def bump(self, stores=None, date_min=None, date_max=None, deltas=None) -> int:
+        """deltas: filas (fecha, pv, codigo_barra, n, osa, oos) del commit (live.py) o None."""
+        payload = None if stores is None else json.dumps(sorted(stores))
+        with self.store.conn() as c:
+            cur = c.execute(
+                "INSERT INTO version_log (stores, date_min, date_max, created_at) VALUES (?, ?, ?, ?)",
+                (payload, date_min, date_max, time.time()))
+            version = cur.lastrowid
+            if deltas is not None:
+                c.execute("INSERT INTO live_deltas (version, payload) VALUES (?, ?)",
+                          (version, json.dumps(deltas, separators=(",", ":"))))
+            if version % 100 == 0:
+                c.execute("DELETE FROM version_log WHERE version <= ?", (version - LOG_KEEP,))
+            if version % 10 == 0:
+                c.execute("DELETE FROM live_deltas WHERE version <= ?", (version - DELTAS_KEEP,))
+        return version
+
+    def head(self) -> tuple[int, float | None]:
+        row = self.store.conn().execute(
+            "SELECT version, created_at FROM version_log ORDER BY version DESC LIMIT 1").fetchone()
+        return (row[0], row[1]) if row else (0, None)
+
+    def changes_since(self, version: int) -> list[tuple]:
+        """[(version, stores | None, date_min, date_max, created_at, deltas | None)]; None si
+        el registro ya no alcanza (hay que limpiar todo)."""
+        c = self.store.conn()
+        oldest = c.execute("SELECT MIN(version) FROM version_log").fetchone()[0]
+        if version and oldest is not None and oldest > version + 1:
+            return None
+        rows = c.execute(
+            "SELECT l.version, l.stores, l.date_min, l.date_max, l.created_at, d.payload FROM version_log l "
+            "LEFT JOIN live_deltas d ON d.version = l.version WHERE l.version > ? ORDER BY l.version",
+            (version,)).fetchall()
+        return [
+            (v, None if s is None else set(json.loads(s)), dmin, dmax, ts, None if d is None else json.loads(d))
+            for v, s, dmin, dmax, ts, d in rows
+        ]
+
+
+class SqliteCacheBackend:
+    """L2 compartida entre procesos de la máquina: misma interfaz que RedisBackend."""
+
+    def __init__(self, store: SqliteStore, ttl: float, encode_key, decode_key):
+        self.store, self.ttl = store, ttl
+        self._encode, self._decode = encode_key, decode_key
+
+    def get(self, key):
+        row = self.store.conn().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires > ?", (self._encode(key), time.time())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value):
+        self.store.conn().execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+            (self._encode(key), json.dumps(value, default=str), time.time() + self.ttl))
+
+    def delete(self, key):
+        self.store.conn().execute("DELETE FROM cache_entries WHERE key = ?", (self._encode(key),))
+
+    def keys(self):
+        rows = self.store.conn().execute("SELECT key FROM cache_entries WHERE expires > ?", (time.time(),)).fetchall()
+        return [self._decode(k) for (k,) in rows]
+
+    def clear(self):
+        self.store.conn().execute("DELETE FROM cache_entries")
+
+
+_store: SqliteStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SqliteStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SqliteStore()
+        return _store
+
+
+def shared_version() -> SharedVersion | None:
+    return SharedVersion(get_store()) if SHARED_STATE == "sqlite" else None
@@ -0,0 +1,388 @@
+# backend/storage.py
+# Almacenamiento de mediciones:
+# - wide (por defecto): tabla measurements, cada fila repite todos los textos.
+# - normalized (MEASUREMENT_STORAGE=normalized): hecho angosto measurement_fact con
+#   ids enteros a stores (pv), dim_sku (codigo_barra) y dim_value (el resto de los
+#   textos), la fecha y los flags en un byte. dia_semana / nro_semana se derivan de la fecha.
+# measurements(cols) devuelve una fuente con los nombres de columna de measurements en
+# ambos modos: las lecturas (KPIs crudos, listado, export, motor en memoria, backfills de
+# rollup y cubos) no dependen del modo. Los importadores resuelven los ids en bloque con
+# una caché en memoria (DimensionBatch).
+# Migración desde measurements: python -m backend.storage migrate [--batch 50000] [--drop-wide]
+import logging
+import os
+import threading
+from datetime import date
+from sqlalchemy import select, insert, func, delete, and_, MetaData, Table, Column, Integer
+from .db import engine, Base
+from .models import Measurement, MeasurementFact, Store, DimSku, DimValue, FACT_NATURAL_KEY
+from .normalize import MEASUREMENT_COLUMNS, normalize_name
+from .lazy import lazy_import
+
+pl = lazy_import("polars")
+log = logging.getLogger("uvicorn.error")
+
+MEASUREMENT_STORAGE = os.getenv("MEASUREMENT_STORAGE", "wide").lower()  # wide | normalized
+
+# columnas de texto que pasan a dim_value (kind = nombre de la columna)
+LABEL_COLUMNS = (
+    "formato", "descripcion_sku", "causal", "estado", "tipo_resultado", "categoria", "marca",
+    "formato_marketing", "responsable", "sector_operativo", "provincia", "cliente", "proveedor",
+)
+# derivadas de la fecha: no se guardan en el hecho
+CALENDAR_COLUMNS = ("dia_semana", "nro_semana")
+OSA_BIT, OOS_BIT = 1, 2
+LOOKUP_BATCH = 500  # valores por consulta IN (límite de parámetros de SQLite)
+
+F = MeasurementFact.__table__
+
+# claves de un lote de importación: tablas temporales de la conexión (no entran en create_all)
+STAGING = MetaData()
+
+
+def normalized() -> bool:
+    return MEASUREMENT_STORAGE == "normalized"
+
+
+def stored_columns(names) -> list[str]:
+    """names sin las columnas que el modo actual no guarda (las derivadas de la fecha)."""
+    return [c for c in names if not (normalized() and c in CALENDAR_COLUMNS)]
+
+
+def calendar(fecha: date | None) -> tuple[str, str]:
+    """(dia_semana, nro_semana) como los deriva normalize (%A y semana ISO %V)."""
+    if fecha is None:
+        return "", ""
+    return fecha.strftime("%A"), f"{fecha.isocalendar()[1]:02d}"
+
+
+# ---------- lectura ----------
+def _fact_columns(names):
+    """(columnas etiquetadas con el nombre en measurements, FROM con solo los joins necesarios)."""
+    cols, frm = [], F
+    for name in dict.fromkeys(names):
+        if name in ("id", "id_conjunto", "fecha", "fecha_hora_medicion"):
+            cols.append(F.c[name])
+        elif name == "pv":
+            s = Store.__table__
+            frm = frm.join(s, s.c.id == F.c.store_id)
+            cols.append(s.c.name.label("pv"))
+        elif name == "codigo_barra":
+            k = DimSku.__table__
+            frm = frm.join(k, k.c.id == F.c.sku_id)
+            cols.append(k.c.codigo_barra.label("codigo_barra"))
+        elif name == "osa_flag":
+            cols.append(F.c.flags.op("&")(OSA_BIT).label("osa_flag"))
+        elif name == "oos_flag":
+            cols.append(F.c.flags.op("&")(OOS_BIT).op(">>")(1).label("oos_flag"))
+        elif name in LABEL_COLUMNS:
+            v = DimValue.__table__.alias(f"dv_{name}")
+            frm = frm.join(v, v.c.id == F.c[f"{name}_id"])
+            cols.append(v.c.value.label(name))
+        elif name not in CALENDAR_COLUMNS:
+            raise KeyError(name)
+    return cols, frm
+
+
+_sources = {}
+
+
+def measurements(names=None):
+    """Fuente de mediciones con las columnas de measurements (.c.pv, .c.fecha, ...).
+    En modo normalizado es una subconsulta con los joins de las columnas pedidas; el
+    planificador (SQLite, MySQL) la aplana y filtra sobre el hecho. Mismas columnas →
+    mismo objeto, así filtros y SELECT armados por separado se refieren a la misma fuente."""
+    if not normalized():
+        return Measurement.__table__
+    key = tuple(dict.fromkeys(names or ["id", *MEASUREMENT_COLUMNS]))
+    source = _sources.get(key)
+    if source is None:
+        cols, frm = _fact_columns(key)
+        source = _sources[key] = select(*cols).select_from(frm).subquery("measurements")
+    return source
+
+
+def row_builder(names):
+    """Función fila → tupla en el orden de names que completa dia_semana / nro_semana
+    desde la fecha; None si la fuente ya trae todas las columnas (modo wide)."""
+    if not normalized() or not set(names) & set(CALENDAR_COLUMNS):
+        return None
+    stored = stored_columns(names)
+
+    def build(row):
+        values = dict(zip(stored, row))
+        dia, semana = calendar(values.get("fecha"))
+        values.setdefault("dia_semana", dia)
+        values.setdefault("nro_semana", semana)
+        return tuple(values[c] for c in names)
+    return build
+
+
+# ---------- dimensiones ----------
+def _dimension(name):
+    """(tabla, columna del valor, valores fijos de la fila) de la dimensión de una columna."""
+    if name == "pv":
+        return Store.__table__, "name", {}
+    if name == "codigo_barra":
+        return DimSku.__table__, "codigo_barra", {}
+    return DimValue.__table__, "value", {"kind": name}
+
+
+class DimensionCache:
+    """{(columna, valor): id} de todo el proceso. Las dimensiones solo crecen, así que
+    un id leído no cambia (salvo que se renombre una tienda: ver clear)."""
+
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, value):
+        return self._ids.get((name, value))
+
+    def update(self, items: dict):
+        with self._lock:
+            self._ids.update(items)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+    def __len__(self):
+        return len(self._ids)
+
+
+dimension_cache = DimensionCache()
+
+
+class DimensionBatch:
+    """Resolución de ids de un lote: los valores que no están en la caché se insertan
+    en bloque (INSERT OR IGNORE / INSERT IGNORE) y se leen de vuelta con IN. Los ids
+    nuevos se publican en la caché solo tras el commit del lote (publish): un rollback
+    no deja en memoria ids de filas que no existen."""
+
+    def __init__(self, cache: DimensionCache = dimension_cache):
+        self.cache = cache
+        self.pending = {}
+
+    def resolve(self, conn, name: str, values, extra: dict | None = None) -> dict:
+        ids, missing = {}, []
+        for v in dict.fromkeys(values):
+            i = self.cache.get(name, v)
+            if i is None:
+                i = self.pending.get((name, v))
+            if i is None:
+                missing.append(v)
+            else:
+                ids[v] = i
+        if missing:
+            ids.update(self._fetch_or_create(conn, name, missing, extra or {}))
+        return ids
+
+    def _fetch_or_create(self, conn, name, values, extra):
+        table, col, fixed = _dimension(name)
+        found = self._fetch(conn, table, col, fixed, values)
+        new = [v for v in values if v not in found]
+        if new:
+            stmt = insert(table).prefix_with("OR IGNORE", dialect="sqlite").prefix_with("IGNORE", dialect="mysql")
+            conn.execute(stmt, [{col: v, **fixed, **extra.get(v, {})} for v in new])
+            found.update(self._fetch(conn, table, col, fixed, new))
+        # collation sin distinción de mayúsculas (MySQL): 'pv-1' vuelve como 'PV-1'
+        folded = {str(k).lower(): i for k, i in found.items()}
+        ids = {v: found.get(v, folded.get(str(v).lower())) for v in values}
+        if table is Store.__table__ and None in ids.values():
+            # 'Almacén 1' ya existe como 'ALMACEN 1': el índice único de name_norm ignoró el INSERT
+            norms = {v: normalize_name(v) for v, i in ids.items() if i is None}
+            by_norm = self._fetch(conn, table, "name_norm", fixed, list(set(norms.values())))
+            ids.update((v, by_norm.get(n)) for v, n in norms.items())
+        self.pending.update(((name, v), i) for v, i in ids.items())
+        return ids
+
+    @staticmethod
+    def _fetch(conn, table, col, fixed, values) -> dict:
+        out = {}
+        where = [table.c[k] == v for k, v in fixed.items()]
+        for i in range(0, len(values), LOOKUP_BATCH):
+            part = values[i:i + LOOKUP_BATCH]
+            q = select(table.c[col], table.c.id).where(*where, table.c[col].in_(part))
+            out.update((v, i_) for v, i_ in conn.execute(q))
+        return out
+
+    def resolve_stores(self, conn, rows: list[dict]) -> dict:
+        """{pv: id}; una tienda nueva se crea con provincia / formato / cliente de su primera
+        fila. También en modo wide: así la lista de tiendas sigue a las importaciones."""
+        stores = {}
+        for r in rows:
+            if r["pv"] not in stores:
+                stores[r["pv"]] = {"name_norm": normalize_name(r["pv"]),
+                                   "provincia": r.get("provincia") or None,
+                                   "formato": r.get("formato") or None,
+                                   "cliente": r.get("cliente") or None}
+        return self.resolve(conn, "pv", stores, stores)
+
+    def resolve_frame(self, conn, df, stores_only: bool = False) -> dict:
+        """Como resolve_rows con un DataFrame Polars: recorre solo los valores distintos."""
+        firsts = df.unique("pv", keep="first", maintain_order=True).select(
+            "pv", "provincia", "formato", "cliente").to_dicts()
+        ids = {"pv": self.resolve_stores(conn, firsts)}
+        if not stores_only:
+            for name in ("codigo_barra", *LABEL_COLUMNS):
+                ids[name] = self.resolve(conn, name, df[name].unique(maintain_order=True).to_list())
+        return ids
+
+    def resolve_rows(self, conn, rows: list[dict]) -> dict:
+        """{columna: {valor: id}} para pv, codigo_barra y LABEL_COLUMNS de las filas."""
+        ids = {"pv": self.resolve_stores(conn, rows),
+               "codigo_barra": self.resolve(conn, "codigo_barra", (r["codigo_barra"] for r in rows))}
+        for name in LABEL_COLUMNS:
+            ids[name] = self.resolve(conn, name, (r[name] for r in rows))
+        return ids
+
+    def publish(self):
+        self.cache.update(self.pending)
+        self.pending = {}
+
+
+# ---------- escritura ----------
+def fact_row(r: dict, ids: dict) -> dict:
+    out = {
+        "id_conjunto": r["id_conjunto"],
+        "fecha": r["fecha"],
+        "fecha_hora_medicion": r["fecha_hora_medicion"],
+        "store_id": ids["pv"][r["pv"]],
+        "sku_id": ids["codigo_barra"][r["codigo_barra"]],
+        "flags": (OSA_BIT if r["osa_flag"] else 0) | (OOS_BIT if r["oos_flag"] else 0),
+    }
+    for name in LABEL_COLUMNS:
+        out[f"{name}_id"] = ids[name][r[name]]
+    if "id" in r:
+        out["id"] = r["id"]
+    return out
+
+
+def fact_rows(df, ids: dict) -> list[dict]:
+    """fact_row de todo un DataFrame Polars (ids con replace_strict, sin recorrer filas)."""
+    def mapped(name):
+        return pl.col(name).replace_strict(ids[name], return_dtype=pl.Int64)
+
+    def bit(flag, value):
+        return pl.col(flag).fill_null(0).cast(pl.Boolean).cast(pl.Int64) * value
+
+    return df.select(
+        "id_conjunto", "fecha", "fecha_hora_medicion", mapped("pv").alias("store_id"),
+        mapped("codigo_barra").alias("sku_id"), (bit("osa_flag", OSA_BIT) + bit("oos_flag", OOS_BIT)).alias("flags"),
+        *(mapped(name).alias(f"{name}_id") for name in LABEL_COLUMNS),
+        *(["id"] if "id" in df.columns else []),
+    ).to_dicts()
+
+
+FACT_UPDATE_COLUMNS = [c.name for c in F.columns if c.name != "id" and c.name not in FACT_NATURAL_KEY]
+
+
+def upsert_statement(conn):
+    """INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE sobre la clave natural del hecho."""
+    if conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects import sqlite as sqlite_dialect
+        stmt = sqlite_dialect.insert(F)
+        return stmt.on_conflict_do_update(
+            index_elements=list(FACT_NATURAL_KEY),
+            set_={c: stmt.excluded[c] for c in FACT_UPDATE_COLUMNS},
+        )
+    from sqlalchemy.dialects import mysql as mysql_dialect  # solo en despliegues MySQL
+    stmt = mysql_dialect.insert(F)
+    return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in FACT_UPDATE_COLUMNS})
+
+
+def staging_table(name: str, source, keys) -> Table:
+    """Tabla temporal (pos, claves) con los tipos de las columnas de source."""
+    return Table(name, STAGING, Column("pos", Integer, primary_key=True),
+                 *(Column(c, source.c[c].type) for c in keys), prefixes=["TEMPORARY"])
+
+
+def stage(conn, table: Table, rows: list[dict]):
+    """Carga rows en la tabla temporal de la conexión: la crea la primera vez y la vacía antes."""
+    table.create(conn, checkfirst=True)
+    conn.execute(delete(table))
+    if rows:
+        conn.execute(insert(table), rows)
+
+
+STAGED_FACT_KEYS = staging_table("import_fact_keys", F, FACT_NATURAL_KEY)
+
+
+def existing_rows(conn, keys, ids: dict, columns: list[str]) -> list[tuple]:
+    """Como ingest.existing_rows pero sobre el hecho: [(pos, valores de columns)] de las
+    claves de keys (pos + clave natural en textos) que ya están guardadas. Las claves van
+    con sus ids a una tabla temporal y se cruzan en un solo join contra el índice único."""
+    staged = keys.select(
+        "pos", "id_conjunto", pl.col("pv").replace_strict(ids["pv"], return_dtype=pl.Int64).alias("store_id"),
+        pl.col("codigo_barra").replace_strict(ids["codigo_barra"], return_dtype=pl.Int64).alias("sku_id"),
+        "fecha_hora_medicion")
+    S = STAGED_FACT_KEYS
+    stage(conn, S, staged.to_dicts())
+    cols, frm = _fact_columns(columns)
+    on = and_(*(F.c[c] == S.c[c] for c in FACT_NATURAL_KEY))
+    return [tuple(r) for r in conn.execute(select(S.c.pos, *cols).select_from(frm.join(S, on)))]
+
+
+# ---------- migración ----------
+def migrate(bind=engine, batch: int = 50_000, drop_wide: bool = False) -> dict:
+    """Copia measurements → measurement_fact conservando los ids (cursores y enlaces
+    siguen valiendo). Correr con las importaciones detenidas; se puede interrumpir y
+    repetir: continúa desde el último id copiado. Verifica conteo y sumas de flags
+    antes de vaciar la tabla ancha."""
+    Base.metadata.create_all(bind)
+    # stores.name_norm en BDs previas (import tardío: store_search importa este módulo)
+    from .store_search import ensure_search
+    ensure_search(bind)
+    cols = ["id", *MEASUREMENT_COLUMNS]
+    M = Measurement.__table__
+    with bind.connect() as conn:
+        last = conn.execute(select(func.max(F.c.id))).scalar() or 0
+    copied = 0
+    # lotes por keyset de id, cada uno en su transacción: no queda un cursor de lectura
+    # abierto mientras se escribe (en SQLite bloquearía la escritura)
+    while True:
+        with bind.begin() as conn:
+            part = conn.execute(select(*(M.c[c] for c in cols)).where(M.c.id > last).order_by(M.c.id).limit(batch)).all()
+            if not part:
+                break
+            rows = [dict(zip(cols, r)) for r in part]
+            dims = DimensionBatch()
+            ids = dims.resolve_rows(conn, rows)
+            conn.execute(insert(F).prefix_with("OR IGNORE", dialect="sqlite").prefix_with("IGNORE", dialect="mysql"),
+                         [fact_row(r, ids) for r in rows])
+        dims.publish()
+        copied += len(rows)
+        last = rows[-1]["id"]
+        log.info("migración: %d filas copiadas (hasta id %d)", copied, last)
+
+    cols, frm = _fact_columns(["osa_flag", "oos_flag"])
+    fact = select(*cols).select_from(frm).subquery("fact")
+    with bind.connect() as conn:
+        wide = tuple(int(x or 0) for x in conn.execute(
+            select(func.count(), func.sum(M.c.osa_flag), func.sum(M.c.oos_flag))).one())
+        narrow = tuple(int(x or 0) for x in conn.execute(
+            select(func.count(), func.sum(fact.c.osa_flag), func.sum(fact.c.oos_flag))).one())
+    # measurements vacía: ya se migró y vació (--drop-wide) o nunca tuvo filas
+    result = {"copied": copied, "wide": wide, "normalized": narrow, "ok": wide == narrow or wide[0] == 0}
+    if drop_wide and result["ok"]:
+        with bind.begin() as conn:
+            conn.execute(delete(M))
+        result["wide_deleted"] = wide[0]
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    ap = argparse.ArgumentParser(prog="python -m backend.storage")
+    ap.add_argument("command", choices=["migrate"])
+    ap.add_argument("--batch", type=int, default=50_000)
+    ap.add_argument("--drop-wide", action="store_true", help="vaciar measurements si la verificación coincide")
+    args = ap.parse_args()
+    res = migrate(batch=args.batch, drop_wide=args.drop_wide)
+    print(f"copiadas: {res['copied']}  measurements (filas, osa, oos): {res['wide']}  "
+          f"measurement_fact: {res['normalized']}  {'OK' if res['ok'] else 'NO COINCIDEN'}")
+    if res.get("wide_deleted"):
+        print(f"measurements vaciada ({res['wide_deleted']} filas); activar MEASUREMENT_STORAGE=normalized")
+    raise SystemExit(0 if res["ok"] else 1)
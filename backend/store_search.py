@@ -0,0 +1,183 @@
+# backend/store_search.py
+# Búsqueda de tiendas para el selector de PV (type-ahead sobre decenas de miles de PV):
+# - stores.name_norm = normalize_name(name) con índice único: el chequeo de duplicados
+#   y las búsquedas por prefijo son un rango del índice, no un LOWER(name) por fila.
+# - Índice de texto sobre name_norm para encontrar q en cualquier parte del nombre:
+#   SQLite FTS5 con tokenizer trigram (stores_fts, sincronizada por triggers) o FULLTEXT
+#   con parser ngram en MySQL. Consultas más cortas que un n-grama usan solo el prefijo;
+#   sin índice de texto (SQLite < 3.34) se cae a LIKE '%q%'.
+# - Orden: exacta y prefijo (rango 0), palabra que empieza con q (1), resto (2); dentro
+#   de cada rango por name_norm e id. Páginas keyset sobre (rango, name_norm, id).
+# - Las importaciones dan de alta las tiendas nuevas (storage.DimensionBatch); el primer
+#   sync del esquema crea las que ya estaban en measurements.
+import base64
+import json
+import logging
+from sqlalchemy import select, update, func, case, tuple_, and_, text, inspect, bindparam, literal_column, Index
+from sqlalchemy.exc import OperationalError, ProgrammingError, IntegrityError
+from sqlalchemy.orm import Session
+from .db import engine
+from .models import Store
+from .normalize import normalize_name
+from . import storage
+
+log = logging.getLogger("uvicorn.error")
+
+FTS_TABLE = "stores_fts"
+FULLTEXT_INDEX = "ft_stores_name_norm"
+S = Store.__table__
+
+_SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name_norm, content='stores', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER stores_fts_ai AFTER INSERT ON stores BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name_norm) VALUES (new.id, new.name_norm); END""",
+    f"""CREATE TRIGGER stores_fts_ad AFTER DELETE ON stores BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name_norm) VALUES ('delete', old.id, old.name_norm); END""",
+    f"""CREATE TRIGGER stores_fts_au AFTER UPDATE OF name_norm ON stores BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name_norm) VALUES ('delete', old.id, old.name_norm);
+        INSERT INTO {FTS_TABLE}(rowid, name_norm) VALUES (new.id, new.name_norm); END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+# ---------- esquema ----------
+def ensure_search(bind=engine):
+    """name_norm (columna, backfill, índice único), índice de texto y tiendas de measurements."""
+    insp = inspect(bind)
+    with bind.begin() as conn:
+        if "name_norm" not in {c["name"] for c in insp.get_columns("stores")}:
+            conn.execute(text("ALTER TABLE stores ADD COLUMN name_norm VARCHAR(120)"))
+        rows = conn.execute(select(S.c.id, S.c.name).where(S.c.name_norm.is_(None))).all()
+        if rows:
+            conn.execute(update(S).where(S.c.id == bindparam("_id")).values(name_norm=bindparam("_norm")),
+                         [{"_id": i, "_norm": normalize_name(n)} for i, n in rows])
+    indexes = {ix["name"] for ix in inspect(bind).get_indexes("stores")}
+    if "uq_stores_name_norm" not in indexes:
+        try:
+            Index("uq_stores_name_norm", S.c.name_norm, unique=True).create(bind)
+        except IntegrityError:
+            # nombres que solo difieren en mayúsculas/tildes cargados antes de name_norm
+            log.warning("stores: nombres duplicados tras normalizar; índice name_norm sin UNIQUE")
+            Index("uq_stores_name_norm", S.c.name_norm).create(bind)
+    _ensure_text_index(bind, indexes)
+    created = sync_from_measurements(bind)
+    if created:
+        log.info("stores: %d tiendas nuevas desde measurements", created)
+
+
+def _ensure_text_index(bind, indexes: set):
+    try:
+        with bind.begin() as conn:
+            if bind.dialect.name == "sqlite":
+                if conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :n"), {"n": FTS_TABLE}).first():
+                    return
+                for stmt in _SQLITE_FTS:
+                    conn.execute(text(stmt))
+            elif FULLTEXT_INDEX not in indexes:
+                conn.execute(text(f"ALTER TABLE stores ADD FULLTEXT INDEX {FULLTEXT_INDEX} (name_norm) WITH PARSER ngram"))
+    except (OperationalError, ProgrammingError) as e:
+        log.warning("stores: sin índice de texto (%s); la búsqueda usa LIKE", str(e).splitlines()[0])
+
+
+def sync_from_measurements(bind=engine) -> int:
+    """Crea en stores los pv de measurements que falten (modo wide; en normalized el pv
+    ya es stores). Devuelve cuántas tiendas se crearon."""
+    if storage.normalized():
+        return 0
+    m = storage.measurements().c
+    with bind.begin() as conn:
+        before = conn.execute(select(func.count()).select_from(S)).scalar()
+        known = set(conn.execute(select(S.c.name_norm)).scalars())
+        rows = [
+            {"pv": pv, "provincia": provincia, "formato": formato, "cliente": cliente}
+            for pv, provincia, formato, cliente in conn.execute(
+                select(m.pv, func.min(m.provincia), func.min(m.formato), func.min(m.cliente))
+                .where(m.pv.is_not(None)).group_by(m.pv))
+            if normalize_name(pv) not in known
+        ]
+        if rows:
+            storage.DimensionBatch().resolve_stores(conn, rows)
+        return conn.execute(select(func.count()).select_from(S)).scalar() - before
+
+
+# ---------- búsqueda ----------
+_text_index: dict = {}  # url de la BD → hay índice de texto
+
+
+def _has_text_index(bind) -> bool:
+    key = str(bind.url)
+    if key not in _text_index:
+        if bind.dialect.name == "sqlite":
+            with bind.connect() as conn:
+                found = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :n"), {"n": FTS_TABLE}).first()
+        else:
+            found = FULLTEXT_INDEX in {ix["name"] for ix in inspect(bind).get_indexes("stores")}
+        _text_index[key] = bool(found)
+    return _text_index[key]
+
+
+def _min_gram(bind) -> int:
+    # trigram de FTS5; ngram_token_size por defecto de MySQL
+    return 3 if bind.dialect.name == "sqlite" else 2
+
+
+def _phrase(q: str) -> str:
+    return '"' + q.replace('"', " ").strip() + '"'
+
+
+def _prefix(q: str):
+    # rango del índice único: en orden de name_norm la coincidencia exacta va primero
+    return and_(S.c.name_norm >= q, S.c.name_norm < q + "\U0010ffff")
+
+
+def _contains(bind, q: str):
+    if not _has_text_index(bind):
+        return S.c.name_norm.contains(q, autoescape=True)
+    if bind.dialect.name == "sqlite":
+        fts = (select(literal_column("rowid")).select_from(text(FTS_TABLE))
+               .where(text(f"{FTS_TABLE} MATCH :fts_q").bindparams(fts_q=_phrase(q))))
+        return S.c.id.in_(fts)
+    return text("MATCH (stores.name_norm) AGAINST (:fts_q IN BOOLEAN MODE)").bindparams(fts_q=_phrase(q))
+
+
+def encode_cursor(rank: int, name_norm: str, id_: int) -> str:
+    raw = json.dumps([rank, name_norm, id_]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[int, str, int]:
+    """ValueError si el cursor no es válido."""
+    try:
+        rank, name_norm, id_ = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return int(rank), str(name_norm), int(id_)
+    except Exception as e:
+        raise ValueError("cursor inválido") from e
+
+
+def search(db: Session, q: str | None, limit: int = 20, cursor: str | None = None) -> tuple[list[Store], str | None]:
+    """(tiendas de la página, cursor de la siguiente o None). Sin q: orden alfabético.
+    Rango 0 (exacta y prefijo) se lee en orden del índice y corta en el LIMIT; los rangos
+    1 (palabra que empieza con q) y 2 (resto) salen del índice de texto y solo se
+    consultan si el prefijo no llena la página."""
+    bind = db.get_bind()
+    qn = normalize_name(q)
+    after = decode_cursor(cursor) if cursor else None
+    rows = []
+    if after is None or after[0] == 0:
+        stmt = select(Store).where(_prefix(qn)) if qn else select(Store)
+        if after:
+            stmt = stmt.where(tuple_(S.c.name_norm, S.c.id) > tuple_(after[1], after[2]))
+        rows += [(0, s) for s in db.scalars(stmt.order_by(S.c.name_norm, S.c.id).limit(limit + 1))]
+    if len(rows) <= limit and len(qn) >= _min_gram(bind):
+        rank = case((S.c.name_norm.contains(" " + qn, autoescape=True), 1), else_=2)
+        stmt = select(Store, rank.label("rank")).where(_contains(bind, qn), ~_prefix(qn))
+        if after and after[0] > 0:
+            stmt = stmt.where(tuple_(rank, S.c.name_norm, S.c.id) > tuple_(*after))
+        stmt = stmt.order_by(rank, S.c.name_norm, S.c.id).limit(limit + 1 - len(rows))
+        rows += [(r, s) for s, r in db.execute(stmt)]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not more:
+        return [s for _, s in rows], None
+    rank, last = rows[-1]
+    return [s for _, s in rows], encode_cursor(rank, last.name_norm, last.id)
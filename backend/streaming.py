@@ -0,0 +1,144 @@
+# backend/streaming.py
+# Ingesta en streaming con memoria acotada: el upload se vuelca a un archivo
+# temporal y se lee por bloques de filas (openpyxl read-only, CSV o Parquet);
+# cada bloque se limpia e inserta antes de leer el siguiente. En .xlsx openpyxl carga
+# entera la tabla de textos compartidos: crece con los textos distintos, no con las
+# filas (benchmarks/streaming_memory.py mide ambos formatos). .xls se rechaza.
+from __future__ import annotations
+import hashlib
+import io
+import os
+import tempfile
+from .db import engine
+from .ingest import IngestStats, bulk_insert
+from .normalize import normalize
+from .metrics import import_stage, timed_frames
+from .lazy import lazy_import
+
+pl = lazy_import("polars")
+
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "20000"))
+FORMATS = (".xlsx", ".csv", ".parquet")
+SPOOL_BLOCK = 1024 * 1024  # 1 MiB por lectura del upload
+
+
+async def spool_upload(file, directory: str | None = None) -> tuple[str, str]:
+    """Copia el UploadFile a disco por bloques; devuelve (ruta, sha256). El llamador borra la ruta."""
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    digest = hashlib.sha256()
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            block = await file.read(SPOOL_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+    return path, digest.hexdigest()
+
+
+def _as_str(v):
+    # equivalente a dtype=str: todo a texto salvo celdas vacías
+    return None if v is None else str(v)
+
+
+def _frame(header: list, rows: list) -> pl.DataFrame:
+    return pl.DataFrame(rows, schema={h: pl.Utf8 for h in header}, orient="row")
+
+
+def _iter_xlsx(source, chunk_rows: int):
+    from openpyxl import load_workbook
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else f"col_{i}" for i, h in enumerate(next(rows, []))]
+        buf, emitted = [], False
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            vals = [_as_str(v) for v in row[:len(header)]]
+            buf.append(vals + [None] * (len(header) - len(vals)))
+            if len(buf) >= chunk_rows:
+                yield _frame(header, buf)
+                buf, emitted = [], True
+        if buf or not emitted:
+            # aun sin filas se emite el encabezado para validar columnas
+            yield _frame(header, buf)
+    finally:
+        wb.close()
+
+
+def _iter_csv(path: str, chunk_rows: int):
+    # bloques de líneas leídos del archivo: read_csv_batched mapea el CSV entero en memoria
+    # y el RSS crecía con el tamaño del archivo. Con comillas sin cerrar la fila sigue en
+    # la línea siguiente (saltos de línea dentro de un campo).
+    with open(path, "rb") as fh:
+        header = fh.readline().removeprefix(b"\xef\xbb\xbf")
+        emitted = False
+        while True:
+            lines, quoted = [], False
+            for line in fh:
+                lines.append(line)
+                if line.count(b'"') % 2:
+                    quoted = not quoted
+                if not quoted and len(lines) >= chunk_rows:
+                    break
+            if not lines and emitted:
+                break
+            # aun sin filas se emite el encabezado para validar columnas
+            yield pl.read_csv(header + b"".join(lines), infer_schema_length=0)
+            emitted = True
+            if not lines:
+                break
+
+
+def _iter_parquet(path: str, chunk_rows: int):
+    lf = pl.scan_parquet(path)
+    lf = lf.with_columns(pl.all().cast(pl.Utf8))
+    total = lf.select(pl.len()).collect().item()
+    for offset in range(0, total, chunk_rows):
+        yield lf.slice(offset, chunk_rows).collect()
+
+
+def iter_frames(path: str, chunk_rows: int | None = None):
+    """Genera DataFrames Polars (todo texto) de a chunk_rows filas según la extensión."""
+    chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xlsx":
+        yield from _iter_xlsx(path, chunk_rows)
+    elif ext == ".csv":
+        yield from _iter_csv(path, chunk_rows)
+    elif ext == ".parquet":
+        yield from _iter_parquet(path, chunk_rows)
+    else:
+        # .xls (binario de Excel 97-2003) no se puede leer por bloques: se rechaza
+        raise ValueError(unsupported_format(ext))
+
+
+def unsupported_format(ext: str) -> str:
+    if ext == ".xls":
+        return "Formato .xls (Excel 97-2003) no soportado: guardar el archivo como .xlsx o .csv"
+    return f"Formato {ext or 'sin extensión'} no soportado (usar {', '.join(FORMATS)})"
+
+
+def read_xlsx(source) -> pl.DataFrame:
+    """Lee un .xlsx completo (ruta o buffer) en un solo DataFrame."""
+    return pl.concat(list(_iter_xlsx(source, 1_000_000_000)))
+
+
+def ingest_file(path: str, chunk_rows: int | None = None, chunk_size: int | None = None,
+                bind=engine, on_progress=None, **normalize_opts) -> IngestStats:
+    """Lee, normaliza e inserta bloque a bloque (opciones → normalize.normalize).
+
+    on_progress(stats) se llama después de cada bloque (progreso de jobs).
+    """
+    stats = IngestStats()
+    for frame in timed_frames(iter_frames(path, chunk_rows)):
+        with import_stage("clean", frame.height):
+            cleaned = normalize(frame, **normalize_opts)
+        del frame
+        if cleaned.height:
+            stats.merge(bulk_insert(cleaned, chunk_size=chunk_size, bind=bind))
+        if on_progress:
+            on_progress(stats)
+    return stats
@@ -0,0 +1,67 @@
+# backend/worker.py
+# Proceso de importaciones para IMPORT_MODE=queue: toma los jobs "queued" de la
+# tabla import_jobs (claim atómico, se pueden correr varios) y los ejecuta con
+# IMPORT_WORKERS hilos. Las invalidaciones llegan a los workers web por shared_state.
+# Uso: python -m backend.worker
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from . import jobs  # noqa: E402
+from .schema import sync_schema  # noqa: E402
+
+IMPORT_POLL_SECONDS = float(os.getenv("IMPORT_POLL_SECONDS", "1.0"))
+
+log = logging.getLogger("backend.worker")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    sync_schema()
+    if os.getenv("IMPORT_REQUEUE_ON_STARTUP", "true").lower() == "true":
+        jobs.requeue_interrupted()
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    running = set()
+    lock = threading.Lock()
+    reaped_at = time.monotonic()
+    log.info("worker de importaciones: %d hilos, sondeo cada %.1f s", jobs.IMPORT_WORKERS, IMPORT_POLL_SECONDS)
+    with ThreadPoolExecutor(max_workers=jobs.IMPORT_WORKERS, thread_name_prefix="import") as pool:
+        while not stop.is_set():
+            with lock:
+                free = jobs.IMPORT_WORKERS - len(running)
+            if free > 0:
+                for job_id in jobs.queued_ids(free):
+                    with lock:
+                        if job_id in running:
+                            continue
+                        running.add(job_id)
+                    log.info("job %s", job_id)
+                    future = pool.submit(jobs.run_job, job_id)
+                    future.add_done_callback(lambda _f, j=job_id: _finished(running, lock, j))
+            # jobs de un proceso caído (sin latido) vuelven a la cola sin esperar un reinicio
+            if time.monotonic() - reaped_at > jobs.IMPORT_STALE_SECONDS:
+                jobs.requeue_interrupted()
+                reaped_at = time.monotonic()
+            stop.wait(IMPORT_POLL_SECONDS)
+        # al salir se espera a los jobs en curso (graceful); uno cortado a medias
+        # vuelve a la cola con requeue_interrupted (otro worker o el próximo arranque)
+        log.info("deteniendo: esperando %d jobs en curso", len(running))
+
+
+def _finished(running: set, lock: threading.Lock, job_id: str):
+    with lock:
+        running.discard(job_id)
+
+
+if __name__ == "__main__":
+    main()
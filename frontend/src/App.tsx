@@ -15,7 +15,7 @@ const BASE_URL =
 
 const API = (path: string) => `${BASE_URL}${path}`;
 
-type SeriesItem = { date: string; osa_pct: number };
+type SeriesItem = { date: string; osa_pct: number; n?: number; ma_osa_pct?: number; osa_ci?: [number, number] };
 type WorstItem = { barcode: string; osa_pct: number };
 type KPIResponse = {
   total: number;
@@ -23,6 +23,33 @@ type KPIResponse = {
   oos_pct: number;
   series: SeriesItem[];
   worst_sku?: WorstItem[];
+  // solo con approx=true: intervalos de confianza y tamaño de la muestra
+  approx?: { confidence: number; osa_ci: [number, number]; oos_ci: [number, number]; sample_rows: number };
+};
+// evento "delta" de /api/kpis/stream: puntos nuevos o cambiados, labels quitados y
+// totales; worst_sku solo si cambió
+type KPIDelta = {
+  total: number;
+  osa_pct: number;
+  oos_pct: number;
+  series: SeriesItem[];
+  removed: string[];
+  worst_sku?: WorstItem[];
+};
+
+const applyDelta = (prev: KPIResponse, d: KPIDelta): KPIResponse => {
+  const byDate = new Map(prev.series.map((p) => [p.date, p]));
+  d.removed.forEach((label) => byDate.delete(label));
+  d.series.forEach((p) => byDate.set(p.date, p));
+  const series = Array.from(byDate.values()).sort((a, b) => a.date.localeCompare(b.date));
+  return {
+    ...prev,
+    total: d.total,
+    osa_pct: d.osa_pct,
+    oos_pct: d.oos_pct,
+    series,
+    worst_sku: d.worst_sku ?? prev.worst_sku,
+  };
 };
 
 export default function App() {
@@ -38,58 +65,24 @@ export default function App() {
   const [lineChart, setLineChart] = useState<Chart | null>(null);
   const [pieChart, setPieChart] = useState<Chart | null>(null);
   const [loading, setLoading] = useState(false);
+  // filtros aplicados (query de /api/kpis) que sigue el stream en vivo
+  const [liveQuery, setLiveQuery] = useState<string | null>(null);
 
   // --- filtros / visual ---
   const [store, setStore] = useState("");
+  const [storeOptions, setStoreOptions] = useState<string[]>([]);
   const [dateFrom, setDateFrom] = useState("");
   const [dateTo, setDateTo] = useState("");
   const [groupBy, setGroupBy] = useState<"day" | "week" | "month">("day");
   const [showMA, setShowMA] = useState(true);
   const [target, setTarget] = useState<number>(95);
+  // rangos largos: muestra + sketches en el backend (responde con intervalos de confianza)
+  const [approx, setApprox] = useState(false);
 
-  // ---- helpers de fechas/agrupación ----
-  const parseD = (s: string) => {
-    const [y, m, d] = s.split("-").map((x) => parseInt(x, 10));
-    return new Date(y, (m || 1) - 1, d || 1);
-  };
-
-  const keyWeek = (dt: Date) => {
-    // ISO week (aproximado)
-    const tmp = new Date(Date.UTC(dt.getFullYear(), dt.getMonth(), dt.getDate()));
-    const dayNum = tmp.getUTCDay() || 7;
-    tmp.setUTCDate(tmp.getUTCDate() + 4 - dayNum);
-    const yearStart = new Date(Date.UTC(tmp.getUTCFullYear(), 0, 1));
-    const weekNo = Math.ceil(((+tmp - +yearStart) / 86400000 + 1) / 7);
-    return `${tmp.getUTCFullYear()}-W${String(weekNo).padStart(2, "0")}`;
-    // ejemplo: 2025-W34
-  };
-
-  const groupSeries = (series: SeriesItem[], mode: "day" | "week" | "month"): SeriesItem[] => {
-    if (mode === "day") return series;
-    const buckets = new Map<string, number[]>();
-    for (const it of series) {
-      const d = parseD(it.date);
-      const key = mode === "week" ? keyWeek(d) : `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, "0")}`;
-      if (!buckets.has(key)) buckets.set(key, []);
-      buckets.get(key)!.push(it.osa_pct);
-    }
-    return Array.from(buckets.entries())
-      .sort((a, b) => (a[0] < b[0] ? -1 : 1))
-      .map(([key, arr]) => ({
-        date: key,
-        osa_pct: Math.round((arr.reduce((s, x) => s + x, 0) / arr.length) * 100) / 100,
-      }));
-  };
-
-  const movingAverage = (arr: number[], win = 7) => {
-    const out: number[] = [];
-    for (let i = 0; i < arr.length; i++) {
-      const start = Math.max(0, i - win + 1);
-      const slice = arr.slice(start, i + 1);
-      out.push(Math.round((slice.reduce((s, x) => s + x, 0) / slice.length) * 100) / 100);
-    }
-    return out;
-  };
+  // la agrupación (día/semana/mes, ponderada por mediciones), la media móvil y la
+  // reducción de puntos (LTTB) se hacen en el backend
+  const MA_WINDOW = 7;
+  const MAX_POINTS = 400;
 
   // ---- login ----
   const handleLogin = async () => {
@@ -113,6 +106,7 @@ export default function App() {
   const handleLogout = () => {
     setLoggedIn(false);
     setKpis(null);
+    setLiveQuery(null);
     if (lineChart) {
       lineChart.destroy();
       setLineChart(null);
@@ -132,17 +126,23 @@ export default function App() {
       if (store.trim()) query.set("store", store.trim());
       if (dateFrom) query.set("date_from", dateFrom);
       if (dateTo) query.set("date_to", dateTo);
-      const url = API(`/api/kpis${query.toString() ? `?${query}` : ""}`);
+      query.set("group_by", groupBy);
+      query.set("ma_window", String(MA_WINDOW));
+      query.set("max_points", String(MAX_POINTS));
+      if (approx) query.set("approx", "true");
+      const url = API(`/api/kpis?${query}`);
       const res = await fetch(url);
       if (!res.ok) throw new Error("Error cargando KPIs");
       const data: KPIResponse = await res.json();
       setKpis(data);
+      // el stream en vivo envía valores exactos: no se sigue en modo aproximado
+      setLiveQuery(approx ? null : query.toString());
 
-      // preparar series (agrupadas + MA opcional)
-      const series = groupSeries(data.series || [], groupBy);
+      // series ya agrupadas por el backend (+ MA opcional)
+      const series = data.series || [];
       const labels = series.map((x) => x.date);
       const values = series.map((x) => x.osa_pct);
-      const valuesMA = showMA ? movingAverage(values, 7) : [];
+      const valuesMA = showMA ? series.map((x) => x.ma_osa_pct ?? x.osa_pct) : [];
 
       // LINE
       const lineEl = document.getElementById("lineChart") as HTMLCanvasElement | null;
@@ -166,7 +166,7 @@ export default function App() {
               ...(showMA
                 ? [
                     {
-                      label: "Media móvil (7)",
+                      label: `Media móvil (${MA_WINDOW})`,
                       data: valuesMA,
                       borderDash: [6, 6],
                       pointRadius: 0,
@@ -261,16 +261,62 @@ export default function App() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [loggedIn]);
 
-  // recalcular cuando cambie solo visual (groupBy, showMA, target), sin refetch
+  // actualizaciones en vivo: tras cada importación el backend envía por SSE solo lo que
+  // cambió para estos filtros (sin volver a pedir /api/kpis); EventSource reconecta solo
+  useEffect(() => {
+    if (!loggedIn || !liveQuery) return;
+    const es = new EventSource(API(`/api/kpis/stream?${liveQuery}`));
+    es.addEventListener("snapshot", (ev) => setKpis(JSON.parse((ev as MessageEvent).data)));
+    es.addEventListener("delta", (ev) => {
+      const delta: KPIDelta = JSON.parse((ev as MessageEvent).data);
+      setKpis((prev) => (prev ? applyDelta(prev, delta) : prev));
+    });
+    return () => es.close();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [loggedIn, liveQuery]);
+
+  // sugerencias del selector de PV (búsqueda indexada en el backend); se cancela la
+  // petición anterior en cada tecla
+  useEffect(() => {
+    if (!loggedIn) return;
+    const q = store.trim();
+    if (!q) {
+      setStoreOptions([]);
+      return;
+    }
+    const ctrl = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const res = await fetch(API(`/api/stores/search?${new URLSearchParams({ q, limit: "10" })}`), { signal: ctrl.signal });
+        if (!res.ok) return;
+        const data: { items: { name: string }[] } = await res.json();
+        setStoreOptions(data.items.map((s) => s.name));
+      } catch {
+        /* abortada o sin red: se mantienen las sugerencias previas */
+      }
+    }, 120);
+    return () => {
+      clearTimeout(timer);
+      ctrl.abort();
+    };
+  }, [store, loggedIn]);
+
+  // cambiar la agrupación pide al backend la serie con los nuevos buckets
+  useEffect(() => {
+    if (!loggedIn || !kpis) return;
+    applyFilters();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [groupBy]);
+
+  // recalcular cuando cambie solo visual (showMA, target) o llegue un evento en vivo, sin refetch
   useEffect(() => {
     if (!loggedIn || !kpis) return;
     (async () => {
       // rehacer charts con datos locales
-      const data = kpis;
-      const series = groupSeries(data.series || [], groupBy);
+      const series = kpis.series || [];
       const labels = series.map((x) => x.date);
       const values = series.map((x) => x.osa_pct);
-      const valuesMA = showMA ? movingAverage(values, 7) : [];
+      const valuesMA = showMA ? series.map((x) => x.ma_osa_pct ?? x.osa_pct) : [];
 
       if (lineChart) {
         lineChart.data.labels = labels as any;
@@ -280,7 +326,7 @@ export default function App() {
             lineChart.data.datasets[1].data = valuesMA as any;
           } else {
             lineChart.data.datasets.push({
-              label: "Media móvil (7)",
+              label: `Media móvil (${MA_WINDOW})`,
               data: valuesMA,
               borderDash: [6, 6],
               pointRadius: 0,
@@ -296,15 +342,19 @@ export default function App() {
            (lineChart.options.plugins as any).annotation.annotations.targetLine.yMax = target);
         lineChart.update();
       }
+      if (pieChart) {
+        pieChart.data.datasets[0].data = [kpis.osa_pct, kpis.oos_pct];
+        pieChart.update();
+      }
     })();
     // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [groupBy, showMA, target]);
+  }, [showMA, target, kpis]);
 
   // export CSV de la serie actual (post-agrupación)
   const exportCSV = () => {
     if (!kpis) return;
-    const series = groupSeries(kpis.series || [], groupBy);
-    const rows = [["date", "osa_pct"], ...series.map((r) => [r.date, String(r.osa_pct)])];
+    const series = kpis.series || [];
+    const rows = [["date", "osa_pct", "n"], ...series.map((r) => [r.date, String(r.osa_pct), String(r.n ?? "")])];
     const csv = rows.map((r) => r.join(",")).join("\n");
     const blob = new Blob([csv], { type: "text/csv;charset=utf-8;" });
     const url = URL.createObjectURL(blob);
@@ -344,7 +394,12 @@ export default function App() {
       <section className="card" style={{ display: "grid", gap: 8, gridTemplateColumns: "repeat(6, minmax(120px, 1fr))", alignItems: "end", padding: 12 }}>
         <div>
           <label>PV</label>
-          <input value={store} onChange={(e) => setStore(e.target.value)} placeholder="Tienda (PV)" />
+          <input list="pv-options" value={store} onChange={(e) => setStore(e.target.value)} placeholder="Tienda (PV)" />
+          <datalist id="pv-options">
+            {storeOptions.map((name) => (
+              <option key={name} value={name} />
+            ))}
+          </datalist>
         </div>
         <div>
           <label>Desde</label>
@@ -370,6 +425,7 @@ export default function App() {
           <label>Opciones</label>
           <div style={{ display: "flex", gap: 8 }}>
             <label><input type="checkbox" checked={showMA} onChange={(e) => setShowMA(e.target.checked)} /> MA(7)</label>
+            <label><input type="checkbox" checked={approx} onChange={(e) => setApprox(e.target.checked)} /> Aproximado</label>
             <button onClick={exportCSV}>Exportar CSV</button>
             <button onClick={applyFilters} disabled={loading}>{loading ? "Cargando..." : "Aplicar"}</button>
           </div>
@@ -382,14 +438,16 @@ export default function App() {
           <div className="kpi ok">
             <div className="kpi-title">OSA</div>
             <div className="kpi-value">{(kpis.osa_pct ?? 0).toFixed(2)}%</div>
+            {kpis.approx && <div className="kpi-title">IC {kpis.approx.confidence * 100}%: {kpis.approx.osa_ci[0]}–{kpis.approx.osa_ci[1]}%</div>}
           </div>
           <div className="kpi bad">
             <div className="kpi-title">OOS</div>
             <div className="kpi-value">{(kpis.oos_pct ?? 0).toFixed(2)}%</div>
+            {kpis.approx && <div className="kpi-title">IC {kpis.approx.confidence * 100}%: {kpis.approx.oos_ci[0]}–{kpis.approx.oos_ci[1]}%</div>}
           </div>
           <div className="kpi">
             <div className="kpi-title">Registros</div>
-            <div className="kpi-value">{kpis.total ?? 0}</div>
+            <div className="kpi-value">{kpis.approx ? "≈ " : ""}{kpis.total ?? 0}</div>
           </div>
         </section>
       )}
@@ -2,16 +2,68 @@ import api from "../api";
 
 export interface ImportResponse {
   inserted: number;
+  updated: number;
+  unchanged: number;
   skipped: number;
   total_rows: number;
+  duplicate_file?: boolean;
 }
 
-export async function importarExcel(file: File): Promise<ImportResponse> {
+export interface ImportJob {
+  id: string;
+  filename: string;
+  status: "queued" | "running" | "done" | "failed";
+  rows_processed: number;
+  inserted: number;
+  updated: number;
+  unchanged: number;
+  rows_skipped: number;
+  throughput: number;
+  error: string | null;
+}
+
+export async function getImportJob(id: string): Promise<ImportJob> {
+  const res = await api.get<ImportJob>(`/api/import/jobs/${id}`);
+  return res.data;
+}
+
+// El backend responde 202 con un job_id; se consulta el progreso hasta que termine.
+export async function importarExcel(
+  file: File,
+  onProgress?: (job: ImportJob) => void,
+  intervalMs = 1000
+): Promise<ImportResponse> {
   const formData = new FormData();
   formData.append("file", file);
 
-  const res = await api.post<ImportResponse>("/api/import/excel", formData, {
-    headers: { "Content-Type": "multipart/form-data" },
-  });
-  return res.data;
-}
\ No newline at end of file
+  const res = await api.post<{ job_id?: string; duplicate_file?: boolean; unchanged?: number }>(
+    "/api/import/excel",
+    formData,
+    { headers: { "Content-Type": "multipart/form-data" } }
+  );
+
+  // archivo idéntico a uno ya importado: el backend no lo procesa
+  const jobId = res.data.job_id;
+  if (!jobId) {
+    const unchanged = res.data.unchanged ?? 0;
+    return { inserted: 0, updated: 0, unchanged, skipped: 0, total_rows: unchanged, duplicate_file: true };
+  }
+
+  for (;;) {
+    const job = await getImportJob(jobId);
+    onProgress?.(job);
+    if (job.status === "done") {
+      return {
+        inserted: job.inserted,
+        updated: job.updated,
+        unchanged: job.unchanged,
+        skipped: job.rows_skipped,
+        total_rows: job.rows_processed + job.rows_skipped,
+      };
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error || "La importación falló");
+    }
+    await new Promise((r) => setTimeout(r, intervalMs));
+  }
+}
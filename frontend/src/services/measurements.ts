@@ -13,7 +13,32 @@ export interface Measurement {
   oos_flag: number;
 }
 
+export interface MeasurementPage {
+  items: Measurement[];
+  next_cursor: string | null;
+}
+
+export interface MeasurementQuery {
+  store?: string;
+  date_from?: string;
+  date_to?: string;
+  limit?: number;
+  cursor?: string | null;
+}
+
 export async function getMeasurements(): Promise<Measurement[]> {
-  const res = await api.get<{ items: Measurement[] }>("/api/measurements");
+  const res = await api.get<MeasurementPage>("/api/measurements");
   return res.data.items;
-}
\ No newline at end of file
+}
+
+// Página siguiente: pasar el next_cursor de la respuesta anterior
+export async function getMeasurementsPage(query: MeasurementQuery = {}): Promise<MeasurementPage> {
+  const res = await api.get<MeasurementPage>("/api/measurements", { params: query });
+  return res.data;
+}
+
+export function measurementsExportUrl(query: Omit<MeasurementQuery, "limit" | "cursor">, format: "csv" | "ndjson" = "csv"): string {
+  const params = new URLSearchParams({ format });
+  Object.entries(query).forEach(([k, v]) => v && params.set(k, v));
+  return `${api.defaults.baseURL ?? ""}/api/measurements/export?${params}`;
+}
@@ -1,6 +1,43 @@
 import api from "../api";
 
-export async function getUsers() {
-  const res = await api.get("/users");
+export interface User {
+  id: number;
+  username: string;
+  email: string;
+  role: string;
+  active: boolean;
+}
+
+export interface UserCreate extends Omit<User, "id"> {
+  password: string;
+}
+
+export interface UserPage {
+  items: User[];
+  next_cursor: number | null;
+}
+
+export interface UserQuery {
+  q?: string;
+  role?: string;
+  active?: boolean;
+  limit?: number;
+  cursor?: number | null;
+}
+
+export async function getUsers(): Promise<User[]> {
+  const res = await api.get<User[]>("/users/");
   return res.data;
-}
\ No newline at end of file
+}
+
+// Paginado por keyset: cursor 0 para la primera página, luego el next_cursor anterior
+export async function getUsersPage(query: UserQuery = {}): Promise<UserPage> {
+  const res = await api.get<UserPage>("/users/", { params: { cursor: 0, ...query } });
+  return res.data;
+}
+
+// Alta masiva en una sola petición (un INSERT multi-fila en el backend)
+export async function createUsersBulk(users: UserCreate[]): Promise<number> {
+  const res = await api.post<{ inserted: number }>("/users/bulk", users);
+  return res.data.inserted;
+}